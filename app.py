@@ -1,5 +1,12 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify
+import click
 import logging
+from db import engine, replica_engine, init_read_routing, pool_stats
+from models import DynamicTableManager
+from utils.json_provider import init_json_provider
+from utils.request_timing import init_request_timing, request_timing
+from utils.metrics import init_metrics, metrics
+from utils.sql_profiler import init_sql_profiler
 from routes.smartvoc_routes import bp as smartvoc_bp
 from routes.analysis_routes import bp as analysis_bp
 
@@ -13,6 +20,21 @@ logger = logging.getLogger(__name__)
 # Crear aplicación Flask
 app = Flask(__name__)
 
+# Codificador JSON de las respuestas (orjson si está instalado)
+init_json_provider(app)
+
+# Latencia por ruta y muestreo de request_logs
+init_request_timing(app)
+
+# Consultas por petición y colectores de /api/metrics
+init_metrics(app)
+
+# Perfilador de SQL por petición (opcional, SQL_PROFILER_ENABLED)
+init_sql_profiler(app)
+
+# Enrutamiento de lecturas a la réplica con lectura de las propias escrituras
+init_read_routing(app)
+
 # Registrar blueprints
 app.register_blueprint(smartvoc_bp)
 app.register_blueprint(analysis_bp)
@@ -25,6 +47,46 @@ def health_check():
         "message": "Servicio funcionando correctamente"
     })
 
+# Estado del pool de conexiones del engine compartido
+@app.route('/api/health/db', methods=['GET'])
+def db_health_check():
+    return jsonify({
+        "status": "ok",
+        "dialect": engine.dialect.name,
+        "pool": pool_stats(),
+        "replicaPool": pool_stats(replica_engine) if replica_engine is not None else None
+    })
+
+# Percentiles de latencia por ruta desde el inicio del proceso
+@app.route('/api/health/requests', methods=['GET'])
+def requests_health_check():
+    return jsonify({
+        "status": "ok",
+        "routes": request_timing.stats()
+    })
+
+# Métricas del proceso en el formato de texto de Prometheus
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Comando de mantenimiento: flask backfill-indexes [--dry-run]
+@app.cli.command('backfill-indexes')
+@click.option('--dry-run', is_flag=True, help="Solo listar los índices faltantes, sin crearlos")
+def backfill_indexes(dry_run):
+    """Crea los índices faltantes en las tablas dinámicas existentes de todos los clientes."""
+    report = DynamicTableManager.backfill_indexes(dry_run=dry_run)
+    for entry in report:
+        line = f"{entry['status']:8} {entry['table']}.{entry['index']}"
+        if entry.get('error'):
+            line += f" ({entry['error']})"
+        click.echo(line)
+    
+    errors = sum(1 for entry in report if entry['status'] in ('error', 'duplicates'))
+    click.echo(f"{len(report)} índices faltantes, {errors} con error")
+    if errors:
+        raise SystemExit(1)
+
 # Punto de entrada principal
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
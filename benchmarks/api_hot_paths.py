@@ -0,0 +1,292 @@
+"""
+Benchmark de los caminos críticos de la API.
+
+Levanta la aplicación Flask en el mismo proceso sobre una base SQLite
+temporal, crea N clientes con M conversaciones y análisis cada uno y mide,
+a través del cliente de pruebas de Flask (sin red), las operaciones
+principales:
+
+- client_create: POST /api/smartvoc/clients
+- conversation_create: POST /api/smartvoc/conversations
+- conversation_get: GET /api/smartvoc/conversations/<id>
+- conversation_list: GET /api/smartvoc/conversations
+- analysis_create: POST /api/analysis/<cliente>
+- analysis_list: GET /api/analysis/<cliente>
+- batch_queue: `AnalysisService.start_batch_processing` (no tiene ruta propia)
+- client_delete: DELETE /api/smartvoc/clients/<id>
+
+El resultado es un JSON con los percentiles de cada operación y los datos
+del entorno, pensado para guardarse por commit y compararse con `--compare`.
+
+Uso:
+    python benchmarks/api_hot_paths.py
+    python benchmarks/api_hot_paths.py --clients 5 --conversations 200 --output bench-main.json
+    python benchmarks/api_hot_paths.py --output bench-rama.json --compare bench-main.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Operaciones en el orden en que se ejecutan
+OPERATIONS = (
+    'client_create', 'conversation_create', 'conversation_get', 'conversation_list',
+    'analysis_create', 'analysis_list', 'batch_queue', 'client_delete'
+)
+
+class BenchmarkError(Exception):
+    """Una operación devolvió un código inesperado; las mediciones no serían válidas."""
+
+def configure_environment(workdir):
+    """
+    Apunta la aplicación a una base SQLite temporal antes de importarla.
+
+    Args:
+        workdir (str): Directorio temporal del benchmark
+    """
+    os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['DB_REPLICA_URI'] = ''
+    os.environ['LLM_CACHE_BACKEND'] = 'memory'
+    os.environ.setdefault('SQL_PROFILER_ENABLED', 'false')
+
+def git_revision():
+    """Commit actual del repositorio, si está disponible."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Recorder:
+    """Acumula las duraciones de cada operación y valida sus respuestas."""
+
+    def __init__(self):
+        self.timings = {name: [] for name in OPERATIONS}
+
+    def call(self, name, expected_status, request):
+        """
+        Ejecuta y mide una operación.
+
+        Args:
+            name (str): Operación de `OPERATIONS`
+            expected_status (int): Código HTTP esperado (None si no es una petición)
+            request: Función sin argumentos que ejecuta la operación
+
+        Returns:
+            Resultado de `request`
+        """
+        started = time.perf_counter()
+        result = request()
+        self.timings[name].append(time.perf_counter() - started)
+        if expected_status is not None and result.status_code != expected_status:
+            raise BenchmarkError(
+                f"{name}: se esperaba {expected_status} y se obtuvo {result.status_code}: "
+                f"{result.get_data(as_text=True)[:300]}"
+            )
+        return result
+
+    def summary(self):
+        """Percentiles en milisegundos de cada operación medida."""
+        from utils.batch_scheduler import percentile
+
+        results = {}
+        for name, values in self.timings.items():
+            if not values:
+                continue
+            values = sorted(values)
+            results[name] = {
+                'count': len(values),
+                'meanMs': round(sum(values) / len(values) * 1000, 3),
+                'p50Ms': round(percentile(values, 50) * 1000, 3),
+                'p95Ms': round(percentile(values, 95) * 1000, 3),
+                'p99Ms': round(percentile(values, 99) * 1000, 3),
+                'minMs': round(values[0] * 1000, 3),
+                'maxMs': round(values[-1] * 1000, 3)
+            }
+        return results
+
+def conversation_payload(client_id, index, turns):
+    """Conversación sintética con `turns` mensajes alternados."""
+    return {
+        'clientId': str(client_id),
+        'conversationId': f"conv-{index:06d}",
+        'conversation': {
+            'messages': [
+                {
+                    'role': 'customer' if turn % 2 == 0 else 'agent',
+                    'text': f"Mensaje {turn} sobre el pedido {index}: necesito ayuda con el despacho y el reembolso."
+                }
+                for turn in range(turns)
+            ]
+        },
+        'metadata': {'channel': 'whatsapp', 'agent': f"agente-{index % 7}"}
+    }
+
+def analysis_payload(conversation_id):
+    """Resultado de análisis sintético para una conversación."""
+    return {
+        'conversation_id': conversation_id,
+        'analysis_type': 'standard',
+        'result': {
+            'summary': "El cliente consulta por el estado de su pedido y solicita un reembolso.",
+            'topics': ['despacho', 'reembolso'],
+            'sentiment': {'label': 'negative', 'score': -0.4}
+        },
+        'metadata': {'model': 'benchmark'}
+    }
+
+def run(args):
+    """
+    Siembra los datos y mide las operaciones.
+
+    Returns:
+        dict: Resultados y datos del entorno
+    """
+    from app import app
+    from db import init_db
+    from services.analysis_service import AnalysisService
+    from utils.request_log_writer import request_log_writer
+
+    init_db(app)
+    client = app.test_client()
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    analysis_service = AnalysisService()
+
+    clients = []
+    for client_index in range(args.clients):
+        response = recorder.call('client_create', 201, lambda: client.post(
+            '/api/smartvoc/clients', json={'clientName': f"BenchClient{client_index}"}
+        ))
+        created = response.get_json()['client']
+        clients.append((created['clientId'], created['clientName']))
+
+    # Siembra: cada conversación y su análisis se miden al crearse
+    conversation_ids = {}
+    for client_id, client_name in clients:
+        ids = []
+        for index in range(args.conversations):
+            payload = conversation_payload(client_id, index, args.turns)
+            recorder.call('conversation_create', 201, lambda: client.post(
+                '/api/smartvoc/conversations', json=payload
+            ))
+            recorder.call('analysis_create', 201, lambda: client.post(
+                f"/api/analysis/{client_name}", json=analysis_payload(payload['conversationId'])
+            ))
+            ids.append(payload['conversationId'])
+        conversation_ids[client_id] = ids
+
+    # Lecturas sobre los datos sembrados
+    for _ in range(args.repeat):
+        for client_id, client_name in clients:
+            conversation_id = rng.choice(conversation_ids[client_id])
+            recorder.call('conversation_get', 200, lambda: client.get(
+                f"/api/smartvoc/conversations/{conversation_id}?clientId={client_id}"
+            ))
+            recorder.call('conversation_list', 200, lambda: client.get(
+                f"/api/smartvoc/conversations?clientId={client_id}&limit={args.page_size}"
+            ))
+            recorder.call('analysis_list', 200, lambda: client.get(
+                f"/api/analysis/{client_name}?limit={args.page_size}"
+            ))
+
+    # Encolado de lotes dentro de un contexto de petición, como lo haría una ruta
+    for _ in range(args.repeat):
+        for client_id, client_name in clients:
+            batch = rng.sample(conversation_ids[client_id], min(args.batch_size, len(conversation_ids[client_id])))
+            with app.test_request_context(f"/api/analysis/{client_name}/batch", method='POST'):
+                recorder.call('batch_queue', None, lambda: analysis_service.start_batch_processing(
+                    client_name, batch, {'priority': 3, 'analysisType': 'standard'}
+                ))
+
+    for client_id, _ in clients:
+        recorder.call('client_delete', 200, lambda: client.delete(f"/api/smartvoc/clients/{client_id}"))
+
+    request_log_writer.flush()
+    return recorder.summary()
+
+def compare(results, baseline_path):
+    """Imprime la variación del p50 de cada operación respecto de un resultado anterior."""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"\nComparación con {baseline_path} ({baseline.get('revision') or 'sin revisión'}):")
+    for name, result in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous.get('p50Ms'):
+            print(f"{name:20} sin datos anteriores")
+            continue
+        change = (result['p50Ms'] - previous['p50Ms']) / previous['p50Ms'] * 100
+        print(f"{name:20} p50 {previous['p50Ms']:>9} -> {result['p50Ms']:>9} ms  {change:+7.1f} %")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los caminos críticos de la API")
+    parser.add_argument('--clients', type=int, default=3, help="Clientes a crear")
+    parser.add_argument('--conversations', type=int, default=100, help="Conversaciones y análisis por cliente")
+    parser.add_argument('--turns', type=int, default=20, help="Mensajes por conversación")
+    parser.add_argument('--repeat', type=int, default=30, help="Repeticiones de las lecturas y lotes por cliente")
+    parser.add_argument('--page-size', type=int, default=50, help="Tamaño de página de los listados")
+    parser.add_argument('--batch-size', type=int, default=20, help="Conversaciones por lote encolado")
+    parser.add_argument('--seed', type=int, default=42, help="Semilla de las elecciones aleatorias")
+    parser.add_argument('--output', help="Archivo donde guardar el JSON de resultados")
+    parser.add_argument('--compare', help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='smartvoc-bench-')
+    configure_environment(workdir)
+    logging.disable(logging.WARNING)
+    try:
+        results = run(args)
+    finally:
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'benchmark': 'api_hot_paths',
+        'revision': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform()
+        },
+        'parameters': {
+            'clients': args.clients,
+            'conversations': args.conversations,
+            'turns': args.turns,
+            'repeat': args.repeat,
+            'pageSize': args.page_size,
+            'batchSize': args.batch_size,
+            'seed': args.seed
+        },
+        'results': results
+    }
+
+    for name, result in results.items():
+        print(
+            f"{name:20} n={result['count']:<5} p50 {result['p50Ms']:>9} ms  "
+            f"p95 {result['p95Ms']:>9} ms  p99 {result['p99Ms']:>9} ms"
+        )
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
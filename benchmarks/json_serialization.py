@@ -0,0 +1,108 @@
+"""
+Benchmark de serialización JSON de una lista de análisis.
+
+Compara el camino anterior de `jsonify` (codificador por defecto de Flask
+con las fechas convertidas con `.isoformat()` campo a campo) con los
+codificadores de `utils/json_provider.py`, que serializan las fechas de
+forma nativa.
+
+Uso:
+    python benchmarks/json_serialization.py
+    python benchmarks/json_serialization.py --analyses 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from flask.json import JSONEncoder
+
+from utils.batch_scheduler import percentile
+from utils.json_provider import JSON_PROVIDERS, orjson
+
+def build_analyses(count):
+    """Genera análisis con la forma de `GenerativeAnalyses__*`, con fechas como objetos."""
+    started = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        {
+            'id': index,
+            'conversationId': f"conv-{index}",
+            'batchRunId': f"batch-{index // 100}",
+            'analysisType': 'standard',
+            'status': 'completed',
+            'createdAt': started + timedelta(seconds=index),
+            'updatedAt': started + timedelta(seconds=index, milliseconds=250),
+            'deepAnalysis': {
+                'summary': "Cliente consulta por el estado de su pedido y solicita un reembolso. " * 4,
+                'sentiment': {'label': 'negative', 'score': -0.42},
+                'topics': [
+                    {'name': f"tema-{topic}", 'relevance': topic / 10, 'quotes': ["cita textual"] * 3}
+                    for topic in range(6)
+                ],
+                'customerEffort': 3
+            },
+            'gscAnalysis': {'stage': 'COMPLETED', 'scores': list(range(20))}
+        }
+        for index in range(count)
+    ]
+
+def with_isoformat(analyses):
+    """Convierte las fechas una a una, como hacen los `to_dict` de los modelos."""
+    converted = []
+    for analysis in analyses:
+        item = dict(analysis)
+        item['createdAt'] = item['createdAt'].isoformat()
+        item['updatedAt'] = item['updatedAt'].isoformat()
+        converted.append(item)
+    return converted
+
+def measure(app, encoder, analyses, repeat, convert=False):
+    """Mide `jsonify` de la lista completa con el codificador indicado."""
+    app.json_encoder = encoder
+    timings = []
+    size = 0
+    with app.test_request_context():
+        for _ in range(repeat):
+            started = time.perf_counter()
+            payload = with_isoformat(analyses) if convert else analyses
+            body = jsonify({'success': True, 'items': payload}).get_data()
+            timings.append(time.perf_counter() - started)
+            size = len(body)
+    timings.sort()
+    return {
+        'p50Ms': round(percentile(timings, 50) * 1000, 2),
+        'minMs': round(timings[0] * 1000, 2),
+        'bytes': size
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON de análisis")
+    parser.add_argument('--analyses', type=int, default=1000, help="Análisis en la lista")
+    parser.add_argument('--repeat', type=int, default=30, help="Repeticiones por codificador")
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    analyses = build_analyses(args.analyses)
+
+    results = {'flask-default+isoformat': measure(app, JSONEncoder, analyses, args.repeat, convert=True)}
+    results['stdlib'] = measure(app, JSON_PROVIDERS['stdlib'], analyses, args.repeat)
+    if orjson is not None:
+        results['orjson'] = measure(app, JSON_PROVIDERS['orjson'], analyses, args.repeat)
+    else:
+        print("orjson no está instalado; se omite")
+
+    baseline = results['flask-default+isoformat']['p50Ms']
+    for name, result in results.items():
+        print(
+            f"{name:24} p50 {result['p50Ms']:>8} ms  min {result['minMs']:>8} ms  "
+            f"{result['bytes']:>9} bytes  x{baseline / result['p50Ms']:.1f}"
+        )
+    print(json.dumps({'analyses': args.analyses, 'repeat': args.repeat, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
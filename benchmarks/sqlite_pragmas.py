@@ -0,0 +1,157 @@
+"""
+Benchmark de lecturas y escrituras mixtas sobre SQLite, antes y después de
+los PRAGMAs de conexión (ver `db.sqlite_pragmas`).
+
+Simula varios workers de gunicorn, cada uno en su propio proceso, que leen
+conversaciones por ID e insertan otras nuevas confirmando cada sentencia,
+como hace `DynamicTableManager.execute_query`. Se ejecuta dos veces sobre
+bases nuevas: con el modo de diario por defecto (rollback journal,
+synchronous=FULL) y con la configuración activa (WAL por defecto).
+
+Uso:
+    python benchmarks/sqlite_pragmas.py
+    python benchmarks/sqlite_pragmas.py --processes 8 --seconds 10 --write-ratio 0.3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from config import active_config
+from db import create_db_engine
+from utils.batch_scheduler import percentile
+
+# PRAGMAs por defecto de SQLite, equivalentes al engine anterior
+BASELINE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_CACHE_SIZE': -2000,
+    'SQLITE_MMAP_SIZE': 0,
+    'SQLITE_TEMP_STORE': 'DEFAULT'
+}
+
+TABLE = 'Conversations__Bench'
+
+def bench_config(overrides):
+    """Configuración activa con los valores indicados sobrescritos."""
+    return type('BenchConfig', (active_config,), dict(overrides))
+
+def seed(uri, config, rows):
+    """Crea la tabla de conversaciones y carga `rows` filas iniciales."""
+    engine = create_db_engine(uri, config)
+    with engine.begin() as connection:
+        connection.execute(text(f"""
+            CREATE TABLE {TABLE} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id VARCHAR(255) NOT NULL UNIQUE,
+                client_id VARCHAR(255) NOT NULL,
+                conversation TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        connection.execute(
+            text(f"INSERT INTO {TABLE} (conversation_id, client_id, conversation) VALUES (:id, '1', :body)"),
+            [{'id': f"seed-{index}", 'body': json.dumps({'messages': ['hola'] * 20})} for index in range(rows)]
+        )
+    engine.dispose()
+
+def run_worker(uri, overrides, seconds, write_ratio, rows, worker_index, results):
+    """Ejecuta operaciones mixtas durante `seconds` segundos y publica sus métricas."""
+    engine = create_db_engine(uri, bench_config(overrides))
+    rng = random.Random(worker_index)
+    latencies = {'read': [], 'write': []}
+    errors = 0
+    sequence = 0
+    deadline = time.perf_counter() + seconds
+
+    while time.perf_counter() < deadline:
+        is_write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                if is_write:
+                    sequence += 1
+                    connection.execute(
+                        text(f"INSERT INTO {TABLE} (conversation_id, client_id, conversation) VALUES (:id, '1', :body)"),
+                        {'id': f"w{worker_index}-{sequence}", 'body': json.dumps({'messages': ['hola'] * 20})}
+                    )
+                else:
+                    connection.execute(
+                        text(f"SELECT * FROM {TABLE} WHERE conversation_id = :id"),
+                        {'id': f"seed-{rng.randrange(rows)}"}
+                    ).fetchall()
+        except OperationalError:
+            # "database is locked" tras agotar busy_timeout
+            errors += 1
+            continue
+        latencies['write' if is_write else 'read'].append(time.perf_counter() - started)
+
+    engine.dispose()
+    results.put({'latencies': latencies, 'errors': errors})
+
+def run_scenario(name, overrides, args):
+    """Ejecuta un escenario sobre una base nueva y resume sus resultados."""
+    directory = tempfile.mkdtemp(prefix='smartvoc-bench-')
+    uri = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    seed(uri, bench_config(overrides), args.rows)
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(uri, overrides, args.seconds, args.write_ratio, args.rows, index, results)
+        )
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = {'scenario': name, 'pragmas': overrides, 'errors': sum(item['errors'] for item in outcomes)}
+    total = 0
+    for kind in ('read', 'write'):
+        values = sorted(value for item in outcomes for value in item['latencies'][kind])
+        total += len(values)
+        summary[kind] = {
+            'ops': len(values),
+            'opsPerSecond': round(len(values) / args.seconds, 1),
+            'p50Ms': round(percentile(values, 50) * 1000, 3) if values else None,
+            'p95Ms': round(percentile(values, 95) * 1000, 3) if values else None,
+            'p99Ms': round(percentile(values, 99) * 1000, 3) if values else None
+        }
+    summary['opsPerSecond'] = round(total / args.seconds, 1)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de PRAGMAs de SQLite con carga mixta")
+    parser.add_argument('--processes', type=int, default=4, help="Procesos concurrentes (workers)")
+    parser.add_argument('--seconds', type=float, default=5, help="Duración de cada escenario")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="Proporción de escrituras (0-1)")
+    parser.add_argument('--rows', type=int, default=5000, help="Filas iniciales de la tabla")
+    args = parser.parse_args()
+
+    tuned = {key: getattr(active_config, key) for key in BASELINE}
+    scenarios = [run_scenario('before', BASELINE, args), run_scenario('after', tuned, args)]
+
+    for summary in scenarios:
+        print(
+            f"{summary['scenario']:7} {summary['opsPerSecond']:>9} ops/s  "
+            f"lecturas {summary['read']['opsPerSecond']:>9}/s p99 {summary['read']['p99Ms']} ms  "
+            f"escrituras {summary['write']['opsPerSecond']:>8}/s p99 {summary['write']['p99Ms']} ms  "
+            f"errores {summary['errors']}"
+        )
+    print(json.dumps(scenarios, indent=2))
+
+if __name__ == '__main__':
+    main()
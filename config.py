@@ -8,14 +8,103 @@ class Config(object):
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'development-key-for-smartvoc')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # Configuración de pool de conexiones - solo para SQL Server, no para SQLite
-    # Estos parámetros se aplicarán dinámicamente solo si no estamos usando SQLite
+    # Tamaño de lote para inserciones masivas de conversaciones
+    BULK_INSERT_CHUNK_SIZE = int(os.getenv('BULK_INSERT_CHUNK_SIZE', '500'))
+    
+    # Filas leídas por iteración al exportar conversaciones en streaming
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    
+    # Caché en proceso de clientes (segundos de vigencia y número de entradas).
+    # update_client/delete_client solo invalidan la caché de su proceso: en las
+    # lecturas, los demás workers ven el cambio hasta CLIENT_CACHE_TTL segundos
+    # tarde; las escrituras siempre leen el cliente de la base de datos
+    CLIENT_CACHE_TTL = int(os.getenv('CLIENT_CACHE_TTL', '30'))
+    CLIENT_CACHE_MAX_SIZE = int(os.getenv('CLIENT_CACHE_MAX_SIZE', '1024'))
+    
+    # Caché de resultados de análisis de LLM ('sqlite', 'memory' o 'none')
+    LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'sqlite')
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'instance/llm_cache.sqlite3')
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+    
+    # Segundos que el registro de esquema recuerda que una tabla dinámica no
+    # existe; en ese plazo no ve las tablas que cree otro proceso
+    SCHEMA_REGISTRY_NEGATIVE_TTL = float(os.getenv('SCHEMA_REGISTRY_NEGATIVE_TTL', '2'))
+    
+    # Codificador JSON de las respuestas: 'auto' (orjson si está instalado), 'orjson' o 'stdlib'
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')
+    
+    # Escritura asíncrona de request_logs: tamaño de la cola, filas por
+    # inserción, intervalo máximo entre escrituras y política con la cola
+    # llena ('drop_newest', 'drop_oldest' o 'block')
+    REQUEST_LOG_ENABLED = os.getenv('REQUEST_LOG_ENABLED', 'true').lower() == 'true'
+    REQUEST_LOG_QUEUE_SIZE = int(os.getenv('REQUEST_LOG_QUEUE_SIZE', '10000'))
+    REQUEST_LOG_BATCH_SIZE = int(os.getenv('REQUEST_LOG_BATCH_SIZE', '200'))
+    REQUEST_LOG_FLUSH_INTERVAL_MS = int(os.getenv('REQUEST_LOG_FLUSH_INTERVAL_MS', '500'))
+    REQUEST_LOG_DROP_POLICY = os.getenv('REQUEST_LOG_DROP_POLICY', 'drop_newest')
+    REQUEST_LOG_BLOCK_TIMEOUT_MS = int(os.getenv('REQUEST_LOG_BLOCK_TIMEOUT_MS', '50'))
+    
+    # Latencia por ruta: fracción de peticiones guardadas en request_logs; las
+    # más lentas que REQUEST_TIMING_SLOW_MS, las que registran detalles de la
+    # operación (request_data) y los errores 5xx se guardan siempre
+    REQUEST_TIMING_SAMPLE_RATE = float(os.getenv('REQUEST_TIMING_SAMPLE_RATE', '0.1'))
+    REQUEST_TIMING_SLOW_MS = int(os.getenv('REQUEST_TIMING_SLOW_MS', '1000'))
+    
+    # Perfilador de SQL por petición (cabeceras X-SQL-* y /api/debug/sql).
+    # SQL_QUERY_BUDGET: sentencias máximas por petición (0 = sin límite); con
+    # SQL_QUERY_BUDGET_STRICT la petición falla en lugar de solo registrarse
+    SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER_ENABLED', 'false').lower() == 'true'
+    SQL_PROFILER_SLOWEST = int(os.getenv('SQL_PROFILER_SLOWEST', '5'))
+    SQL_PROFILER_HISTORY = int(os.getenv('SQL_PROFILER_HISTORY', '50'))
+    SQL_QUERY_BUDGET = int(os.getenv('SQL_QUERY_BUDGET', '0'))
+    SQL_QUERY_BUDGET_STRICT = os.getenv('SQL_QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+    
+    # Cola persistente de análisis por lotes y workers
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    WORKER_CLAIM_SIZE = int(os.getenv('WORKER_CLAIM_SIZE', '10'))
+    WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '2'))
+    
+    # Directorio donde los workers vuelcan sus métricas (llamadas a Azure
+    # OpenAI) para que /api/metrics las sume (vacío = sin agregación) y
+    # segundos entre volcados; debe ser el mismo para la API y los workers
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', 'instance/metrics')
+    METRICS_SNAPSHOT_INTERVAL = float(os.getenv('METRICS_SNAPSHOT_INTERVAL', '10'))
+    
+    # Planificador de la cola: pesos por cliente ("Acme:2,Beta:0.5") y
+    # segundos de espera que duplican la puntuación de una fila
+    SCHEDULER_CLIENT_WEIGHTS = os.getenv('SCHEDULER_CLIENT_WEIGHTS', '')
+    SCHEDULER_AGING_SECONDS = float(os.getenv('SCHEDULER_AGING_SECONDS', '300'))
+    
+    # Pool de conexiones del engine compartido (ver db.create_db_engine); el
+    # reciclado y la comprobación previa no se aplican a SQLite
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '30'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '60'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '300'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # PRAGMAs de cada conexión SQLite. WAL permite lecturas concurrentes con
+    # un escritor; cache_size negativo se expresa en KiB (-64000 = ~64 MB)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-64000'))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
     
     # Binds para múltiples bases de datos
     SQLALCHEMY_BINDS = {
-        'db_smartvoc': os.getenv('DB_SMARTVOC_URI', 'sqlite:///instance/smartvoc.db')
+        'db_smartvoc': os.getenv('DB_SMARTVOC_URI', 'sqlite:///instance/smartvoc.db'),
+        'replica': os.getenv('DB_REPLICA_URI', '')
     }
     
+    # Bind de la réplica a la que se envían las lecturas de los métodos de
+    # solo lectura (sin URL, todo va al primario) y segundos durante los que
+    # un llamante lee del primario después de escribir (0 = desactivado); debe
+    # cubrir el retraso habitual de la réplica
+    DB_READ_BIND = os.getenv('DB_READ_BIND', 'replica')
+    DB_READ_YOUR_WRITES_SECONDS = float(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '5'))
+    
     # Base de datos principal
     # Comprobar si hay una URL de base de datos configurada en las variables de entorno
     if os.getenv('DATABASE_URL'):
@@ -23,15 +112,6 @@ class Config(object):
         # Compatibilidad con Heroku Postgres
         if SQLALCHEMY_DATABASE_URI.startswith("postgres://"):
             SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace("postgres://", "postgresql://", 1)
-            
-        # Aplicar configuración de pool solo para bases de datos no SQLite
-        if not SQLALCHEMY_DATABASE_URI.startswith('sqlite:'):
-            SQLALCHEMY_ENGINE_OPTIONS = {
-                'pool_size': 20,
-                'max_overflow': 30,
-                'pool_timeout': 60,
-                'pool_recycle': 300
-            }
     else:
         # URL de base de datos predeterminada si no se proporciona en variables de entorno
         SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///instance/smartvoc.db')
@@ -44,6 +124,7 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'memory')
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -1,18 +1,375 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool, StaticPool
+from contextlib import ContextDecorator
+import itertools
+import math
 import os
 import logging
+import threading
+import time
+
+from config import active_config
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
 
-# Configuración de la base de datos
-DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///smartvoc.db')
+# Configuración de la base de datos: DATABASE_URI tiene prioridad sobre la configuración activa
+DATABASE_URI = os.getenv('DATABASE_URI') or active_config.SQLALCHEMY_DATABASE_URI
+
+# Límites (segundos) del histograma de espera para obtener una conexión del pool
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+class PoolStatistics:
+    """
+    Contadores de uso del pool de conexiones de un engine, alimentados por
+    los eventos del pool, y tiempos de espera de cada entrega de conexión
+    (incluidas las que agotan `pool_timeout`), medidos por `create_db_engine`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.wait_counts = [0] * len(CHECKOUT_WAIT_BUCKETS)
+        self.wait_total = 0.0
+        self.wait_count = 0
+        self.wait_max = 0.0
+
+    def on_connect(self, *args):
+        with self.lock:
+            self.connects += 1
+
+    def on_checkout(self, *args):
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self, *args):
+        with self.lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def on_invalidate(self, *args):
+        with self.lock:
+            self.invalidations += 1
+
+    def on_checkout_wait(self, seconds):
+        """Registra los segundos que tardó el pool en entregar una conexión."""
+        with self.lock:
+            for index, bound in enumerate(CHECKOUT_WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_counts[index] += 1
+                    break
+            self.wait_total += seconds
+            self.wait_count += 1
+            self.wait_max = max(self.wait_max, seconds)
+
+    def snapshot(self, pool):
+        """
+        Obtiene los contadores junto con el estado actual del pool.
+
+        Args:
+            pool: Pool de conexiones del engine
+
+        Returns:
+            dict: Estadísticas del pool
+        """
+        with self.lock:
+            stats = {
+                "pool": type(pool).__name__,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checkedOut": self.checked_out,
+                "peakCheckedOut": self.peak_checked_out,
+                "checkoutWait": {
+                    "buckets": list(CHECKOUT_WAIT_BUCKETS),
+                    "counts": list(itertools.accumulate(self.wait_counts)),
+                    "sumSeconds": self.wait_total,
+                    "count": self.wait_count,
+                    "maxSeconds": self.wait_max
+                }
+            }
+        # Solo QueuePool informa de su tamaño y desbordamiento
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "maxOverflow": pool._max_overflow,
+                "timeout": pool.timeout()
+            })
+        return stats
+
+def sqlite_pragmas(config=None):
+    """
+    PRAGMAs que se aplican a cada conexión SQLite nueva.
+
+    busy_timeout va primero para que el cambio a WAL, que necesita un
+    bloqueo exclusivo momentáneo, espere a otros procesos en lugar de fallar.
+
+    Args:
+        config: Configuración de la aplicación (por defecto la activa)
+
+    Returns:
+        list: Sentencias PRAGMA en orden de aplicación
+    """
+    config = config or active_config
+    return [
+        f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}",
+        f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size={int(config.SQLITE_CACHE_SIZE)}",
+        f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}",
+        f"PRAGMA temp_store={config.SQLITE_TEMP_STORE}"
+    ]
+
+def engine_options(uri, config=None):
+    """
+    Construye las opciones de `create_engine` según el dialecto.
+
+    Args:
+        uri (str): URL de la base de datos
+        config: Configuración de la aplicación (por defecto la activa)
+
+    Returns:
+        dict: Opciones para `create_engine`
+    """
+    config = config or active_config
+    url = make_url(uri)
+
+    if url.get_backend_name() != 'sqlite':
+        return {
+            'pool_size': config.DB_POOL_SIZE,
+            'max_overflow': config.DB_MAX_OVERFLOW,
+            'pool_timeout': config.DB_POOL_TIMEOUT,
+            'pool_recycle': config.DB_POOL_RECYCLE,
+            'pool_pre_ping': config.DB_POOL_PRE_PING
+        }
+
+    # Las conexiones SQLite se comparten entre los hilos del servidor
+    connect_args = {
+        'check_same_thread': False,
+        'timeout': config.SQLITE_BUSY_TIMEOUT_MS / 1000.0
+    }
+    if url.database in (None, '', ':memory:'):
+        # Una base en memoria existe solo dentro de su conexión
+        return {'connect_args': connect_args, 'poolclass': StaticPool}
 
-# Inicialización del engine y la sesión
-engine = create_engine(DATABASE_URI)
-db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    # SQLite no necesita reciclar ni comprobar conexiones: son ficheros locales
+    return {
+        'connect_args': connect_args,
+        'poolclass': QueuePool,
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT
+    }
+
+def create_db_engine(uri=None, config=None):
+    """
+    Crea un engine con las opciones de pool de la configuración y, en
+    SQLite, los PRAGMAs de cada conexión (ver `sqlite_pragmas`).
+
+    Args:
+        uri (str): URL de la base de datos (por defecto DATABASE_URI)
+        config: Configuración de la aplicación (por defecto la activa)
+
+    Returns:
+        Engine: Engine con sus estadísticas de pool en `engine.pool_statistics`
+    """
+    config = config or active_config
+    uri = uri or DATABASE_URI
+    url = make_url(uri)
+
+    # Con uri=true la base es una URI (`file:...?mode=ro`), no una ruta
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+            and 'uri' not in url.query:
+        directory = os.path.dirname(url.database)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    new_engine = create_engine(uri, **engine_options(uri, config))
+
+    if url.get_backend_name() == 'sqlite':
+        pragmas = sqlite_pragmas(config)
+
+        @event.listens_for(new_engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+
+    statistics = PoolStatistics()
+    event.listen(new_engine, 'connect', statistics.on_connect)
+    event.listen(new_engine, 'checkout', statistics.on_checkout)
+    event.listen(new_engine, 'checkin', statistics.on_checkin)
+    event.listen(new_engine, 'invalidate', statistics.on_invalidate)
+    new_engine.pool_statistics = statistics
+
+    # El pool no tiene un evento previo a la entrega: se mide la llamada que
+    # hacen Connection y Session; `raw_connection` lee `self.pool` en cada
+    # llamada, así que la medición sigue tras `engine.dispose()`
+    raw_connection = new_engine.raw_connection
+
+    def timed_raw_connection(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return raw_connection(*args, **kwargs)
+        finally:
+            statistics.on_checkout_wait(time.perf_counter() - started)
+
+    new_engine.raw_connection = timed_raw_connection
+
+    logger.info(f"Engine de base de datos creado para el dialecto {new_engine.dialect.name}")
+    return new_engine
+
+def pool_stats(target=None):
+    """
+    Obtiene las estadísticas del pool de conexiones.
+
+    Args:
+        target (Engine): Engine a consultar (por defecto el compartido)
+
+    Returns:
+        dict: Estadísticas del pool
+    """
+    target = target or engine
+    return target.pool_statistics.snapshot(target.pool)
+
+# Inicialización del engine compartido y, si está configurada, de la réplica de lectura
+engine = create_db_engine()
+REPLICA_URI = active_config.SQLALCHEMY_BINDS.get(active_config.DB_READ_BIND)
+replica_engine = create_db_engine(REPLICA_URI) if REPLICA_URI else None
+
+# Estado de enrutamiento del hilo actual: profundidad de `read_only`, última
+# escritura conocida del llamante y escritura hecha en la petición en curso
+_routing = threading.local()
+
+# Cookie con la marca de tiempo de la última escritura de un llamante
+LAST_WRITE_COOKIE = 'smartvoc_last_write'
+
+class read_only(ContextDecorator):
+    """
+    Marca un bloque o un método de servicio como de solo lectura: sus
+    SELECT se envían a la réplica, si hay una configurada. Las escrituras
+    dentro del bloque siguen yendo al primario.
+
+    Uso:
+        @read_only()
+        def get_conversations(params): ...
+
+        with read_only():
+            ...
+    """
+
+    def __enter__(self):
+        _routing.read_only = getattr(_routing, 'read_only', 0) + 1
+        return self
+
+    def __exit__(self, *exc):
+        _routing.read_only -= 1
+        return False
+
+def _mark_write():
+    """Registra una escritura del llamante actual."""
+    _routing.last_write = _routing.wrote_at = time.time()
+
+def _recent_write():
+    """Indica si el llamante escribió dentro de la ventana de lectura de sus escrituras."""
+    window = active_config.DB_READ_YOUR_WRITES_SECONDS
+    return window > 0 and time.time() - getattr(_routing, 'last_write', 0) < window
+
+def read_bind():
+    """
+    Engine al que se envían las lecturas en el contexto actual: la réplica
+    dentro de un bloque `read_only` (salvo tras una escritura reciente del
+    llamante) y el primario en cualquier otro caso.
+
+    La existencia y la reflexión de tablas dinámicas en los caminos de
+    lectura deben consultarse contra este mismo bind, porque la réplica
+    puede no tener todavía una tabla recién creada en el primario.
+
+    Returns:
+        Engine: Engine de lectura
+    """
+    if replica_engine is not None and getattr(_routing, 'read_only', 0) and not _recent_write():
+        return replica_engine
+    return engine
+
+def _is_select(clause):
+    """Indica si una sentencia es una consulta de lectura."""
+    if clause is None:
+        return False
+    if getattr(clause, 'is_select', False):
+        return True
+    # Las consultas textuales de los servicios se reconocen por su primera palabra
+    sql = getattr(clause, 'text', None)
+    return sql is not None and sql.lstrip().upper().startswith(('SELECT', 'WITH'))
+
+class RoutingSession(Session):
+    """
+    Sesión que envía las lecturas de los bloques `read_only` a la réplica.
+
+    Todo lo demás va al primario: flush, DML, DDL y las llamadas a
+    `get_bind()` sin sentencia (dialecto y creación de tablas); para
+    inspeccionar las tablas que leerá una consulta se usa `read_bind()`.
+    Tras una escritura del llamante, sus lecturas vuelven al primario durante
+    `DB_READ_YOUR_WRITES_SECONDS`.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if replica_engine is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kw)
+        if self._flushing or (clause is not None and not _is_select(clause)):
+            _mark_write()
+            return engine
+        if clause is not None:
+            return read_bind()
+        return engine
+
+db_session = scoped_session(sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine))
+
+def init_read_routing(app):
+    """
+    Propaga la última escritura de cada llamante entre peticiones mediante
+    una cookie, para que lea sus propias escrituras desde el primario
+    mientras la réplica se pone al día.
+
+    Args:
+        app: Aplicación Flask
+    """
+    from flask import request
+
+    @app.before_request
+    def load_last_write():
+        _routing.read_only = 0
+        _routing.wrote_at = None
+        try:
+            _routing.last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+        except ValueError:
+            _routing.last_write = 0
+
+    @app.after_request
+    def store_last_write(response):
+        window = active_config.DB_READ_YOUR_WRITES_SECONDS
+        if replica_engine is not None and window > 0 and getattr(_routing, 'wrote_at', None):
+            response.set_cookie(
+                LAST_WRITE_COOKIE, f"{_routing.wrote_at:.3f}",
+                max_age=int(math.ceil(window)), httponly=True, samesite='Lax'
+            )
+        return response
 
 # Base declarativa para los modelos
 Base = declarative_base()
@@ -30,6 +387,7 @@ def init_db(app=None):
         
         # Crear tablas
         Base.metadata.create_all(bind=engine)
+        init_replica_schema()
         
         # Configurar manejadores de eventos de la aplicación Flask
         if app:
@@ -42,6 +400,29 @@ def init_db(app=None):
         logger.error(f"Error al inicializar la base de datos: {str(e)}")
         raise
 
+def init_replica_schema(target=None):
+    """
+    Crea las tablas base en una réplica SQLite local.
+
+    Dos ficheros SQLite no se replican entre sí: sin esto, una réplica vacía
+    responde `no such table` a la primera lectura. La réplica solo tendrá los
+    datos que se copien en ella (p. ej. `sqlite3 instance/smartvoc.db
+    ".backup instance/smartvoc_replica.db"`); para desarrollo es preferible
+    abrir el mismo fichero en solo lectura con
+    `DB_REPLICA_URI=sqlite:///file:instance/smartvoc.db?mode=ro&uri=true`,
+    en cuyo caso las tablas ya existen y no se escribe nada.
+
+    Args:
+        target (Engine): Réplica (por defecto la configurada)
+    """
+    target = target or replica_engine
+    if target is None or target.dialect.name != 'sqlite':
+        return
+    try:
+        Base.metadata.create_all(bind=target)
+    except Exception as e:
+        logger.warning(f"No se pudieron crear las tablas base en la réplica: {str(e)}")
+
 def shutdown_session(exception=None):
     """Remueve la sesión al finalizar la petición."""
     if exception:
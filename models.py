@@ -1,10 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Table, MetaData, inspect, text
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, JSON, Table, MetaData, Index, func, inspect, select, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import json
-from db import Base, db_session
+from db import Base, db_session, read_bind
+from utils.schema_registry import index_name, schema_registry
+from utils.json_response import raw_json_fragment
 from flask import current_app
 import logging
 
@@ -176,6 +178,54 @@ class Analysis(Base):
             'updatedAt': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class BatchJob(Base):
+    """
+    Modelo para la cola persistente de análisis por lotes.
+    
+    Cada fila es una conversación de un lote; su estado sirve de checkpoint
+    para que los workers reanuden el trabajo tras un reinicio.
+    """
+    __tablename__ = 'batch_jobs'
+    __table_args__ = (
+        Index('ix_batch_jobs_claim', 'status', 'priority', 'id'),
+        Index('ix_batch_jobs_batch_id', 'batch_id'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    batch_id = Column(String(36), nullable=False)
+    client_name = Column(String(100), nullable=False)
+    conversation_id = Column(String(255), nullable=False)
+    conversation = Column(Text)
+    analysis_type = Column(String(50), nullable=False, default='standard')
+    priority = Column(Integer, nullable=False, default=3)
+    status = Column(String(20), nullable=False, default='pending')  # pending, processing, completed, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100))
+    claim_token = Column(String(36))
+    lease_expires_at = Column(DateTime)
+    started_at = Column(DateTime)
+    error_message = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convierte el objeto a un diccionario."""
+        return {
+            'id': self.id,
+            'batchId': self.batch_id,
+            'clientName': self.client_name,
+            'conversationId': self.conversation_id,
+            'analysisType': self.analysis_type,
+            'priority': self.priority,
+            'status': self.status,
+            'attempts': self.attempts,
+            'workerId': self.worker_id,
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'errorMessage': self.error_message,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class SmartVOCConversation:
     """Clase para manejar las conversaciones de SmartVOC.
     
@@ -188,18 +238,43 @@ class SmartVOCConversation:
         """Obtiene el nombre de la tabla para un cliente específico."""
         return f"Conversations__{client_slug}"
     
+    # Columnas guardadas como texto JSON
+    JSON_FIELDS = ('conversation', 'metadata', 'analysis')
+    
     @staticmethod
-    def to_dict(row):
-        """Convierte una fila de la base de datos a un diccionario."""
-        result = dict(row)
+    def to_dict(row, raw_json=False, fields=None):
+        """
+        Convierte una fila de la base de datos a un diccionario.
+        
+        Args:
+            row: Fila de la tabla de conversaciones
+            raw_json (bool): No decodificar las columnas JSON válidas; su texto
+                se envuelve en `RawJSON` para insertarlo tal cual al serializar
+                la respuesta (ver `utils.json_response`)
+            fields (list): Columnas a incluir; por defecto todas
+        
+        Returns:
+            dict: Conversación
+        """
+        if fields is None:
+            result = dict(row)
+        else:
+            mapping = getattr(row, '_mapping', row)
+            result = {field: mapping[field] for field in fields if field in mapping}
         
         # Convertir campos JSON
-        for field in ['conversation', 'metadata', 'analysis']:
+        for field in SmartVOCConversation.JSON_FIELDS:
             if field in result and result[field]:
+                value = result[field]
+                fragment = raw_json_fragment(value) if raw_json and isinstance(value, str) else None
+                if fragment is not None:
+                    result[field] = fragment
+                    continue
                 try:
-                    result[field] = json.loads(result[field])
+                    result[field] = json.loads(value)
                 except (TypeError, json.JSONDecodeError):
-                    result[field] = {}
+                    # Los controladores que ya decodifican JSON entregan un dict
+                    result[field] = value if isinstance(value, (dict, list)) else {}
         
         # Formatear fechas
         if 'createdAt' in result and result['createdAt']:
@@ -216,15 +291,12 @@ class DynamicTableManager:
     """Clase para manejar la creación y gestión de tablas dinámicas."""
     
     @staticmethod
-    def create_conversation_table(client_slug):
-        """Crea una tabla dinámica de conversaciones para un cliente específico."""
+    def conversation_table(client_slug, metadata=None):
+        """Define la tabla dinámica de conversaciones de un cliente, con sus índices, sin crearla."""
         table_name = f"Conversations__{client_slug}"
-        metadata = MetaData()
-        
-        # Definir la estructura de la tabla
-        table = Table(
-            table_name, 
-            metadata,
+        return Table(
+            table_name,
+            metadata if metadata is not None else MetaData(),
             Column('id', Integer, primary_key=True, autoincrement=True),
             Column('conversation_id', String(255), nullable=False),
             Column('client_id', String(50), nullable=False),
@@ -237,13 +309,42 @@ class DynamicTableManager:
             Column('deep_analysis_batch_id', String(255)),
             Column('gsc_analysis_batch_id', String(255)),
             Column('analysis', JSON),
-            Column('auto_processing_status', String(50))
+            Column('auto_processing_status', String(50)),
+            Index(index_name('ux', table_name, 'conversation_id'), 'conversation_id', unique=True),
+            Index(index_name('ix', table_name, 'created_at_id'), 'created_at', 'id'),
+            Index(index_name('ix', table_name, 'deep_analysis_batch_id'), 'deep_analysis_batch_id'),
+            Index(index_name('ix', table_name, 'gsc_analysis_batch_id'), 'gsc_analysis_batch_id'),
+            Index(index_name('ix', table_name, 'auto_processing_status'), 'auto_processing_status')
+        )
+    
+    @staticmethod
+    def quote_table(client_slug, metadata=None):
+        """Define la tabla dinámica de citas categorizadas de un cliente, con sus índices, sin crearla."""
+        table_name = f"CopilotFieldCategoryQuote__{client_slug}"
+        return Table(
+            table_name,
+            metadata if metadata is not None else MetaData(),
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('conversation_id', String(255), nullable=False),
+            Column('conversation_group_id', String(255)),
+            Column('field', String(255), nullable=False),
+            Column('category', String(255), nullable=False),
+            Column('quote', Text, nullable=False),
+            Column('created_at', DateTime, default=datetime.utcnow),
+            Index(index_name('ix', table_name, 'field_category'), 'field', 'category')
         )
+    
+    @staticmethod
+    def create_conversation_table(client_slug):
+        """Crea una tabla dinámica de conversaciones para un cliente específico."""
+        table = DynamicTableManager.conversation_table(client_slug)
+        table_name = table.name
         
         # Crear la tabla en la base de datos
         try:
             engine = db_session.get_bind()
-            metadata.create_all(engine)
+            table.metadata.create_all(engine)
+            schema_registry.register(table_name, table, engine)
             return True
         except Exception as e:
             db_session.rollback()
@@ -253,26 +354,14 @@ class DynamicTableManager:
     @staticmethod
     def create_quote_table(client_slug):
         """Crea una tabla dinámica de citas categorizadas para un cliente específico."""
-        table_name = f"CopilotFieldCategoryQuote__{client_slug}"
-        metadata = MetaData()
-        
-        # Definir la estructura de la tabla
-        table = Table(
-            table_name, 
-            metadata,
-            Column('id', Integer, primary_key=True, autoincrement=True),
-            Column('conversation_id', String(255), nullable=False),
-            Column('conversation_group_id', String(255)),
-            Column('field', String(255), nullable=False),
-            Column('category', String(255), nullable=False),
-            Column('quote', Text, nullable=False),
-            Column('created_at', DateTime, default=datetime.utcnow)
-        )
+        table = DynamicTableManager.quote_table(client_slug)
+        table_name = table.name
         
         # Crear la tabla en la base de datos
         try:
             engine = db_session.get_bind()
-            metadata.create_all(engine)
+            table.metadata.create_all(engine)
+            schema_registry.register(table_name, table, engine)
             return True
         except Exception as e:
             db_session.rollback()
@@ -281,15 +370,94 @@ class DynamicTableManager:
     
     @staticmethod
     def table_exists(table_name):
-        """Verifica si una tabla existe en la base de datos."""
+        """
+        Verifica si una tabla existe, usando el registro de esquema del proceso.
+        
+        Se consulta el bind de lectura del contexto (`db.read_bind`): dentro de
+        un bloque `read_only` es la réplica, que ejecutará la consulta siguiente.
+        """
         try:
-            engine = db_session.get_bind()
-            inspector = inspect(engine)
-            return inspector.has_table(table_name)
+            return schema_registry.has_table(table_name, read_bind())
         except Exception as e:
             log_error(f"Error al verificar si la tabla {table_name} existe: {str(e)}")
             return False
     
+    @staticmethod
+    def get_table(table_name):
+        """Obtiene el objeto Table registrado de una tabla dinámica existente."""
+        return schema_registry.get_table(table_name, read_bind())
+    
+    @staticmethod
+    def drop_table(table_name):
+        """Elimina una tabla dinámica dentro de la transacción actual y la quita del registro."""
+        db_session.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+        schema_registry.invalidate(table_name)
+    
+    @staticmethod
+    def backfill_indexes(dry_run=False):
+        """Crea en las tablas dinámicas existentes los índices que les falten.
+        
+        Recorre las tablas de conversaciones, citas y análisis generativos de
+        todos los clientes y compara sus índices con los de la definición
+        actual. Un índice que no puede crearse se informa y no detiene el
+        resto; los únicos sobre columnas con valores repetidos no se intentan y
+        se informan con el estado `duplicates` y el número de valores repetidos,
+        que deben resolverse a mano antes de volver a ejecutar el comando.
+        Mientras tanto `create_analysis` usa la ruta sin upsert en esas tablas.
+        
+        Returns:
+            list: Un elemento por índice faltante con tabla, índice y estado
+        """
+        from utils.analysis_service import AnalysisService
+        
+        engine = db_session.get_bind()
+        inspector = inspect(engine)
+        definitions = (
+            ('Conversations__', DynamicTableManager.conversation_table),
+            ('CopilotFieldCategoryQuote__', DynamicTableManager.quote_table),
+            ('GenerativeAnalyses__', lambda suffix: AnalysisService.analysis_table(f"GenerativeAnalyses__{suffix}"))
+        )
+        
+        report = []
+        for table_name in inspector.get_table_names():
+            builder = next((build for prefix, build in definitions if table_name.startswith(prefix)), None)
+            if builder is None:
+                continue
+            
+            table = builder(table_name.split('__', 1)[1])
+            existing = {index['name'] for index in inspector.get_indexes(table_name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                entry = {"table": table_name, "index": index.name, "status": "pending" if dry_run else "created"}
+                if index.unique:
+                    duplicates = DynamicTableManager.count_duplicates(engine, index)
+                    if duplicates:
+                        columns = ', '.join(column.name for column in index.columns)
+                        entry["status"] = "duplicates"
+                        entry["error"] = f"{duplicates} valores repetidos en {columns}"
+                        report.append(entry)
+                        continue
+                if not dry_run:
+                    try:
+                        index.create(engine)
+                    except Exception as e:
+                        entry["status"] = "error"
+                        entry["error"] = str(e)
+                        log_error(f"Error al crear el índice {index.name} en {table_name}: {str(e)}")
+                    schema_registry.invalidate(table_name)
+                report.append(entry)
+        
+        return report
+    
+    @staticmethod
+    def count_duplicates(engine, index):
+        """Cuenta los valores que se repiten en las columnas de un índice."""
+        columns = list(index.columns)
+        repeated = select(*columns).group_by(*columns).having(func.count() > 1).subquery()
+        with engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(repeated)).scalar()
+    
     @staticmethod
     def execute_query(query, params=None):
         """Ejecuta una consulta SQL directamente."""
@@ -303,4 +471,23 @@ class DynamicTableManager:
         except Exception as e:
             db_session.rollback()
             log_error(f"Error al ejecutar la consulta: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+    
+    @staticmethod
+    def execute_many(statement, params_list):
+        """Ejecuta una sentencia para varios registros en una sola transacción.
+        
+        Acepta texto SQL o una construcción de SQLAlchemy Core (por ejemplo
+        `table.insert()`); en este último caso los drivers que lo soportan
+        agrupan las filas en un INSERT multi-fila.
+        """
+        try:
+            if isinstance(statement, str):
+                statement = text(statement)
+            result = db_session.execute(statement, params_list)
+            db_session.commit()
+            return result
+        except Exception as e:
+            db_session.rollback()
+            log_error(f"Error al ejecutar la consulta por lotes: {str(e)}")
+            raise
@@ -1,6 +1,7 @@
 from flask_restx import Namespace, Resource, fields
 import logging
-from app import db
+from sqlalchemy import inspect
+from db import engine
 from models import RequestLog
 
 # Configuración de logging
@@ -31,9 +32,8 @@ def init_db_namespace(api):
         def get(self):
             """Verifica la conexión con la base de datos"""
             try:
-                # Ejecutar una consulta simple para listar tablas
-                result = db.engine.execute("SHOW TABLES")
-                tables = [row[0] for row in result]
+                # Listar tablas con el inspector, válido para cualquier dialecto
+                tables = inspect(engine).get_table_names()
                 
                 return {
                     'status': 'success',
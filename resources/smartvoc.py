@@ -1,6 +1,5 @@
 from flask_restx import Namespace, Resource, fields
 import logging
-from app import db
 from services.smartvoc_service import SmartVOCService
 from utils.api_models import create_response_model
 from utils.api_helpers import validate_json_request
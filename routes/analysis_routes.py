@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 import logging
 from services.analysis_service import AnalysisService
 from exceptions.custom_exceptions import ResourceNotFoundError, ValidationError
+from utils.schema_registry import UnknownFieldsError
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -12,6 +13,21 @@ bp = Blueprint('analysis', __name__, url_prefix='/api/analysis')
 # Inicializar el servicio de análisis
 analysis_service = AnalysisService()
 
+@bp.route('/queue/stats', methods=['GET'])
+def queue_stats():
+    """Obtiene la profundidad de la cola de lotes y los percentiles de espera por prioridad"""
+    try:
+        return jsonify({
+            "success": True,
+            "queue": analysis_service.get_queue_stats()
+        })
+    except Exception as e:
+        logger.error(f"Error interno al obtener estadísticas de la cola: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"Error interno: {str(e)}"
+        }), 500
+
 @bp.route('/<client_name>/<conversation_id>', methods=['GET'])
 def get_analysis(client_name, conversation_id):
     """Obtiene análisis para una conversación específica"""
@@ -23,10 +39,17 @@ def get_analysis(client_name, conversation_id):
         result = analysis_service.get_client_analyses(
             client_name=client_name,
             conversation_id=conversation_id,
-            analysis_type=analysis_type
+            analysis_type=analysis_type,
+            fields=request.args.get('fields')
         )
         
         return jsonify(result)
+    except UnknownFieldsError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e),
+            "allowed_fields": e.available
+        }), 400
     except ResourceNotFoundError as e:
         logger.error(f"Error al obtener análisis: {str(e)}")
         return jsonify({
@@ -40,6 +63,23 @@ def get_analysis(client_name, conversation_id):
             "message": f"Error interno: {str(e)}"
         }), 500
 
+@bp.route('/<client_name>', methods=['GET'])
+def list_analyses(client_name):
+    """Obtiene una página de análisis de un cliente, paginada por cursor"""
+    try:
+        params = request.args.to_dict()
+        params['client_name'] = client_name
+        
+        result = analysis_service.get_analyses_list(params)
+        
+        return jsonify(result), 200 if result.get('success') else 400
+    except Exception as e:
+        logger.error(f"Error interno al listar análisis: {str(e)}")
+        return jsonify({
+            "success": False,
+            "message": f"Error interno: {str(e)}"
+        }), 500
+
 @bp.route('/<client_name>', methods=['POST'])
 def create_analysis(client_name):
     """Crea un nuevo análisis para una conversación"""
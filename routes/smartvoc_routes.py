@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from db import db_session
 from models import SmartVOCClient, ClientDetails, FieldGroup, GenerativeAnalysis, Analysis, DynamicTableManager
 from sqlalchemy import text, inspect
@@ -11,6 +11,8 @@ from utils.smartvoc_service import SmartVOCService
 from utils.validation import validate_with, validate_path_params
 from utils.exceptions import ValidationError
 from utils.error_handler import log_exception
+from utils.api_helpers import load_bulk_payload
+from utils.json_response import jsonify_raw
 from schemas.client import (
     ClientPathParamsSchema,
     ClientCreateSchema,
@@ -21,7 +23,9 @@ from schemas.conversation import (
     ConversationPathParamsSchema,
     ConversationCreateSchema,
     ConversationUpdateSchema,
-    ConversationQueryParamsSchema
+    ConversationQueryParamsSchema,
+    ConversationBulkQueryParamsSchema,
+    ConversationExportQueryParamsSchema
 )
 
 # Crear el blueprint para rutas de SmartVOC
@@ -69,7 +73,7 @@ def delete_client(client_id):
 def get_conversations(validated_data):
     """Obtiene conversaciones para un cliente específico."""
     response, status_code = SmartVOCService.get_conversations(validated_data)
-    return jsonify(response), status_code
+    return jsonify_raw(response, status_code)
 
 @bp.route('/conversations', methods=['POST'])
 @validate_with(ConversationCreateSchema)
@@ -78,6 +82,23 @@ def create_conversation(validated_data):
     response, status_code = SmartVOCService.create_conversation(validated_data)
     return jsonify(response), status_code
 
+@bp.route('/conversations/bulk', methods=['POST'])
+@validate_with(ConversationBulkQueryParamsSchema, location='args')
+def create_conversations_bulk(validated_data):
+    """Crea conversaciones en lote a partir de un arreglo JSON o un stream NDJSON."""
+    items = load_bulk_payload()
+    response, status_code = SmartVOCService.create_conversations_bulk(items, validated_data.get('chunkSize'))
+    return jsonify(response), status_code
+
+@bp.route('/conversations/export', methods=['GET'])
+@validate_with(ConversationExportQueryParamsSchema, location='args')
+def export_conversations(validated_data):
+    """Exporta todas las conversaciones de un cliente como un stream NDJSON."""
+    response, status_code = SmartVOCService.export_conversations(validated_data)
+    if status_code != 200:
+        return jsonify(response), status_code
+    return Response(stream_with_context(response), mimetype='application/x-ndjson')
+
 @bp.route('/conversations/<conversation_id>', methods=['GET'])
 @validate_path_params(ConversationPathParamsSchema)
 def get_conversation(conversation_id):
@@ -89,7 +110,7 @@ def get_conversation(conversation_id):
             details={"missing_fields": ["clientId"]}
         )
     response, status_code = SmartVOCService.get_conversation(client_id, conversation_id)
-    return jsonify(response), status_code
+    return jsonify_raw(response, status_code)
 
 @bp.route('/conversations/<conversation_id>', methods=['PUT'])
 @validate_path_params(ConversationPathParamsSchema)
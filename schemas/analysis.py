@@ -81,4 +81,20 @@ class AnalysisQueryParamsSchema(Schema):
     batchRunId = fields.String(required=False)
     analysisType = fields.String(required=False)
     
-    # No necesita validación adicional porque todos los campos son opcionales 
\ No newline at end of file
+    # No necesita validación adicional porque todos los campos son opcionales 
+
+class AnalysisListQueryParamsSchema(Schema):
+    """Esquema para validar parámetros de consulta del listado paginado de análisis."""
+    class Meta:
+        unknown = EXCLUDE
+    
+    client_name = fields.String(required=True, validate=validate.Length(min=1, max=100))
+    page_size = fields.Integer(required=False, validate=validate.Range(min=1, max=100), load_default=10)
+    page = fields.Integer(required=False, validate=validate.Range(min=1), load_default=1)
+    cursor = fields.String(required=False, validate=validate.Length(min=1, max=512))
+    status = fields.String(required=False)
+    count = fields.String(required=False, validate=validate.OneOf(["exact", "estimated", "none"]), load_default="exact")
+    start_date = fields.String(required=False)
+    end_date = fields.String(required=False)
+    # El atributo no puede llamarse `fields` porque Schema ya lo usa
+    fieldList = fields.String(required=False, data_key='fields', validate=validate.Length(min=1, max=1000))
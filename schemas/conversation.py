@@ -92,9 +92,35 @@ class ConversationQueryParamsSchema(Schema):
     conversationId = fields.String(required=False)
     limit = fields.Integer(required=False, validate=validate.Range(min=1, max=100), load_default=10)
     offset = fields.Integer(required=False, validate=validate.Range(min=0), load_default=0)
+    cursor = fields.String(required=False, validate=validate.Length(min=1, max=512))
+    # Columnas a devolver separadas por comas; el atributo no puede llamarse
+    # `fields` porque Schema ya lo usa
+    fieldList = fields.String(required=False, data_key='fields', validate=validate.Length(min=1, max=1000))
     
     @validates_schema
     def validate_client_params(self, data, **kwargs):
         """Valida que se proporcione al menos un parámetro de cliente."""
         if not any(key in data for key in ['clientId', 'clientName']):
-            raise ValidationError({"_schema": ["Debe proporcionar clientId o clientName"]}) 
\ No newline at end of file
+            raise ValidationError({"_schema": ["Debe proporcionar clientId o clientName"]}) 
+
+class ConversationBulkQueryParamsSchema(Schema):
+    """Esquema para validar parámetros de consulta de la carga masiva de conversaciones."""
+    class Meta:
+        unknown = EXCLUDE
+    
+    chunkSize = fields.Integer(required=False, validate=validate.Range(min=1, max=5000))
+
+class ConversationExportQueryParamsSchema(Schema):
+    """Esquema para validar parámetros de consulta de la exportación de conversaciones."""
+    class Meta:
+        unknown = EXCLUDE
+    
+    clientId = fields.String(required=False)
+    clientName = fields.String(required=False)
+    batchSize = fields.Integer(required=False, validate=validate.Range(min=1, max=10000))
+    
+    @validates_schema
+    def validate_client_params(self, data, **kwargs):
+        """Valida que se proporcione al menos un parámetro de cliente."""
+        if not any(key in data for key in ['clientId', 'clientName']):
+            raise ValidationError({"_schema": ["Debe proporcionar clientId o clientName"]})
\ No newline at end of file
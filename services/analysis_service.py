@@ -7,13 +7,22 @@ import json
 import uuid
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text, inspect
-from flask import current_app
+from flask import current_app, g, has_request_context, request
 from jsonschema import validate, ValidationError
+from marshmallow import ValidationError as MarshmallowValidationError
 
-from db import db_session, engine
-from models import RequestLog
+from config import active_config
+from db import db_session, engine, read_bind, read_only
+from schemas.analysis import AnalysisListQueryParamsSchema
 from schemas.analysis_schema import analysis_schema, analysis_update_schema
 from exceptions.custom_exceptions import ResourceNotFoundError
+from utils.exceptions import APIError
+from utils.client_cache import client_cache
+from utils.schema_registry import UnknownFieldsError, parse_fields, schema_registry
+from utils.pagination import encode_cursor, keyset_condition, keyset_params
+from utils.job_queue import JobQueue
+from utils.upsert import update_returning_statement, upsert, upsert_many
+from utils.request_log_writer import request_log_writer
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +36,16 @@ class AnalysisService:
             # Primero comprobamos si existe la tabla para este cliente
             table_name = f"{client_name.lower().replace(' ', '_')}_{self.table_name}"
             
-            inspector = inspect(engine)
-            if not inspector.has_table(table_name):
+            if not schema_registry.has_table(table_name, engine):
                 logger.info(f"Creando tabla {table_name}...")
+                # SQLite solo genera el id automáticamente con INTEGER PRIMARY KEY
+                if engine.dialect.name == 'sqlite':
+                    id_column = "id INTEGER PRIMARY KEY AUTOINCREMENT"
+                else:
+                    id_column = "id SERIAL PRIMARY KEY"
                 query = text(f"""
                 CREATE TABLE IF NOT EXISTS {table_name} (
-                    id SERIAL PRIMARY KEY,
+                    {id_column},
                     conversation_id VARCHAR(100) NOT NULL,
                     analysis_type VARCHAR(50) NOT NULL,
                     result JSONB NOT NULL,
@@ -44,6 +57,7 @@ class AnalysisService:
                 """)
                 db_session.execute(query)
                 db_session.commit()
+                schema_registry.register(table_name, bind=engine)
                 logger.info(f"Tabla {table_name} creada correctamente")
             return table_name
         except SQLAlchemyError as e:
@@ -51,13 +65,26 @@ class AnalysisService:
             db_session.rollback()
             raise
     
-    def get_client_analyses(self, client_name, conversation_id=None, analysis_type=None):
-        """Obtiene los análisis para un cliente específico, opcionalmente filtrado por conversación y tipo"""
+    @read_only()
+    def get_client_analyses(self, client_name, conversation_id=None, analysis_type=None, fields=None):
+        """
+        Obtiene los análisis para un cliente específico, opcionalmente filtrado por conversación y tipo.
+        
+        Con `fields` (columnas separadas por comas o lista) solo se leen y
+        devuelven esas columnas; una columna inexistente lanza `UnknownFieldsError`.
+        """
         try:
             table_name = self._ensure_table_exists(client_name)
+            fields = parse_fields(fields)
+            
+            # La réplica puede no tener todavía la tabla recién creada en el primario
+            bind = read_bind()
+            if not schema_registry.has_table(table_name, bind):
+                return {"success": True, "analyses": []}
             
             params = {}
-            query_str = f"SELECT * FROM {table_name}"
+            columns = schema_registry.select_columns(table_name, bind, fields) if fields else '*'
+            query_str = f"SELECT {columns} FROM {table_name}"
             
             # Aplicar filtros si se proporcionan
             conditions = []
@@ -77,18 +104,7 @@ class AnalysisService:
             query = text(query_str)
             result = db_session.execute(query, params)
             
-            analyses = []
-            for row in result:
-                analysis = {
-                    'id': row.id,
-                    'conversation_id': row.conversation_id,
-                    'analysis_type': row.analysis_type,
-                    'result': row.result,
-                    'metadata': row.metadata,
-                    'created_at': row.created_at,
-                    'updated_at': row.updated_at
-                }
-                analyses.append(analysis)
+            analyses = [self._row_to_dict(row, fields) for row in result]
                 
             # Registrar solicitud
             self._log_request("get_client_analyses", {
@@ -119,26 +135,6 @@ class AnalysisService:
                 
             table_name = self._ensure_table_exists(client_name)
             
-            # Verificar si ya existe un análisis para esta conversación y tipo
-            exists_query = text(f"""
-            SELECT COUNT(*) as count FROM {table_name} 
-            WHERE conversation_id = :conversation_id AND analysis_type = :analysis_type
-            """)
-            exists_result = db_session.execute(exists_query, {
-                'conversation_id': analysis_data.get('conversation_id'),
-                'analysis_type': analysis_data.get('analysis_type')
-            })
-            
-            count = exists_result.scalar()
-            if count and count > 0:
-                # Realizar actualización en su lugar
-                return self.update_analysis(
-                    client_name, 
-                    analysis_data.get('conversation_id'),
-                    analysis_data.get('analysis_type'),
-                    analysis_data
-                )
-            
             # Convertir objetos a JSON string si es necesario
             result_data = analysis_data.get('result')
             if isinstance(result_data, dict):
@@ -148,22 +144,19 @@ class AnalysisService:
             if isinstance(metadata, dict):
                 metadata = json.dumps(metadata)
             
-            # Insertar nuevo análisis
-            insert_query = text(f"""
-            INSERT INTO {table_name} (conversation_id, analysis_type, result, metadata)
-            VALUES (:conversation_id, :analysis_type, :result, :metadata)
-            RETURNING *
-            """)
-            
-            params = {
-                'conversation_id': analysis_data.get('conversation_id'),
-                'analysis_type': analysis_data.get('analysis_type'),
-                'result': result_data,
-                'metadata': metadata
-            }
-            
-            insert_result = db_session.execute(insert_query, params)
-            row = insert_result.fetchone()
+            # Insertar el análisis o actualizarlo si ya existe para la conversación y tipo
+            row = upsert(
+                db_session,
+                table_name,
+                {
+                    'conversation_id': analysis_data.get('conversation_id'),
+                    'analysis_type': analysis_data.get('analysis_type'),
+                    'result': result_data,
+                    'metadata': metadata
+                },
+                conflict_columns=['conversation_id', 'analysis_type'],
+                update_expressions={'updated_at': 'CURRENT_TIMESTAMP'}
+            )
             db_session.commit()
             
             new_analysis = {
@@ -176,7 +169,7 @@ class AnalysisService:
                 'updated_at': row.updated_at
             }
             
-            logger.info(f"Análisis creado con éxito para conversación: {new_analysis['conversation_id']}")
+            logger.info(f"Análisis guardado con éxito para conversación: {new_analysis['conversation_id']}")
             return new_analysis
         except ValidationError:
             raise
@@ -190,20 +183,6 @@ class AnalysisService:
         try:
             table_name = self._ensure_table_exists(client_name)
             
-            # Verificar que el análisis exista
-            check_query = text(f"""
-            SELECT * FROM {table_name} 
-            WHERE conversation_id = :conversation_id AND analysis_type = :analysis_type
-            """)
-            check_result = db_session.execute(check_query, {
-                'conversation_id': conversation_id,
-                'analysis_type': analysis_type
-            })
-            
-            existing_analysis = check_result.fetchone()
-            if not existing_analysis:
-                raise ResourceNotFoundError(f"Análisis no encontrado para conversación {conversation_id} y tipo {analysis_type}")
-            
             # Preparar campos a actualizar
             update_fields = []
             params = {
@@ -227,27 +206,17 @@ class AnalysisService:
             
             update_fields.append("updated_at = CURRENT_TIMESTAMP")
             
-            if not update_fields:
-                # No hay cambios, devolver el análisis existente
-                return {
-                    'id': existing_analysis.id,
-                    'conversation_id': existing_analysis.conversation_id,
-                    'analysis_type': existing_analysis.analysis_type,
-                    'result': existing_analysis.result,
-                    'metadata': existing_analysis.metadata,
-                    'created_at': existing_analysis.created_at,
-                    'updated_at': existing_analysis.updated_at
-                }
-            
-            # Actualizar análisis
-            update_query = text(f"""
-            UPDATE {table_name}
-            SET {', '.join(update_fields)}
-            WHERE conversation_id = :conversation_id AND analysis_type = :analysis_type
-            RETURNING *
-            """)
-            update_result = db_session.execute(update_query, params)
-            row = update_result.fetchone()
+            # Actualizar y obtener el análisis en una sola sentencia
+            update_query = update_returning_statement(
+                engine.dialect,
+                table_name,
+                ', '.join(update_fields),
+                "conversation_id = :conversation_id AND analysis_type = :analysis_type"
+            )
+            row = db_session.execute(update_query, params).fetchone()
+            if not row:
+                db_session.rollback()
+                raise ResourceNotFoundError(f"Análisis no encontrado para conversación {conversation_id} y tipo {analysis_type}")
             db_session.commit()
             
             updated_analysis = {
@@ -316,146 +285,157 @@ class AnalysisService:
             logger.error(f"Error al eliminar análisis: {str(e)}")
             raise ValidationError(f"Error al eliminar análisis: {str(e)}")
 
+    @read_only()
     def get_analyses_list(self, params):
         """
-        Obtiene una lista paginada de análisis según criterios de filtrado
+        Obtiene una lista de análisis paginada por cursor según criterios de filtrado
+        
+        Los filtros, el orden y el límite se resuelven en una sola consulta SQL
+        parametrizada y el total en un COUNT(*) aparte con los mismos filtros.
+        Con cursor, cada página es un rango sobre (created_at, id), por lo que
+        su costo no depende de la profundidad de la paginación; `page` se
+        mantiene por compatibilidad y se traduce a OFFSET en la misma consulta.
         
         Args:
             params (dict): Parámetros de filtrado y paginación
                 - client_name (str): Nombre del cliente
                 - start_date (str): Fecha de inicio (YYYY-MM-DD)
                 - end_date (str): Fecha de fin (YYYY-MM-DD)
-                - page (int): Número de página
-                - page_size (int): Tamaño de página
+                - page_size (int): Tamaño de página (1-100)
+                - cursor (str): Cursor devuelto como next_cursor en la página anterior
+                - page (int): Número de página, si no se usa cursor
                 - status (str): Estado del análisis (complete, pending, error)
+                - count (str): Cálculo del total: exact (por defecto), estimated o none
+                - fields (str): Columnas a devolver, separadas por comas
                 
         Returns:
-            dict: Resultado con la lista paginada de análisis
+            dict: Resultado con la página de análisis y el cursor de la siguiente
         """
         try:
-            client_name = params.get('client_name')
-            if not client_name:
+            if not params.get('client_name'):
                 return {
                     "success": False,
                     "error": "Se requiere el parámetro client_name"
                 }
-                
-            # Convertir parámetros
-            page = int(params.get('page', 1))
-            page_size = int(params.get('page_size', 10))
+            
+            # Validar y convertir parámetros; page_size tiene el mismo máximo
+            # que el `limit` del listado de conversaciones
+            try:
+                params = AnalysisListQueryParamsSchema().load(params)
+            except MarshmallowValidationError as e:
+                return {
+                    "success": False,
+                    "error": "Parámetros de consulta inválidos",
+                    "details": e.messages
+                }
+            client_name = params['client_name']
+            page_size = params['page_size']
+            page = params['page']
             status = params.get('status')
+            cursor = params.get('cursor')
+            count_mode = params['count']
+            fields = parse_fields(params.get('fieldList'))
             
             # Fechas
             start_date = params.get('start_date')
             end_date = params.get('end_date')
             
-            # Obtener análisis con filtros aplicados
-            result = self.get_client_analyses(client_name)
-            if not result.get('success'):
-                return result
-                
-            analyses = result.get('analyses', [])
+            table_name = self._ensure_table_exists(client_name)
             
-            # Aplicar filtro de fechas si se proporciona
-            if start_date or end_date:
-                filtered_analyses = []
-                
-                for analysis in analyses:
-                    created_at = analysis.get('createdAt')
-                    if not created_at:
-                        continue
-                        
-                    # Convertir a objeto datetime si es string
-                    if isinstance(created_at, str):
-                        try:
-                            created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        except (ValueError, TypeError):
-                            continue
-                            
-                    # Filtrar por fecha de inicio
-                    if start_date:
-                        try:
-                            start_datetime = datetime.fromisoformat(start_date)
-                            if created_at < start_datetime:
-                                continue
-                        except (ValueError, TypeError):
-                            pass
-                            
-                    # Filtrar por fecha de fin
-                    if end_date:
-                        try:
-                            end_datetime = datetime.fromisoformat(end_date)
-                            # Ajustar al final del día
-                            end_datetime = end_datetime + timedelta(days=1) - timedelta(microseconds=1)
-                            if created_at > end_datetime:
-                                continue
-                        except (ValueError, TypeError):
-                            pass
-                            
-                    filtered_analyses.append(analysis)
-                    
-                analyses = filtered_analyses
-                
-            # Aplicar filtro de estado si se proporciona
-            if status:
-                if status == 'complete':
-                    analyses = [a for a in analyses if a.get('isComplete')]
-                elif status == 'pending':
-                    analyses = [a for a in analyses if a.get('isComplete') is False and a.get('errorMessage') is None]
-                elif status == 'error':
-                    analyses = [a for a in analyses if a.get('errorMessage') is not None]
-            
-            # Calcular páginas para la paginación
-            total = len(analyses)
-            total_pages = (total + page_size - 1) // page_size if page_size > 0 else 1
-            
-            # Validar página solicitada
-            if page < 1:
-                page = 1
-            elif page > total_pages and total_pages > 0:
-                page = total_pages
-                
-            # Aplicar paginación
-            start_idx = (page - 1) * page_size
-            end_idx = min(start_idx + page_size, total)
-            
-            page_items = analyses[start_idx:end_idx] if 0 <= start_idx < total else []
-            
-            # Construir enlaces para paginación
-            base_url = f"/api/analysis/batch?client_name={client_name}"
-            if status:
-                base_url += f"&status={status}"
-            if start_date:
-                base_url += f"&start_date={start_date}"
-            if end_date:
-                base_url += f"&end_date={end_date}"
-                
-            links = {
-                "self": f"{base_url}&page={page}&page_size={page_size}"
-            }
+            # La réplica puede no tener todavía la tabla recién creada en el primario
+            bind = read_bind()
+            if not schema_registry.has_table(table_name, bind):
+                response = {"success": True, "items": [], "total": 0, "pageSize": page_size, "next_cursor": None}
+                if not cursor:
+                    response.update({"page": page, "totalPages": 0})
+                return response
             
-            # Enlace a página anterior
-            if page > 1:
-                links["prev"] = f"{base_url}&page={page-1}&page_size={page_size}"
-            else:
-                links["prev"] = None
-                
-            # Enlace a página siguiente
-            if page < total_pages:
-                links["next"] = f"{base_url}&page={page+1}&page_size={page_size}"
-            else:
-                links["next"] = None
+            conditions = []
+            query_params = {}
+            
+            # Filtro de fechas; la fecha de fin incluye el día completo
+            try:
+                if start_date:
+                    conditions.append("created_at >= :start_date")
+                    query_params['start_date'] = datetime.fromisoformat(start_date)
+                if end_date:
+                    conditions.append("created_at < :end_date")
+                    query_params['end_date'] = datetime.fromisoformat(end_date) + timedelta(days=1)
+            except ValueError:
+                return {
+                    "success": False,
+                    "error": "Formato de fecha inválido, se esperaba YYYY-MM-DD"
+                }
             
-            return {
+            # Filtro de estado sobre los metadatos del análisis
+            status_condition = self._status_condition(status)
+            if status_condition:
+                conditions.append(status_condition)
+            
+            # El total usa solo los filtros, sin la posición de la página
+            total = None
+            if count_mode != 'none':
+                total = self._count_analyses(
+                    table_name, conditions, query_params,
+                    estimated=(count_mode == 'estimated')
+                )
+            
+            page_conditions = list(conditions)
+            page_params = dict(query_params, limit=page_size + 1)
+            
+            # Posición de la página anterior
+            if cursor:
+                page_conditions.append(keyset_condition())
+                page_params.update(keyset_params(cursor))
+            
+            # El cursor de la página siguiente necesita created_at e id
+            columns = '*'
+            if fields:
+                columns = schema_registry.select_columns(
+                    table_name, bind, fields, required=('created_at', 'id')
+                )
+            
+            query_str = f"SELECT {columns} FROM {table_name}"
+            if page_conditions:
+                query_str += " WHERE " + " AND ".join(page_conditions)
+            query_str += " ORDER BY created_at DESC, id DESC LIMIT :limit"
+            if not cursor and page > 1:
+                query_str += " OFFSET :offset"
+                page_params['offset'] = (page - 1) * page_size
+            
+            # Se pide una fila extra para saber si existe una página siguiente
+            rows = db_session.execute(text(query_str), page_params).fetchall()
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+            
+            next_cursor = None
+            if has_more:
+                next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+            
+            response = {
                 "success": True,
-                "items": page_items,
+                "items": [self._row_to_dict(row, fields) for row in rows],
                 "total": total,
-                "page": page,
                 "pageSize": page_size,
-                "totalPages": total_pages,
-                "links": links
+                "next_cursor": next_cursor
             }
+            if not cursor:
+                response["page"] = page
+                if total is not None:
+                    response["totalPages"] = (total + page_size - 1) // page_size
+            return response
             
+        except APIError as e:
+            return {
+                "success": False,
+                "error": e.message
+            }
+        except UnknownFieldsError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "allowed_fields": e.available
+            }
         except Exception as e:
             logger.error(f"Error al obtener lista de análisis: {str(e)}")
             return {
@@ -463,6 +443,93 @@ class AnalysisService:
                 "error": f"Error al procesar la solicitud: {str(e)}"
             }
 
+    def _count_analyses(self, table_name, conditions, params, estimated=False):
+        """
+        Cuenta los análisis que cumplen los filtros.
+        
+        Si se pide una estimación y no hay filtros, se usan las estadísticas
+        del catálogo cuando el motor las ofrece, evitando recorrer la tabla.
+        
+        Returns:
+            int: Total exacto o estimado
+        """
+        if estimated and not conditions:
+            estimate = self._estimated_row_count(table_name)
+            if estimate is not None:
+                return estimate
+        
+        query_str = f"SELECT COUNT(*) FROM {table_name}"
+        if conditions:
+            query_str += " WHERE " + " AND ".join(conditions)
+        return db_session.execute(text(query_str), params).scalar()
+
+    def _estimated_row_count(self, table_name):
+        """
+        Obtiene el número aproximado de filas de una tabla desde el catálogo.
+        
+        Returns:
+            int: Filas estimadas o None si el motor no ofrece la estadística
+        """
+        dialect = engine.dialect.name
+        if dialect == 'postgresql':
+            query = text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table_name")
+        elif dialect == 'mssql':
+            query = text("""
+            SELECT SUM(row_count) FROM sys.dm_db_partition_stats
+            WHERE object_id = OBJECT_ID(:table_name) AND index_id IN (0, 1)
+            """)
+        else:
+            return None
+        
+        estimate = db_session.execute(query, {'table_name': table_name}).scalar()
+        # PostgreSQL devuelve -1 si la tabla nunca fue analizada
+        if estimate is None or estimate < 0:
+            return None
+        return int(estimate)
+
+    def _status_condition(self, status):
+        """
+        Traduce un estado de análisis (complete, pending, error) a una condición
+        SQL sobre los campos isComplete y errorMessage de los metadatos.
+        
+        Returns:
+            str: Condición SQL o None si el estado no se reconoce
+        """
+        dialect = engine.dialect.name
+        if dialect == 'postgresql':
+            is_complete = "(metadata->>'isComplete') = 'true'"
+            is_incomplete = "(metadata->>'isComplete') = 'false'"
+            error_message = "(metadata->>'errorMessage')"
+        elif dialect == 'mssql':
+            is_complete = "JSON_VALUE(metadata, '$.isComplete') = 'true'"
+            is_incomplete = "JSON_VALUE(metadata, '$.isComplete') = 'false'"
+            error_message = "JSON_VALUE(metadata, '$.errorMessage')"
+        else:
+            is_complete = "json_extract(metadata, '$.isComplete') = 1"
+            is_incomplete = "json_extract(metadata, '$.isComplete') = 0"
+            error_message = "json_extract(metadata, '$.errorMessage')"
+        
+        conditions = {
+            'complete': is_complete,
+            'pending': f"{is_incomplete} AND {error_message} IS NULL",
+            'error': f"{error_message} IS NOT NULL"
+        }
+        return conditions.get(status)
+
+    def _row_to_dict(self, row, fields=None):
+        """Convierte una fila de la tabla de análisis a un diccionario, opcionalmente solo con `fields`"""
+        if fields:
+            return {field: row._mapping[field] for field in fields}
+        return {
+            'id': row.id,
+            'conversation_id': row.conversation_id,
+            'analysis_type': row.analysis_type,
+            'result': row.result,
+            'metadata': row.metadata,
+            'created_at': row.created_at,
+            'updated_at': row.updated_at
+        }
+
     def start_batch_processing(self, client_name, conversation_ids, options=None):
         """
         Inicia el procesamiento de un lote de análisis para múltiples conversaciones
@@ -485,6 +552,10 @@ class AnalysisService:
                 
             if not conversation_ids or not isinstance(conversation_ids, list):
                 raise ValidationError("Se requiere una lista válida de IDs de conversaciones")
+            
+            # Un nombre desconocido produciría filas que fallarían todas en el worker
+            if not client_cache.get(client_name=client_name, session=db_session, fresh=True):
+                raise ResourceNotFoundError(f"No se encontró un cliente con el nombre '{client_name}'")
                 
             # Generar ID de lote
             batch_id = str(uuid.uuid4())
@@ -493,26 +564,37 @@ class AnalysisService:
             options = options or {}
             priority = options.get('priority', 3)
             analysis_type = options.get('analysisType', 'basic')
+            if not isinstance(priority, int) or not 1 <= priority <= 5:
+                raise ValidationError("La prioridad debe ser un entero entre 1 y 5")
+            
+            # Un mismo ID repetido no puede afectar dos veces la misma fila del upsert
+            conversation_ids = list(dict.fromkeys(conversation_ids))
+            metadata = {
+                "batchRunId": batch_id,
+                "isComplete": False,
+                "priority": priority,
+                "queuedAt": datetime.now().isoformat(),
+                "totalInBatch": len(conversation_ids),
+                "notifyOnComplete": options.get('notifyOnComplete', False)
+            }
             
-            # Crear análisis pendientes para cada conversación
-            for conversation_id in conversation_ids:
-                # Datos del análisis
-                analysis_data = {
-                    "clientName": client_name,
-                    "conversationId": conversation_id,
-                    "batchRunId": batch_id,
-                    "analysisType": analysis_type,
-                    "isComplete": False,
-                    "metadata": {
-                        "priority": priority,
-                        "queuedAt": datetime.now().isoformat(),
-                        "totalInBatch": len(conversation_ids),
-                        "notifyOnComplete": options.get('notifyOnComplete', False)
-                    }
-                }
-                
-                # Crear análisis
-                self.create_analysis(client_name, analysis_data)
+            # Crear los análisis pendientes y encolar el lote en una sola transacción;
+            # el planificador de los workers respeta la prioridad
+            table_name = self._ensure_table_exists(client_name)
+            try:
+                self._upsert_queued_analyses(table_name, conversation_ids, analysis_type, metadata)
+                JobQueue(db_session).enqueue(
+                    client_name,
+                    [{"id": conversation_id} for conversation_id in conversation_ids],
+                    analysis_type,
+                    priority=priority,
+                    batch_id=batch_id,
+                    commit=False
+                )
+                db_session.commit()
+            except SQLAlchemyError:
+                db_session.rollback()
+                raise
             
             # Registrar inicio del procesamiento por lotes
             self._log_request("start_batch_processing", {
@@ -523,36 +605,152 @@ class AnalysisService:
                 "analysis_type": analysis_type
             })
             
-            # En una implementación real, aquí se iniciaría un procesamiento asíncrono
-            # por ejemplo, mediante un trabajador de Celery o una cola de tareas
-            
             return batch_id
             
-        except ValidationError as ve:
-            raise ve
+        except (ValidationError, ResourceNotFoundError):
+            raise
         except Exception as e:
             logger.error(f"Error al iniciar procesamiento por lotes: {str(e)}")
             raise Exception(f"Error al iniciar procesamiento por lotes: {str(e)}")
 
+    def _upsert_queued_analyses(self, table_name, conversation_ids, analysis_type, metadata, chunk_size=None):
+        """
+        Crea o reinicia los análisis pendientes de un lote con upserts multi-fila
+        sobre `(conversation_id, analysis_type)`, sin confirmar la transacción.
+        
+        Args:
+            table_name (str): Tabla de análisis del cliente
+            conversation_ids (list): IDs de conversaciones sin duplicados
+            analysis_type (str): Tipo de análisis
+            metadata (dict): Metadatos comunes a todas las filas
+            chunk_size (int, opcional): Filas por sentencia
+        """
+        result = json.dumps({"status": "queued"})
+        metadata = json.dumps(metadata)
+        rows = [
+            {
+                'conversation_id': conversation_id,
+                'analysis_type': analysis_type,
+                'result': result,
+                'metadata': metadata
+            }
+            for conversation_id in conversation_ids
+        ]
+        upsert_many(
+            db_session,
+            table_name,
+            rows,
+            conflict_columns=['conversation_id', 'analysis_type'],
+            update_expressions={'updated_at': 'CURRENT_TIMESTAMP'},
+            chunk_size=chunk_size or active_config.BULK_INSERT_CHUNK_SIZE
+        )
+
+    def record_batch_result(self, client_name, conversation_id, analysis_type, batch_id, result=None,
+                            error_message=None, commit=True):
+        """
+        Completa el análisis pendiente que `start_batch_processing` creó para
+        una conversación del lote, con el resultado del worker o su error.
+        
+        Solo se actualiza la fila si sigue perteneciendo a `batch_id`: si un
+        lote posterior volvió a encolar la conversación, la fila es de ese lote.
+        
+        Args:
+            client_name (str): Nombre del cliente
+            conversation_id (str): ID de la conversación
+            analysis_type (str): Tipo de análisis
+            batch_id (str): ID del lote que procesó la conversación
+            result (dict, opcional): Resultado del análisis
+            error_message (str, opcional): Error definitivo del análisis
+            commit (bool): Confirmar la transacción; con False la confirma quien
+                llama, y un error de base de datos se propaga para que la revierta
+            
+        Returns:
+            bool: True si se actualizó el análisis pendiente
+        """
+        table_name = f"{client_name.lower().replace(' ', '_')}_{self.table_name}"
+        if not schema_registry.has_table(table_name, engine):
+            return False
+        
+        params = {"conversation_id": conversation_id, "analysis_type": analysis_type}
+        try:
+            row = db_session.execute(
+                text(f"SELECT metadata FROM {table_name} "
+                     f"WHERE conversation_id = :conversation_id AND analysis_type = :analysis_type"),
+                params
+            ).fetchone()
+            metadata = row.metadata if row else None
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            if not metadata or metadata.get('batchRunId') != batch_id:
+                return False
+            
+            # Con error la fila deja de estar pendiente y pasa al estado 'error'
+            metadata.update({
+                "isComplete": error_message is None,
+                "errorMessage": error_message,
+                "completedAt": datetime.now().isoformat()
+            })
+            assignments = "metadata = :metadata, updated_at = CURRENT_TIMESTAMP"
+            params["metadata"] = json.dumps(metadata)
+            if result is not None:
+                assignments += ", result = :result"
+                params["result"] = json.dumps(result, default=str)
+            db_session.execute(
+                text(f"UPDATE {table_name} SET {assignments} "
+                     f"WHERE conversation_id = :conversation_id AND analysis_type = :analysis_type"),
+                params
+            )
+            if commit:
+                db_session.commit()
+            return True
+        except SQLAlchemyError as e:
+            if not commit:
+                raise
+            db_session.rollback()
+            logger.error(f"Error al registrar el resultado del lote {batch_id} para {conversation_id}: {str(e)}")
+            return False
+
+    def get_queue_stats(self):
+        """
+        Obtiene la profundidad de la cola de lotes y los percentiles de espera por prioridad
+        
+        Returns:
+            dict: Estadísticas de la cola
+        """
+        return JobQueue(db_session).queue_stats()
+
     def _log_request(self, operation, details):
         """
-        Registra las solicitudes de análisis en la tabla de logs
+        Registra las solicitudes de análisis en la tabla de logs.
+        
+        Dentro de una petición medida por `utils.request_timing`, los detalles
+        se guardan en `g` y se adjuntan como `request_data` a la única fila que
+        escribe el hook after_request. Fuera de ella, la fila se encola y la
+        escribe en segundo plano `request_log_writer`, sin abrir una transacción.
         
         Args:
             operation (str): Operación realizada
             details (dict): Detalles de la operación
         """
+        if not active_config.REQUEST_LOG_ENABLED:
+            return
         try:
-            request_log = RequestLog(
-                operation=operation,
-                details=json.dumps(details),
-                timestamp=datetime.now()
-            )
-            db_session.add(request_log)
-            db_session.commit()
+            request_data = json.dumps({"operation": operation, "details": details}, default=str)
+            if has_request_context() and 'request_started_ns' in g:
+                g.request_log_data = request_data
+                return
+            
+            row = {'endpoint': operation, 'request_data': request_data}
+            if has_request_context():
+                row.update({
+                    'endpoint': request.path[:255],
+                    'method': request.method,
+                    'ip_address': request.remote_addr,
+                    'user_agent': (request.user_agent.string or '')[:255]
+                })
+            request_log_writer.submit(row)
         except Exception as e:
             logger.error(f"Error al registrar solicitud: {str(e)}")
-            db_session.rollback()
 
 # Funciones de compatibilidad con versiones anteriores
 def get_client_analyses(client_name, conversation_id=None, analysis_type=None):
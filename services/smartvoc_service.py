@@ -1,6 +1,7 @@
+import json
 import logging
 from datetime import datetime
-from app import db
+from db import db_session, engine
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text, inspect
 from exceptions.custom_exceptions import ResourceNotFoundError, ValidationError
@@ -14,27 +15,32 @@ class SmartVOCService:
     def _ensure_table_exists(self):
         """Asegura que la tabla de clientes existe en la base de datos"""
         try:
-            inspector = inspect(db.engine)
+            inspector = inspect(engine)
             if not inspector.has_table(self.table_name):
                 logger.info(f"Creando tabla {self.table_name}...")
+                # Tipos de la clave y del JSON según el dialecto del engine compartido
+                if engine.dialect.name == 'sqlite':
+                    id_column, json_type = "INTEGER PRIMARY KEY AUTOINCREMENT", "TEXT"
+                else:
+                    id_column, json_type = "SERIAL PRIMARY KEY", "JSONB"
                 query = text(f"""
                 CREATE TABLE IF NOT EXISTS {self.table_name} (
-                    id SERIAL PRIMARY KEY,
+                    id {id_column},
                     name VARCHAR(100) NOT NULL UNIQUE,
                     api_key VARCHAR(100) NOT NULL UNIQUE,
-                    config JSONB DEFAULT '{}',
+                    config {json_type} DEFAULT '{{}}',
                     active BOOLEAN DEFAULT TRUE,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
                 """)
-                db.session.execute(query)
-                db.session.commit()
+                db_session.execute(query)
+                db_session.commit()
                 logger.info(f"Tabla {self.table_name} creada correctamente")
             return True
         except SQLAlchemyError as e:
             logger.error(f"Error al verificar/crear tabla {self.table_name}: {str(e)}")
-            db.session.rollback()
+            db_session.rollback()
             raise
     
     def get_clients(self):
@@ -42,7 +48,7 @@ class SmartVOCService:
         self._ensure_table_exists()
         try:
             query = text(f"SELECT * FROM {self.table_name} ORDER BY name")
-            result = db.session.execute(query)
+            result = db_session.execute(query)
             clients = []
             for row in result:
                 client = {
@@ -70,10 +76,10 @@ class SmartVOCService:
         try:
             if client_id:
                 query = text(f"SELECT * FROM {self.table_name} WHERE id = :client_id")
-                result = db.session.execute(query, {'client_id': client_id})
+                result = db_session.execute(query, {'client_id': client_id})
             else:
                 query = text(f"SELECT * FROM {self.table_name} WHERE name = :client_name")
-                result = db.session.execute(query, {'client_name': client_name})
+                result = db_session.execute(query, {'client_name': client_name})
             
             row = result.fetchone()
             if not row:
@@ -111,7 +117,7 @@ class SmartVOCService:
             SELECT COUNT(*) as count FROM {self.table_name} 
             WHERE name = :name OR api_key = :api_key
             """)
-            result = db.session.execute(query, {
+            result = db_session.execute(query, {
                 'name': client_data.get('name'),
                 'api_key': client_data.get('api_key')
             })
@@ -124,15 +130,16 @@ class SmartVOCService:
             VALUES (:name, :api_key, :config, :active)
             RETURNING *
             """)
-            result = db.session.execute(query, {
+            result = db_session.execute(query, {
                 'name': client_data.get('name'),
                 'api_key': client_data.get('api_key'),
-                'config': client_data.get('config', {}),
+                'config': json.dumps(client_data.get('config', {})),
                 'active': client_data.get('active', True)
             })
-            db.session.commit()
-            
+            # La fila de RETURNING se lee antes de confirmar la transacción
             row = result.fetchone()
+            db_session.commit()
+            
             new_client = {
                 'id': row.id,
                 'name': row.name,
@@ -147,7 +154,7 @@ class SmartVOCService:
         except ValidationError:
             raise
         except SQLAlchemyError as e:
-            db.session.rollback()
+            db_session.rollback()
             logger.error(f"Error al crear cliente: {str(e)}")
             raise ValidationError(f"Error al crear cliente: {str(e)}")
     
@@ -173,7 +180,7 @@ class SmartVOCService:
             
             if 'config' in client_data:
                 update_fields.append("config = :config")
-                params['config'] = client_data['config']
+                params['config'] = json.dumps(client_data['config'])
             
             if 'active' in client_data:
                 update_fields.append("active = :active")
@@ -191,10 +198,11 @@ class SmartVOCService:
             WHERE id = :client_id
             RETURNING *
             """)
-            result = db.session.execute(query, params)
-            db.session.commit()
-            
+            result = db_session.execute(query, params)
+            # La fila de RETURNING se lee antes de confirmar la transacción
             row = result.fetchone()
+            db_session.commit()
+            
             updated_client = {
                 'id': row.id,
                 'name': row.name,
@@ -209,7 +217,7 @@ class SmartVOCService:
         except ResourceNotFoundError:
             raise
         except SQLAlchemyError as e:
-            db.session.rollback()
+            db_session.rollback()
             logger.error(f"Error al actualizar cliente: {str(e)}")
             raise ValidationError(f"Error al actualizar cliente: {str(e)}")
     
@@ -223,14 +231,14 @@ class SmartVOCService:
         try:
             # Eliminar cliente
             query = text(f"DELETE FROM {self.table_name} WHERE id = :client_id")
-            db.session.execute(query, {'client_id': client_id})
-            db.session.commit()
+            db_session.execute(query, {'client_id': client_id})
+            db_session.commit()
             
             logger.info(f"Cliente eliminado con éxito. ID: {client_id}")
             return {"status": "success", "message": f"Cliente eliminado con éxito. ID: {client_id}"}
         except ResourceNotFoundError:
             raise
         except SQLAlchemyError as e:
-            db.session.rollback()
+            db_session.rollback()
             logger.error(f"Error al eliminar cliente: {str(e)}")
             raise ValidationError(f"Error al eliminar cliente: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+Fixtures compartidas de las pruebas.
+
+La aplicación se importa una sola vez por sesión sobre una base SQLite
+temporal: `DATABASE_URI` debe fijarse antes de importar `db`, que crea el
+engine compartido al cargarse.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix='smartvoc-tests-')
+os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(_workdir, 'tests.db')
+os.environ['DB_REPLICA_URI'] = ''
+os.environ['LLM_CACHE_BACKEND'] = 'memory'
+os.environ['METRICS_MULTIPROC_DIR'] = os.path.join(_workdir, 'metrics')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Nombres únicos de cliente durante la sesión
+_client_numbers = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    """Aplicación Flask con las tablas base creadas."""
+    from app import app as flask_app
+    from db import init_db
+
+    init_db(flask_app)
+    flask_app.testing = True
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    """Cliente de pruebas de Flask."""
+    return app.test_client()
+
+@pytest.fixture
+def make_client(client):
+    """Crea un cliente de SmartVOC por la API y devuelve su registro."""
+    def create(name=None):
+        name = name or f"TestClient{next(_client_numbers)}"
+        response = client.post('/api/smartvoc/clients', json={'clientName': name})
+        assert response.status_code == 201, response.get_data(as_text=True)
+        return response.get_json()['client']
+
+    return create
@@ -0,0 +1,78 @@
+"""Pruebas del listado paginado de análisis de un cliente."""
+from datetime import date, timedelta
+
+import pytest
+
+def create_analyses(client, client_name, count):
+    ids = [f"conv-{index}" for index in range(count)]
+    for conversation_id in ids:
+        response = client.post(f"/api/analysis/{client_name}", json={
+            'conversation_id': conversation_id, 'analysis_type': 'standard', 'result': {'summary': 'ok'}
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+    return ids
+
+def test_cursor_pages_cover_every_analysis_once(client, make_client):
+    name = make_client()['clientName']
+    ids = create_analyses(client, name, 5)
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        query = {'page_size': 2}
+        if cursor:
+            query['cursor'] = cursor
+        body = client.get(f"/api/analysis/{name}", query_string=query).get_json()
+        assert body['success'] and body['total'] == 5 and body['pageSize'] == 2
+        seen.extend(item['conversation_id'] for item in body['items'])
+        pages += 1
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert sorted(seen) == ids and len(seen) == len(set(seen))
+
+def test_page_numbers_and_counts(client, make_client):
+    name = make_client()['clientName']
+    create_analyses(client, name, 5)
+
+    first = client.get(f"/api/analysis/{name}", query_string={'page_size': 2}).get_json()
+    third = client.get(f"/api/analysis/{name}", query_string={'page_size': 2, 'page': 3}).get_json()
+    uncounted = client.get(f"/api/analysis/{name}", query_string={'count': 'none'}).get_json()
+
+    assert (first['page'], first['totalPages'], len(first['items'])) == (1, 3, 2)
+    assert (third['page'], len(third['items']), third['next_cursor']) == (3, 1, None)
+    assert uncounted['total'] is None and 'totalPages' not in uncounted
+    assert len(uncounted['items']) == 5
+
+def test_filters_apply_to_items_and_total(client, make_client):
+    name = make_client()['clientName']
+    create_analyses(client, name, 3)
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+
+    future = client.get(f"/api/analysis/{name}", query_string={'start_date': tomorrow}).get_json()
+    current = client.get(f"/api/analysis/{name}", query_string={'start_date': yesterday}).get_json()
+    pending = client.get(f"/api/analysis/{name}", query_string={'status': 'pending'}).get_json()
+
+    assert (future['total'], future['items']) == (0, [])
+    assert current['total'] == 3 and len(current['items']) == 3
+    assert (pending['total'], pending['items']) == (0, [])
+
+@pytest.mark.parametrize('query', [
+    {'page_size': 101},
+    {'page_size': 0},
+    {'page_size': 'diez'},
+    {'page': 'x'},
+    {'count': 'todo'},
+])
+def test_invalid_paging_params_are_rejected(client, make_client, query):
+    name = make_client()['clientName']
+
+    response = client.get(f"/api/analysis/{name}", query_string=query)
+
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['success'] is False and body['details']
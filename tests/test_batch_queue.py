@@ -0,0 +1,120 @@
+"""Pruebas del encolado de lotes y del registro de sus resultados por el worker."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from db import db_session
+from exceptions.custom_exceptions import ResourceNotFoundError
+from services.analysis_service import AnalysisService
+from utils.conversation_controller import ConversationController
+from utils.job_queue import JobQueue
+
+class FakeOpenAIService:
+    """Devuelve un análisis fijo, o un error para las conversaciones indicadas."""
+
+    session = None
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def iter_batch_analyze_conversations(self, conversations, analysis_type="standard", max_retries=3, **kwargs):
+        for conversation in conversations:
+            if conversation['id'] in self.failing:
+                yield conversation, {"error": "fallo simulado"}
+            else:
+                yield conversation, {"summary": f"análisis de {conversation['id']}"}
+
+def create_conversations(client, client_record, count):
+    ids = []
+    for index in range(count):
+        conversation_id = f"conv-{index}"
+        response = client.post('/api/smartvoc/conversations', json={
+            'clientId': str(client_record['clientId']),
+            'conversationId': conversation_id,
+            'conversation': {'messages': [{'role': 'customer', 'text': f"hola {index}"}]}
+        })
+        assert response.status_code == 201, response.get_data(as_text=True)
+        ids.append(conversation_id)
+    return ids
+
+def queued_analyses(client_name):
+    rows = db_session.execute(text(
+        f"SELECT conversation_id, result, metadata FROM {client_name.lower()}_conversation_analyses "
+        f"ORDER BY conversation_id"
+    )).fetchall()
+    return {row.conversation_id: (json.loads(row.result), json.loads(row.metadata)) for row in rows}
+
+def drain_queue(controller):
+    while True:
+        jobs = JobQueue(db_session).claim('test-worker', limit=50)
+        if not jobs:
+            return
+        controller.process_jobs(jobs)
+
+@pytest.mark.parametrize('count', [1, 3])
+def test_start_batch_processing_queues_placeholders(app, client, make_client, count):
+    record = make_client()
+    ids = create_conversations(client, record, count)
+
+    batch_id = AnalysisService().start_batch_processing(record['clientName'], ids, {'analysisType': 'standard'})
+
+    analyses = queued_analyses(record['clientName'])
+    assert sorted(analyses) == ids
+    assert all(metadata['batchRunId'] == batch_id and not metadata['isComplete'] for _, metadata in analyses.values())
+
+def test_start_batch_processing_rejects_unknown_client(app):
+    with pytest.raises(ResourceNotFoundError):
+        AnalysisService().start_batch_processing('ClienteInexistente', ['conv-0'])
+
+def test_worker_completes_queued_placeholders(app, client, make_client):
+    record = make_client()
+    ids = create_conversations(client, record, 3)
+    batch_id = AnalysisService().start_batch_processing(record['clientName'], ids, {'analysisType': 'standard'})
+
+    controller = ConversationController(db_session, openai_service=FakeOpenAIService(failing={'conv-2'}))
+    controller.job_queue.max_attempts = 1
+    drain_queue(controller)
+
+    analyses = queued_analyses(record['clientName'])
+    for conversation_id in ('conv-0', 'conv-1'):
+        result, metadata = analyses[conversation_id]
+        assert result == {"summary": f"análisis de {conversation_id}"}
+        assert metadata['isComplete'] is True and metadata['errorMessage'] is None
+    result, metadata = analyses['conv-2']
+    assert metadata['isComplete'] is False and metadata['errorMessage']
+
+    service = AnalysisService()
+    pending = service.get_analyses_list({'client_name': record['clientName'], 'status': 'pending'})
+    assert pending['success'] and pending['items'] == []
+    failed = service.get_analyses_list({'client_name': record['clientName'], 'status': 'error'})
+    assert [item['conversation_id'] for item in failed['items']] == ['conv-2']
+    assert JobQueue(db_session).batch_status(batch_id)['completed'] == 2
+
+def test_claim_fails_placeholders_of_a_worker_that_died_on_its_last_attempt(app, client, make_client):
+    record = make_client()
+    ids = create_conversations(client, record, 2)
+    batch_id = AnalysisService().start_batch_processing(record['clientName'], ids, {'analysisType': 'standard'})
+    queue = JobQueue(db_session, max_attempts=1)
+    claimed = queue.claim('dead-worker', limit=50)
+    assert {job.conversation_id for job in claimed if job.batch_id == batch_id} == set(ids)
+
+    # El worker muere sin registrar nada y su arriendo expira
+    db_session.execute(
+        text("UPDATE batch_jobs SET lease_expires_at = :expired WHERE batch_id = :batch_id"),
+        {'expired': datetime.utcnow() - timedelta(minutes=1), 'batch_id': batch_id}
+    )
+    db_session.commit()
+
+    assert [job for job in queue.claim('next-worker', limit=50) if job.batch_id == batch_id] == []
+
+    status = queue.batch_status(batch_id)
+    assert status['failed'] == 2 and status['processing'] == 0
+    analyses = queued_analyses(record['clientName'])
+    for conversation_id in ids:
+        _, metadata = analyses[conversation_id]
+        assert metadata['isComplete'] is False
+        assert metadata['errorMessage'] == "Se agotaron los intentos"
+    failed = AnalysisService().get_analyses_list({'client_name': record['clientName'], 'status': 'error'})
+    assert sorted(item['conversation_id'] for item in failed['items']) == ids
@@ -0,0 +1,117 @@
+from utils.client_cache import ClientCache, ClientRecord
+
+class CountingSession:
+    """Sesión falsa que cuenta las consultas; no encuentra ningún cliente."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def execute(self, statement):
+        self.queries += 1
+        return self
+
+    def fetchone(self):
+        return None
+
+def test_invalidate_removes_aliases_after_id_eviction():
+    cache = ClientCache(max_size=5)
+    acme = ClientRecord(1, 'Acme', 'acme')
+    cache.put(acme)
+    # La LRU descarta la clave del ID de Acme; el nombre y el slug siguen
+    cache.put(ClientRecord(2, 'Beta', 'beta'))
+
+    assert ('id', '1') not in cache._entries
+    assert cache.get(client_name='Acme') == acme
+
+    cache.invalidate(client_id=1)
+
+    session = CountingSession()
+    assert cache.get(client_name='Acme', session=session) is None
+    assert cache.get(client_slug='acme', session=session) is None
+    assert session.queries == 2
+
+def test_invalidate_old_and_new_names():
+    cache = ClientCache()
+    cache.put(ClientRecord(1, 'Acme', 'acme'))
+
+    cache.invalidate(client_id=1, client_name=['Acme', 'Acme Corp'], client_slug=['acme', 'acme'])
+
+    assert cache.stats()['size'] == 0
+    assert cache._aliases == {}
+
+def test_reused_name_moves_to_new_client():
+    cache = ClientCache()
+    cache.put(ClientRecord(1, 'Acme', 'acme'))
+    cache.put(ClientRecord(2, 'Acme', 'acme-2'))
+
+    cache.invalidate(client_id=1)
+
+    assert cache.get(client_name='Acme').clientId == 2
+
+def test_update_client_name_invalidates_previous_name(client, make_client):
+    created = make_client()
+    client_id = created['clientId']
+    assert client.get(f"/api/smartvoc/clients/{client_id}").status_code == 200
+
+    response = client.put(f"/api/smartvoc/clients/{client_id}", json={'clientName': created['clientName'] + 'Renamed'})
+    assert response.status_code == 200
+
+    from utils.client_cache import client_cache
+    assert client_cache.get(client_name=created['clientName']) is None
+    assert client_cache.get(client_id=client_id).clientName == created['clientName'] + 'Renamed'
+
+class FixedSession:
+    """Sesión falsa que devuelve siempre la misma fila de smartvoc_clients."""
+
+    def __init__(self, record):
+        self.record = record
+        self.queries = 0
+
+    def execute(self, statement):
+        self.queries += 1
+        return self
+
+    def fetchone(self):
+        return self.record
+
+def test_fresh_lookup_replaces_a_client_renamed_by_another_process():
+    cache = ClientCache()
+    cache.put(ClientRecord(1, 'Acme', 'acme'))
+    session = FixedSession(ClientRecord(1, 'Acme Corp', 'acme-corp'))
+
+    assert cache.get(client_id=1, session=session).clientName == 'Acme'
+    assert cache.get(client_id=1, session=session, fresh=True).clientName == 'Acme Corp'
+
+    # El nombre anterior deja de resolverse desde la caché
+    assert ('name', 'Acme') not in cache._entries
+    assert cache.get(client_name='Acme Corp', session=session).clientSlug == 'acme-corp'
+    assert session.queries == 1
+
+def test_fresh_lookup_forgets_a_client_deleted_by_another_process():
+    cache = ClientCache()
+    cache.put(ClientRecord(1, 'Acme', 'acme'))
+    session = CountingSession()
+
+    assert cache.get(client_name='Acme', session=session, fresh=True) is None
+    assert cache.stats()['size'] == 0
+
+def test_writes_do_not_use_a_client_deleted_by_another_process(client, make_client):
+    from sqlalchemy import text
+
+    from db import engine
+    from utils.client_cache import client_cache
+
+    created = make_client()
+    assert client_cache.get(client_id=created['clientId']) is not None
+    # Otro proceso elimina el cliente: este conserva su registro en caché
+    with engine.begin() as connection:
+        connection.execute(
+            text('DELETE FROM smartvoc_clients WHERE "clientId" = :client_id'), {'client_id': created['clientId']}
+        )
+
+    response = client.post('/api/smartvoc/conversations', json={
+        'clientId': str(created['clientId']), 'conversationId': 'conv-1', 'conversation': {}
+    })
+
+    assert response.status_code == 404
+    assert client_cache.get(client_id=created['clientId']) is None
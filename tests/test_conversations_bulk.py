@@ -0,0 +1,113 @@
+def conversation(client_id, conversation_id):
+    return {
+        'clientId': str(client_id),
+        'conversationId': conversation_id,
+        'conversation': {'messages': [{'role': 'customer', 'text': 'Hola'}]},
+        'metadata': {'channel': 'whatsapp'}
+    }
+
+def test_bulk_insert_stores_json_columns(client, make_client):
+    created = make_client()
+    client_id = created['clientId']
+
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        conversation(client_id, 'bulk-1'),
+        conversation(client_id, 'bulk-2')
+    ])
+
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 2
+
+    stored = client.get(f"/api/smartvoc/conversations/bulk-2?clientId={client_id}").get_json()
+    assert stored['conversation'] == {'messages': [{'role': 'customer', 'text': 'Hola'}]}
+    assert stored['metadata'] == {'channel': 'whatsapp'}
+
+def test_bulk_insert_reports_existing_ids_and_inserts_the_rest(client, make_client):
+    created = make_client()
+    client_id = created['clientId']
+    assert client.post('/api/smartvoc/conversations/bulk', json=[conversation(client_id, 'dup-1')]).status_code == 201
+
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        conversation(client_id, 'new-1'),
+        conversation(client_id, 'dup-1'),
+        conversation(client_id, 'new-2'),
+        conversation(client_id, 'new-3')
+    ])
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert (body['created'], body['duplicates'], body['failed']) == (3, 1, 1)
+    assert [result['status'] for result in body['results']] == ['created', 'duplicate', 'created', 'created']
+    assert body['results'][1]['conversationId'] == 'dup-1'
+    listed = client.get(f"/api/smartvoc/conversations?clientId={client_id}&limit=10").get_json()
+    assert len(listed['conversations']) == 4
+
+def test_bulk_insert_reports_ids_repeated_in_the_payload(client, make_client):
+    created = make_client()
+    client_id = created['clientId']
+
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        conversation(client_id, 'same'),
+        conversation(client_id, 'same'),
+        conversation(client_id, 'other')
+    ])
+
+    assert response.status_code == 207
+    statuses = [result['status'] for result in response.get_json()['results']]
+    assert statuses == ['created', 'duplicate', 'created']
+
+def test_bulk_insert_of_only_duplicates_returns_409(client, make_client):
+    created = make_client()
+    client_id = created['clientId']
+    client.post('/api/smartvoc/conversations/bulk', json=[conversation(client_id, 'only')])
+
+    response = client.post('/api/smartvoc/conversations/bulk', json=[conversation(client_id, 'only')])
+
+    assert response.status_code == 409
+
+def test_bulk_insert_errors_do_not_leak_sql_or_parameters(client, make_client, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from models import DynamicTableManager
+
+    created = make_client()
+    client_id = created['clientId']
+
+    def failing_execute_many(statement, params_list):
+        raise OperationalError(f"INSERT INTO secret {params_list}", params_list, Exception('disk I/O error'))
+
+    monkeypatch.setattr(DynamicTableManager, 'execute_many', staticmethod(failing_execute_many))
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        conversation(client_id, 'leak-1'),
+        conversation(client_id, 'leak-2')
+    ])
+
+    assert response.status_code == 400
+    text = response.get_data(as_text=True)
+    assert 'INSERT' not in text
+    assert 'Hola' not in text
+    assert 'disk I/O' not in text
+
+def test_bulk_insert_isolates_ids_inserted_concurrently(client, make_client, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    from models import DynamicTableManager
+
+    created = make_client()
+    client_id = created['clientId']
+    execute_many = DynamicTableManager.execute_many
+
+    # Otra petición guarda 'race-2' entre la consulta de existentes y el INSERT
+    def racing_execute_many(statement, params_list):
+        if any(row['conversation_id'] == 'race-2' for row in params_list):
+            raise IntegrityError('INSERT', params_list, Exception('UNIQUE constraint failed'))
+        return execute_many(statement, params_list)
+
+    monkeypatch.setattr(DynamicTableManager, 'execute_many', staticmethod(racing_execute_many))
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        conversation(client_id, 'race-1'),
+        conversation(client_id, 'race-2'),
+        conversation(client_id, 'race-3')
+    ])
+
+    assert response.status_code == 207
+    statuses = [result['status'] for result in response.get_json()['results']]
+    assert statuses == ['created', 'duplicate', 'created']
@@ -0,0 +1,35 @@
+"""Pruebas de la exportación NDJSON de conversaciones."""
+import json
+
+def test_export_streams_one_json_object_per_line(client, make_client):
+    record = make_client()
+    ids = [f"conv-{index}" for index in range(3)]
+    assert client.post('/api/smartvoc/conversations/bulk', json=[
+        {'clientId': str(record['clientId']), 'conversationId': conversation_id,
+         'conversation': {'messages': [{'text': 'ñandú'}]}}
+        for conversation_id in ids
+    ]).status_code == 201
+
+    response = client.get('/api/smartvoc/conversations/export', query_string={
+        'clientId': record['clientId'], 'batchSize': 2
+    })
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [row['conversation_id'] for row in rows] == ids
+    assert rows[0]['conversation'] == {'messages': [{'text': 'ñandú'}]}
+
+def test_export_of_an_empty_client_is_empty(client, make_client):
+    record = make_client()
+
+    response = client.get('/api/smartvoc/conversations/export', query_string={'clientId': record['clientId']})
+
+    assert response.status_code == 200
+    assert response.get_data(as_text=True) == ''
+
+def test_export_of_an_unknown_client_returns_404(client):
+    response = client.get('/api/smartvoc/conversations/export', query_string={'clientId': '999999'})
+
+    assert response.status_code == 404
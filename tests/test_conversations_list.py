@@ -0,0 +1,57 @@
+"""Pruebas de la paginación por cursor del listado de conversaciones."""
+
+def create_conversations(client, client_record, count):
+    ids = [f"conv-{index}" for index in range(count)]
+    response = client.post('/api/smartvoc/conversations/bulk', json=[
+        {'clientId': str(client_record['clientId']), 'conversationId': conversation_id, 'conversation': {}}
+        for conversation_id in ids
+    ])
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return ids
+
+def test_cursor_pages_cover_every_conversation_once(client, make_client):
+    record = make_client()
+    ids = create_conversations(client, record, 5)
+
+    seen = []
+    cursor = None
+    while True:
+        query = {'clientId': record['clientId'], 'limit': 2}
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/smartvoc/conversations', query_string=query)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['conversations']) <= 2
+        seen.extend(item['conversation_id'] for item in body['conversations'])
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+
+    assert sorted(seen) == ids and len(seen) == len(set(seen))
+
+def test_offset_is_ignored_with_a_cursor(client, make_client):
+    record = make_client()
+    create_conversations(client, record, 4)
+    first = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'limit': 2
+    }).get_json()
+
+    second = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'limit': 2, 'offset': 2, 'cursor': first['next_cursor']
+    }).get_json()
+
+    first_ids = {item['conversation_id'] for item in first['conversations']}
+    second_ids = {item['conversation_id'] for item in second['conversations']}
+    assert len(second_ids) == 2 and not first_ids & second_ids
+    assert second['next_cursor'] is None
+
+def test_invalid_cursor_is_rejected(client, make_client):
+    record = make_client()
+    create_conversations(client, record, 1)
+
+    response = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'cursor': 'no-es-un-cursor'
+    })
+
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+"""Pruebas de los índices de las tablas dinámicas por cliente."""
+from sqlalchemy import inspect, text
+
+from db import engine
+from utils.schema_registry import MAX_INDEX_NAME_LENGTH, index_name
+
+def create_conversation(client, record, conversation_id='conv-1'):
+    return client.post('/api/smartvoc/conversations', json={
+        'clientId': str(record['clientId']), 'conversationId': conversation_id, 'conversation': {}
+    })
+
+def table_indexes(table_name):
+    return {index['name'] for index in inspect(engine).get_indexes(table_name)}
+
+def test_conversation_table_is_created_with_its_indexes(client, make_client):
+    record = make_client()
+    assert create_conversation(client, record).status_code == 201
+    table_name = f"Conversations__{record['clientSlug']}"
+
+    assert table_indexes(table_name) >= {
+        index_name('ux', table_name, 'conversation_id'),
+        index_name('ix', table_name, 'created_at_id'),
+        index_name('ix', table_name, 'deep_analysis_batch_id'),
+        index_name('ix', table_name, 'gsc_analysis_batch_id'),
+        index_name('ix', table_name, 'auto_processing_status')
+    }
+
+def test_duplicate_conversation_id_returns_409(client, make_client):
+    record = make_client()
+    assert create_conversation(client, record).status_code == 201
+
+    assert create_conversation(client, record).status_code == 409
+
+def test_backfill_creates_missing_indexes(app, client, make_client):
+    record = make_client()
+    assert create_conversation(client, record).status_code == 201
+    table_name = f"Conversations__{record['clientSlug']}"
+    missing = index_name('ix', table_name, 'created_at_id')
+    # Tabla creada antes de que existieran los índices
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP INDEX "{missing}"'))
+
+    runner = app.test_cli_runner()
+    dry_run = runner.invoke(args=['backfill-indexes', '--dry-run'])
+    assert dry_run.exit_code == 0
+    assert f"pending  {table_name}.{missing}" in dry_run.output
+    assert missing not in table_indexes(table_name)
+
+    result = runner.invoke(args=['backfill-indexes'])
+    assert result.exit_code == 0
+    assert f"created  {table_name}.{missing}" in result.output
+    assert missing in table_indexes(table_name)
+
+def test_long_index_names_are_hashed_per_table():
+    first = index_name('ix', 'Conversations__' + 'a' * 60, 'created_at_id')
+    second = index_name('ix', 'Conversations__' + 'a' * 59 + 'b', 'created_at_id')
+
+    assert len(first) <= MAX_INDEX_NAME_LENGTH
+    assert first.endswith('_created_at_id')
+    assert first != second
@@ -0,0 +1,51 @@
+"""Pruebas de la proyección de columnas con el parámetro `fields`."""
+from tests.test_analyses_list import create_analyses
+from tests.test_conversations_list import create_conversations
+
+def test_conversations_return_only_the_requested_fields(client, make_client):
+    record = make_client()
+    ids = create_conversations(client, record, 3)
+
+    first = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'limit': 2, 'fields': 'conversation_id'
+    })
+    assert first.status_code == 200
+    body = first.get_json()
+    assert [set(item) for item in body['conversations']] == [{'conversation_id'}] * 2
+
+    # El cursor sigue funcionando aunque created_at e id no se devuelvan
+    second = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'limit': 2, 'fields': 'conversation_id', 'cursor': body['next_cursor']
+    }).get_json()
+    seen = [item['conversation_id'] for item in body['conversations'] + second['conversations']]
+    assert sorted(seen) == ids
+
+def test_unknown_conversation_field_is_rejected(client, make_client):
+    record = make_client()
+    create_conversations(client, record, 1)
+
+    response = client.get('/api/smartvoc/conversations', query_string={
+        'clientId': record['clientId'], 'fields': 'conversation_id,no_existe'
+    })
+
+    assert response.status_code == 400
+    body = response.get_json()
+    assert 'no_existe' in body['error']
+    assert 'conversation_id' in body['details']['allowed_fields']
+
+def test_analyses_return_only_the_requested_fields(client, make_client):
+    name = make_client()['clientName']
+    create_analyses(client, name, 2)
+
+    body = client.get(f"/api/analysis/{name}", query_string={'fields': 'conversation_id'}).get_json()
+
+    assert body['success'] and body['total'] == 2
+    assert [set(item) for item in body['items']] == [{'conversation_id'}] * 2
+
+def test_unknown_analysis_field_is_rejected(client, make_client):
+    name = make_client()['clientName']
+    create_analyses(client, name, 1)
+
+    response = client.get(f"/api/analysis/{name}", query_string={'fields': 'no_existe'})
+
+    assert response.status_code == 400
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, JSON, MetaData, String, Table, text
+
+from db import db_session, engine
+from models import DynamicTableManager
+from utils.analysis_service import AnalysisService
+from utils.schema_registry import schema_registry
+
+def legacy_analysis_table(table_name):
+    """Tabla creada antes del índice único: conversationId solo tiene un índice simple."""
+    table = Table(
+        table_name, MetaData(),
+        Column('id', Integer, primary_key=True, autoincrement=True),
+        Column('conversationId', String(255), nullable=False, index=True),
+        Column('batchRunId', String(255), nullable=True, index=True),
+        Column('analysisType', String(50), nullable=False),
+        Column('createdAt', DateTime, default=datetime.utcnow),
+        Column('updatedAt', DateTime, default=datetime.utcnow),
+        Column('deepAnalysis', JSON, nullable=True),
+        Column('gscAnalysis', JSON, nullable=True),
+        Column('status', String(50), default='pending')
+    )
+    table.metadata.create_all(engine)
+    return table
+
+def stored_rows(table_name, conversation_id):
+    return db_session.execute(
+        text(f"SELECT deepAnalysis FROM {table_name} WHERE conversationId = :c ORDER BY id"), {"c": conversation_id}
+    ).fetchall()
+
+def test_create_analysis_replaces_the_existing_analysis(make_client):
+    created = make_client()
+    service = AnalysisService(db_session)
+
+    first = service.create_analysis(created['clientName'], 'conv-1', {'deepAnalysis': {'v': 1}})
+    second = service.create_analysis(created['clientName'], 'conv-1', {'deepAnalysis': {'v': 2}})
+
+    assert first['deepAnalysis'] == {'v': 1}
+    assert second['deepAnalysis'] == {'v': 2}
+    assert second['id'] == first['id']
+    assert len(stored_rows(f"GenerativeAnalyses__{created['clientName']}", 'conv-1')) == 1
+
+def test_create_analysis_on_a_table_without_unique_index(make_client):
+    created = make_client()
+    table_name = f"GenerativeAnalyses__{created['clientName']}"
+    legacy_analysis_table(table_name)
+    service = AnalysisService(db_session)
+
+    first = service.create_analysis(created['clientName'], 'conv-1', {'deepAnalysis': {'v': 1}})
+    second = service.create_analysis(created['clientName'], 'conv-1', {'deepAnalysis': {'v': 2}})
+
+    assert first is not None and second is not None
+    assert second['id'] == first['id']
+    assert second['deepAnalysis'] == {'v': 2}
+    assert len(stored_rows(table_name, 'conv-1')) == 1
+
+def test_backfill_reports_duplicates_instead_of_failing(make_client):
+    created = make_client()
+    table_name = f"GenerativeAnalyses__{created['clientName']}"
+    table = legacy_analysis_table(table_name)
+    with engine.begin() as connection:
+        connection.execute(table.insert(), [
+            {'conversationId': 'conv-1', 'analysisType': 'standard'},
+            {'conversationId': 'conv-1', 'analysisType': 'standard'}
+        ])
+
+    report = [entry for entry in DynamicTableManager.backfill_indexes() if entry['table'] == table_name]
+
+    assert [(entry['status'], entry.get('error')) for entry in report] == [
+        ('duplicates', '1 valores repetidos en conversationId')
+    ]
+    # La tabla sigue funcionando sin el índice único
+    analysis = AnalysisService(db_session).create_analysis(created['clientName'], 'conv-1', {'deepAnalysis': {'v': 3}})
+    assert analysis['deepAnalysis'] == {'v': 3}
+
+def test_backfill_enables_the_upsert(make_client):
+    created = make_client()
+    table_name = f"GenerativeAnalyses__{created['clientName']}"
+    legacy_analysis_table(table_name)
+    assert not schema_registry.has_unique_key(table_name, engine, ['conversationId'])
+
+    report = [entry for entry in DynamicTableManager.backfill_indexes() if entry['table'] == table_name]
+
+    assert [entry['status'] for entry in report] == ['created']
+    assert schema_registry.has_unique_key(table_name, engine, ['conversationId'])
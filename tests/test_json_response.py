@@ -0,0 +1,43 @@
+"""Pruebas de la inserción de JSON guardado en las respuestas sin decodificarlo."""
+import json
+
+import pytest
+from sqlalchemy import text
+
+from db import db_session
+from utils.json_response import RawJSON, dumps, orjson, raw_json_fragment
+
+@pytest.mark.parametrize('stored', ['{not json}', '{"a": 1', '[1, 2,]', '{"a": NaN}'])
+def test_invalid_text_is_not_spliced(stored):
+    assert raw_json_fragment(stored) is None
+
+@pytest.mark.skipif(orjson is None, reason="orjson no está instalado")
+def test_valid_text_is_spliced_verbatim():
+    fragment = raw_json_fragment('{"b": [1, 2], "a": "é"}')
+    assert isinstance(fragment, RawJSON)
+    assert dumps({'value': fragment}) == '{"value": {"b": [1, 2], "a": "é"}}'
+
+def test_corrupt_stored_json_keeps_the_list_response_valid(client, make_client):
+    record = make_client()
+    for conversation_id in ('ok', 'corrupt'):
+        response = client.post('/api/smartvoc/conversations', json={
+            'clientId': str(record['clientId']),
+            'conversationId': conversation_id,
+            'conversation': {'messages': [{'role': 'customer', 'text': 'hola'}]},
+            'metadata': {'channel': 'web'}
+        })
+        assert response.status_code == 201
+    db_session.execute(
+        text(f"UPDATE Conversations__{record['clientSlug']} SET metadata = '{{not json}}' "
+             f"WHERE conversation_id = 'corrupt'")
+    )
+    db_session.commit()
+
+    response = client.get(f"/api/smartvoc/conversations?clientId={record['clientId']}")
+    assert response.status_code == 200
+    body = json.loads(response.get_data(as_text=True))
+    metadata = {item['conversation_id']: item['metadata'] for item in body['conversations']}
+    assert metadata == {'ok': {'channel': 'web'}, 'corrupt': {}}
+
+    response = client.get(f"/api/smartvoc/conversations/corrupt?clientId={record['clientId']}")
+    assert json.loads(response.get_data(as_text=True))['metadata'] == {}
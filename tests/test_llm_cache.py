@@ -0,0 +1,63 @@
+"""Pruebas de los backends de la caché de resultados de LLM."""
+import json
+
+import pytest
+
+from utils.llm_cache import LLMResultCache, MemoryCacheBackend, SQLiteCacheBackend
+
+# 10 caracteres, 18 bytes en UTF-8
+ACCENTED = json.dumps("ñ" * 8, ensure_ascii=False)
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    def build(max_bytes):
+        if request.param == 'memory':
+            return MemoryCacheBackend(max_bytes)
+        return SQLiteCacheBackend(str(tmp_path / 'llm_cache.sqlite3'), max_bytes)
+
+    return build
+
+def test_size_is_counted_in_utf8_bytes(backend):
+    cache = backend(max_bytes=1000)
+
+    cache.set('a', ACCENTED)
+
+    assert cache.usage() == (1, len(ACCENTED.encode('utf-8')))
+
+def test_eviction_uses_utf8_bytes(backend):
+    cache = backend(max_bytes=30)
+
+    cache.set('a', ACCENTED)
+    cache.set('b', ACCENTED)
+
+    # 36 bytes no caben en 30 aunque 20 caracteres sí cabrían
+    assert cache.get('a') is None
+    assert cache.get('b') == ACCENTED
+    assert cache.usage() == (1, 18)
+
+def test_sqlite_limit_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'llm_cache.sqlite3')
+    first = SQLiteCacheBackend(path, max_bytes=50)
+    second = SQLiteCacheBackend(path, max_bytes=50)
+
+    first.set('a', 'x' * 20)
+    second.set('b', 'y' * 20)
+    first.set('c', 'z' * 20)
+
+    # El segundo proceso ve lo escrito por el primero y expulsa la más antigua
+    assert first.usage() == (2, 40) == second.usage()
+    assert second.get('a') is None
+    second.delete('c')
+    assert first.usage() == (1, 20)
+
+def test_corrupt_entry_is_a_miss_and_is_deleted():
+    backend = MemoryCacheBackend(max_bytes=1000)
+    cache = LLMResultCache(backend)
+    backend.set('roto', '{"summary": ')
+    cache.put('bueno', {'summary': 'ok'})
+
+    assert cache.get('roto') is None
+    assert backend.get('roto') is None
+    assert cache.get('bueno') == {'summary': 'ok'}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
@@ -0,0 +1,87 @@
+import os
+import re
+
+from utils.metrics import MetricsRegistry, metrics
+
+def sample(text, name, **labels):
+    """Valor de una muestra de la exposición, o None si no aparece."""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = '^' + re.escape(name + (f'{{{label_text}}}' if labels else '')) + r' (\S+)$'
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+def worker_snapshot(directory, pid=424242):
+    """Registro de otro proceso con llamadas a Azure OpenAI, volcado como el de `pid`."""
+    registry = MetricsRegistry(directory=directory)
+    registry.counter(
+        'smartvoc_openai_tokens_total', "Tokens informados por Azure OpenAI", ('deployment', 'kind')
+    ).inc(40, deployment='gpt', kind='total')
+    registry.histogram(
+        'smartvoc_openai_request_duration_seconds', "Latencia de las llamadas a Azure OpenAI", ('deployment',)
+    ).observe(0.2, deployment='gpt')
+    registry.counter('smartvoc_worker_only_total', "Solo en el worker").inc(3)
+    registry.write_snapshot()
+    os.replace(
+        os.path.join(directory, f"metrics-{os.getpid()}.json"),
+        os.path.join(directory, f"metrics-{pid}.json")
+    )
+
+def test_exposition_format(client):
+    client.get('/api/smartvoc/clients')
+
+    response = client.get('/api/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    assert '# HELP smartvoc_openai_request_duration_seconds Latencia de las llamadas a Azure OpenAI' in text
+    assert '# TYPE smartvoc_openai_request_duration_seconds histogram' in text
+    assert '# TYPE smartvoc_openai_retries_total counter' in text
+    for line in text.splitlines():
+        assert line.startswith('# ') or re.match(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{.*\})? \S+$', line), line
+
+def test_checkout_wait_histogram_counts_connections(client):
+    client.get('/api/smartvoc/clients')
+
+    text = client.get('/api/metrics').get_data(as_text=True)
+
+    assert '# TYPE smartvoc_db_pool_checkout_wait_seconds histogram' in text
+    count = sample(text, 'smartvoc_db_pool_checkout_wait_seconds_count', engine='primary')
+    assert count >= 1
+    assert sample(text, 'smartvoc_db_pool_checkout_wait_seconds_bucket', engine='primary', le='+Inf') == count
+    assert sample(text, 'smartvoc_db_pool_checkout_wait_seconds_sum', engine='primary') >= 0
+
+def test_worker_snapshots_are_added_to_the_exposition(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'directory', str(tmp_path))
+    local = sample(
+        client.get('/api/metrics').get_data(as_text=True),
+        'smartvoc_openai_tokens_total', deployment='gpt', kind='total'
+    ) or 0
+    worker_snapshot(str(tmp_path), pid=1001)
+    worker_snapshot(str(tmp_path), pid=1002)
+
+    text = client.get('/api/metrics').get_data(as_text=True)
+
+    assert sample(text, 'smartvoc_openai_tokens_total', deployment='gpt', kind='total') == local + 80
+    assert sample(text, 'smartvoc_openai_request_duration_seconds_bucket', deployment='gpt', le='0.25') >= 2
+    assert sample(text, 'smartvoc_worker_only_total') == 6
+    assert text.count('# TYPE smartvoc_openai_tokens_total counter') == 1
+
+    metrics.clear_snapshots()
+    assert sample(client.get('/api/metrics').get_data(as_text=True), 'smartvoc_worker_only_total') is None
+
+def test_incompatible_or_corrupt_snapshots_are_skipped(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'directory', str(tmp_path))
+    (tmp_path / 'metrics-1003.json').write_text('{no es json')
+    registry = MetricsRegistry(directory=str(tmp_path))
+    registry.gauge('smartvoc_openai_retries_total', "Otro tipo").set(99)
+    registry.write_snapshot()
+    os.replace(tmp_path / f"metrics-{os.getpid()}.json", tmp_path / 'metrics-1004.json')
+
+    response = client.get('/api/metrics')
+
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert '# TYPE smartvoc_openai_retries_total counter' in text
+    assert sample(text, 'smartvoc_openai_retries_total') != 99
@@ -0,0 +1,20 @@
+from utils.openai_service import OpenAIService
+
+def test_quota_is_split_across_processes(monkeypatch):
+    monkeypatch.setenv('AZURE_OPENAI_REQUESTS_PER_MINUTE', '120')
+    monkeypatch.setenv('AZURE_OPENAI_TOKENS_PER_MINUTE', '90000')
+    monkeypatch.setenv('AZURE_OPENAI_RATE_LIMIT_PROCESSES', '4')
+
+    limiter = OpenAIService().rate_limiter
+
+    assert limiter.requests.capacity == 30
+    assert limiter.tokens.capacity == 22500
+
+def test_unlimited_quota_stays_unlimited(monkeypatch):
+    monkeypatch.setenv('AZURE_OPENAI_REQUESTS_PER_MINUTE', '0')
+    monkeypatch.setenv('AZURE_OPENAI_TOKENS_PER_MINUTE', '0')
+    monkeypatch.setenv('AZURE_OPENAI_RATE_LIMIT_PROCESSES', '4')
+
+    limiter = OpenAIService().rate_limiter
+
+    assert limiter.requests.unlimited and limiter.tokens.unlimited
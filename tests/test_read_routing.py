@@ -0,0 +1,110 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+
+import db
+from config import active_config
+from db import LAST_WRITE_COOKIE, create_db_engine, db_session, init_replica_schema, read_only
+
+PRIMARY_PATH = db.engine.url.database
+
+@pytest.fixture
+def use_replica(monkeypatch):
+    """Configura una réplica y la ventana de lectura de las propias escrituras."""
+    monkeypatch.setattr(active_config, 'DB_READ_YOUR_WRITES_SECONDS', 5.0)
+
+    def configure(replica):
+        monkeypatch.setattr(db, 'replica_engine', replica)
+        return replica
+
+    yield configure
+    db._routing.last_write = 0
+
+def client_names(test_client, name):
+    """Clientes listados cuyo nombre contiene `name`; sin clientes la respuesta es un objeto con `clients` vacío."""
+    body = test_client.get(f"/api/smartvoc/clients?clientName={name}").get_json()
+    clients = body['clients'] if isinstance(body, dict) else body
+    return [client['clientName'] for client in clients]
+
+def copy_primary(tmp_path):
+    """Copia de la base primaria, como el paso documentado con `.backup`."""
+    path = str(tmp_path / 'replica.db')
+    source = sqlite3.connect(PRIMARY_PATH)
+    target = sqlite3.connect(path)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+def test_reads_go_to_the_replica_only_inside_read_only(use_replica, tmp_path):
+    replica = use_replica(create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    db._routing.last_write = 0
+    statement = select(1)
+
+    assert db_session.get_bind(clause=statement) is db.engine
+    with read_only():
+        assert db_session.get_bind(clause=statement) is replica
+        assert db.read_bind() is replica
+        # Sin sentencia (dialecto, DDL) siempre el primario
+        assert db_session.get_bind() is db.engine
+    assert db.read_bind() is db.engine
+
+def test_recent_write_reads_from_the_primary(use_replica, tmp_path, monkeypatch):
+    replica = use_replica(create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    db._mark_write()
+
+    with read_only():
+        assert db_session.get_bind(clause=select(1)) is db.engine
+
+    monkeypatch.setattr(active_config, 'DB_READ_YOUR_WRITES_SECONDS', 0.0)
+    with read_only():
+        assert db_session.get_bind(clause=select(1)) is replica
+
+def test_separate_sqlite_replica_gets_the_base_tables(app, use_replica, tmp_path):
+    replica = use_replica(create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    init_replica_schema(replica)
+    writer = app.test_client()
+
+    response = writer.post('/api/smartvoc/clients', json={'clientName': 'ReplicaClient'})
+    assert response.status_code == 201
+    # La réplica no tiene los datos, pero tampoco falla
+    assert app.test_client().get('/api/smartvoc/clients').status_code == 200
+
+def test_last_write_cookie_reads_own_writes_from_the_primary(app, use_replica, tmp_path):
+    replica = use_replica(create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}"))
+    init_replica_schema(replica)
+    writer = app.test_client()
+
+    response = writer.post('/api/smartvoc/clients', json={'clientName': 'CookieClient'})
+    assert LAST_WRITE_COOKIE in response.headers.get('Set-Cookie', '')
+
+    # Con la cookie lee del primario; sin ella, de la réplica que no tiene el cliente
+    assert 'CookieClient' in client_names(writer, 'CookieClient')
+    assert 'CookieClient' not in client_names(app.test_client(), 'CookieClient')
+
+def test_tenant_table_missing_on_the_replica_is_empty_not_500(app, make_client, use_replica, tmp_path):
+    created = make_client()
+    # La réplica se copia antes de que exista la tabla de conversaciones del cliente
+    use_replica(create_db_engine(f"sqlite:///{copy_primary(tmp_path)}"))
+    writer = app.test_client()
+    assert writer.post('/api/smartvoc/conversations', json={
+        'clientId': str(created['clientId']), 'conversationId': 'c-1', 'conversation': {}
+    }).status_code == 201
+
+    response = app.test_client().get(f"/api/smartvoc/conversations?clientId={created['clientId']}")
+
+    assert response.status_code == 200
+    assert response.get_json()['conversations'] == []
+
+def test_read_only_uri_replica_of_the_primary_file(app, make_client, use_replica, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    replica = use_replica(create_db_engine(f"sqlite:///file:{PRIMARY_PATH}?mode=ro&uri=true"))
+    init_replica_schema(replica)
+    created = make_client()
+
+    assert created['clientName'] in client_names(app.test_client(), created['clientName'])
+    # La URI no se interpreta como una ruta de directorio
+    assert not os.path.exists(tmp_path / 'file:')
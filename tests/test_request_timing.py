@@ -0,0 +1,48 @@
+import json
+
+from config import active_config
+from services.analysis_service import AnalysisService
+from utils.request_log_writer import request_log_writer
+
+def test_analysis_request_writes_a_single_log_row(client, make_client, monkeypatch):
+    created = make_client()
+    url = f"/api/analysis/{created['clientName']}"
+    assert client.post(url, json={
+        'conversation_id': 'conv-1', 'analysis_type': 'standard', 'result': {'summary': 'ok'}
+    }).status_code == 201
+
+    rows = []
+    monkeypatch.setattr(active_config, 'REQUEST_LOG_ENABLED', True)
+    # Sin muestreo: la fila se guarda por llevar los detalles de la operación
+    monkeypatch.setattr(active_config, 'REQUEST_TIMING_SAMPLE_RATE', 0.0)
+    monkeypatch.setattr(request_log_writer, 'submit', rows.append)
+
+    response = client.get(f"{url}/conv-1")
+
+    assert response.status_code == 200
+    assert len(rows) == 1
+    row = rows[0]
+    assert row['endpoint'] == f"{url}/conv-1"
+    assert row['status_code'] == 200
+    assert row['response_time'] is not None
+    assert json.loads(row['request_data']) == {
+        'operation': 'get_client_analyses',
+        'details': {
+            'client_name': created['clientName'],
+            'conversation_id': 'conv-1',
+            'analysis_type': None,
+            'result_count': 1
+        }
+    }
+
+def test_log_request_outside_a_request_submits_directly(monkeypatch):
+    rows = []
+    monkeypatch.setattr(active_config, 'REQUEST_LOG_ENABLED', True)
+    monkeypatch.setattr(request_log_writer, 'submit', rows.append)
+
+    AnalysisService()._log_request('start_batch_processing', {'batch_id': 'b-1'})
+
+    assert rows == [{
+        'endpoint': 'start_batch_processing',
+        'request_data': json.dumps({'operation': 'start_batch_processing', 'details': {'batch_id': 'b-1'}})
+    }]
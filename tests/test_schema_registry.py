@@ -0,0 +1,63 @@
+"""Pruebas del registro de tablas dinámicas."""
+import time
+
+from sqlalchemy import create_engine, text
+
+from db import engine
+from utils.schema_registry import SchemaRegistry, schema_registry
+
+def create_table(target, table_name):
+    with target.begin() as connection:
+        connection.execute(text(f"CREATE TABLE {table_name} (id INTEGER PRIMARY KEY)"))
+
+def test_missing_table_is_remembered_until_the_ttl_expires(tmp_path, monkeypatch):
+    target = create_engine(f"sqlite:///{tmp_path / 'registry.db'}")
+    registry = SchemaRegistry(negative_ttl=60)
+    assert registry.has_table('Conversations__acme', target) is False
+
+    # Otro proceso crea la tabla: este no la ve hasta que vence el plazo
+    create_table(target, 'Conversations__acme')
+    assert registry.has_table('Conversations__acme', target) is False
+
+    clock = time.monotonic() + 61
+    monkeypatch.setattr('utils.schema_registry.time.monotonic', lambda: clock)
+    assert registry.has_table('Conversations__acme', target) is True
+
+def test_registering_a_table_clears_its_negative_entry(tmp_path):
+    target = create_engine(f"sqlite:///{tmp_path / 'registry.db'}")
+    registry = SchemaRegistry(negative_ttl=60)
+    assert registry.has_table('Conversations__acme', target) is False
+
+    create_table(target, 'Conversations__acme')
+    registry.register('Conversations__acme', bind=target)
+
+    assert registry.has_table('Conversations__acme', target) is True
+
+def test_without_negative_ttl_every_miss_reads_the_catalog(tmp_path):
+    target = create_engine(f"sqlite:///{tmp_path / 'registry.db'}")
+    registry = SchemaRegistry(negative_ttl=0)
+    assert registry.has_table('Conversations__acme', target) is False
+
+    create_table(target, 'Conversations__acme')
+
+    assert registry.has_table('Conversations__acme', target) is True
+
+def test_table_dropped_by_another_process_returns_404(client, make_client):
+    record = make_client()
+    assert client.post('/api/smartvoc/conversations', json={
+        'clientId': str(record['clientId']), 'conversationId': 'conv-1', 'conversation': {}
+    }).status_code == 201
+    table_name = f"Conversations__{record['clientSlug']}"
+    assert schema_registry.has_table(table_name, engine)
+
+    # DROP sin pasar por el registro ni la caché de clientes de este proceso
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP TABLE {table_name}"))
+
+    response = client.get('/api/smartvoc/conversations/conv-1', query_string={'clientId': record['clientId']})
+
+    assert response.status_code == 404
+    assert table_name not in schema_registry._schema(engine).tables
+    assert client.get(
+        '/api/smartvoc/conversations', query_string={'clientId': record['clientId']}
+    ).status_code == 200
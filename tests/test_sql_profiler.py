@@ -0,0 +1,52 @@
+import pytest
+
+from utils.sql_profiler import QueryBudgetExceeded, query_budget, statement_shape
+
+def analysis_payload(conversation_id):
+    return {
+        'conversation_id': conversation_id,
+        'analysis_type': 'standard',
+        'result': {'summary': 'ok'}
+    }
+
+def test_get_client_query_budget(client, make_client):
+    created = make_client()
+
+    # Cliente y detalles: una sentencia cada uno
+    with query_budget(2, 'get_client'):
+        response = client.get(f"/api/smartvoc/clients/{created['clientId']}")
+
+    assert response.status_code == 200
+
+def test_create_analysis_query_budget(client, make_client):
+    created = make_client()
+    url = f"/api/analysis/{created['clientName']}"
+    # La primera inserción crea y refleja la tabla del cliente
+    assert client.post(url, json=analysis_payload('conv-1')).status_code == 201
+
+    # Con la tabla creada, un solo INSERT ... RETURNING
+    with query_budget(1, 'create_analysis'):
+        response = client.post(url, json=analysis_payload('conv-2'))
+
+    assert response.status_code == 201
+
+def test_query_budget_exceeded_reports_repeated_statements(client, make_client):
+    created = make_client()
+    url = f"/api/smartvoc/clients/{created['clientId']}"
+
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        with query_budget(2, 'get_client x2'):
+            client.get(url)
+            client.get(url)
+
+    error = excinfo.value
+    assert error.budget == 2
+    assert error.profile.statements == 4
+    assert 'get_client x2' in str(error)
+    assert '2x SELECT' in str(error)
+
+def test_statement_shape_normalizes_literals_and_parameters():
+    assert statement_shape("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)") == \
+        "SELECT * FROM t WHERE a = ? AND b IN (?)"
+    assert statement_shape("INSERT INTO t (a, b) VALUES (?, ?), (?, ?)") == \
+        "INSERT INTO t (a, b) VALUES (?, ?)"
@@ -0,0 +1,41 @@
+"""Pruebas de los PRAGMAs aplicados a las conexiones SQLite."""
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from db import create_db_engine, sqlite_pragmas
+
+def make_config(**overrides):
+    values = {
+        'SQLITE_BUSY_TIMEOUT_MS': 1234,
+        'SQLITE_JOURNAL_MODE': 'WAL',
+        'SQLITE_SYNCHRONOUS': 'NORMAL',
+        'SQLITE_CACHE_SIZE': -2000,
+        'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_TEMP_STORE': 'MEMORY',
+        'DB_POOL_SIZE': 2,
+        'DB_MAX_OVERFLOW': 0,
+        'DB_POOL_TIMEOUT': 5
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+def test_busy_timeout_is_applied_before_journal_mode():
+    pragmas = sqlite_pragmas(make_config())
+
+    assert pragmas[0] == 'PRAGMA busy_timeout=1234'
+    assert pragmas[1] == 'PRAGMA journal_mode=WAL'
+
+def test_every_new_connection_gets_the_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pragmas.db'}", make_config())
+
+    with engine.connect() as connection:
+        values = {
+            name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'temp_store')
+        }
+
+    # synchronous NORMAL = 1, temp_store MEMORY = 2
+    assert values == {
+        'busy_timeout': 1234, 'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -2000, 'temp_store': 2
+    }
@@ -0,0 +1,53 @@
+"""Pruebas de los upserts multi-fila de `utils/upsert.py`."""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from utils.upsert import upsert, upsert_many, upsert_statement
+
+COLUMNS = ['conversation_id', 'analysis_type', 'result']
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite:///:memory:')
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE analyses (id INTEGER PRIMARY KEY, conversation_id TEXT, analysis_type TEXT, "
+            "result TEXT, UNIQUE (conversation_id, analysis_type))"
+        ))
+    with Session(engine) as session:
+        yield session
+
+def rows(count, result='queued'):
+    return [
+        {'conversation_id': f"conv-{index}", 'analysis_type': 'standard', 'result': result}
+        for index in range(count)
+    ]
+
+def stored(session):
+    return session.execute(text("SELECT conversation_id, result FROM analyses ORDER BY conversation_id")).fetchall()
+
+def test_upsert_many_single_row(session):
+    assert upsert_many(session, 'analyses', rows(1), ['conversation_id', 'analysis_type']) == 1
+    assert stored(session) == [('conv-0', 'queued')]
+
+@pytest.mark.parametrize('count', [3, 5])
+def test_upsert_many_chunk_with_one_trailing_row(session, count):
+    # Con chunk_size=2, el último bloque tiene una sola fila
+    statements = upsert_many(session, 'analyses', rows(count), ['conversation_id', 'analysis_type'], chunk_size=2)
+    assert statements == (count + 1) // 2
+    assert len(stored(session)) == count
+
+def test_upsert_many_updates_existing_rows(session):
+    upsert_many(session, 'analyses', rows(3), ['conversation_id', 'analysis_type'], chunk_size=2)
+    upsert_many(session, 'analyses', rows(3, result='done'), ['conversation_id', 'analysis_type'], chunk_size=2)
+    assert [row.result for row in stored(session)] == ['done', 'done', 'done']
+
+def test_single_row_statement_uses_bare_parameters(session):
+    dialect = session.get_bind().dialect
+    assert ':conversation_id,' in str(upsert_statement(dialect, 'analyses', COLUMNS, ['conversation_id']))
+    assert ':conversation_id_0' in str(upsert_statement(dialect, 'analyses', COLUMNS, ['conversation_id'], multi=True))
+
+def test_upsert_returns_row(session):
+    row = upsert(session, 'analyses', rows(1)[0], ['conversation_id', 'analysis_type'])
+    assert row.conversation_id == 'conv-0'
@@ -7,9 +7,14 @@ import os
 import json
 import logging
 from datetime import datetime
-from sqlalchemy import text, MetaData, Table, Column, Integer, String, DateTime, JSON, create_engine
+from sqlalchemy import text, MetaData, Table, Column, Index, Integer, String, DateTime, JSON, create_engine
 from sqlalchemy.exc import SQLAlchemyError, NoSuchTableError
 
+from db import read_bind, read_only
+from utils.schema_registry import index_name, parse_fields, schema_registry
+from utils.client_cache import client_cache
+from utils.upsert import update_returning_statement, upsert
+
 logger = logging.getLogger(__name__)
 
 class AnalysisService:
@@ -46,6 +51,34 @@ class AnalysisService:
         normalized_name = ''.join(c for c in normalized_name if c.isalnum() or c == '_')
         return f"GenerativeAnalyses__{normalized_name}"
     
+    @staticmethod
+    def analysis_table(table_name, metadata=None):
+        """
+        Define la tabla de análisis de un cliente, con sus índices, sin crearla.
+        
+        Args:
+            table_name: Nombre de la tabla de análisis
+            metadata: MetaData de SQLAlchemy (opcional)
+            
+        Returns:
+            Table: Definición de la tabla
+        """
+        return Table(
+            table_name,
+            metadata if metadata is not None else MetaData(),
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('conversationId', String(255), nullable=False),
+            Column('batchRunId', String(255), nullable=True, index=True),
+            Column('analysisType', String(50), nullable=False),
+            Column('createdAt', DateTime, default=datetime.utcnow),
+            Column('updatedAt', DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+            Column('deepAnalysis', JSON, nullable=True),
+            Column('gscAnalysis', JSON, nullable=True),
+            Column('status', String(50), default='pending'),
+            # Único para el upsert por conversación
+            Index(index_name('ux', table_name, 'conversationId'), 'conversationId', unique=True)
+        )
+    
     def _ensure_analysis_table_exists(self, client_name):
         """
         Asegura que la tabla de análisis existe para el cliente especificado.
@@ -60,37 +93,55 @@ class AnalysisService:
         table_name = self._get_analysis_table_name(client_name)
         
         # Verificar si la tabla ya existe
+        engine = self.db_session.get_bind()
+        if schema_registry.has_table(table_name, engine):
+            return True
+        
+        # La tabla no existe, crearla
         try:
-            self.db_session.execute(text(f"SELECT 1 FROM {table_name} LIMIT 1"))
-            logger.info(f"Tabla {table_name} ya existe")
+            table = self.analysis_table(table_name)
+            table.metadata.create_all(engine)
+            schema_registry.register(table_name, table, engine)
+            logger.info(f"Tabla {table_name} creada exitosamente")
             return True
-        except SQLAlchemyError:
-            # La tabla no existe, crearla
-            try:
-                metadata = MetaData()
-                Table(
-                    table_name,
-                    metadata,
-                    Column('id', Integer, primary_key=True, autoincrement=True),
-                    Column('conversationId', String(255), nullable=False, index=True),
-                    Column('batchRunId', String(255), nullable=True, index=True),
-                    Column('analysisType', String(50), nullable=False),
-                    Column('createdAt', DateTime, default=datetime.utcnow),
-                    Column('updatedAt', DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
-                    Column('deepAnalysis', JSON, nullable=True),
-                    Column('gscAnalysis', JSON, nullable=True),
-                    Column('status', String(50), default='pending')
-                )
-                
-                engine = self.db_session.get_bind()
-                metadata.create_all(engine)
-                logger.info(f"Tabla {table_name} creada exitosamente")
-                return True
-            except SQLAlchemyError as e:
-                logger.error(f"Error al crear la tabla {table_name}: {str(e)}")
-                return False
+        except SQLAlchemyError as e:
+            logger.error(f"Error al crear la tabla {table_name}: {str(e)}")
+            return False
+    
+    def _row_to_analysis(self, row):
+        """
+        Convierte una fila de la tabla de análisis a un diccionario, decodificando
+        los campos JSON y formateando las fechas.
+        
+        Args:
+            row: Fila de la tabla de análisis
+            
+        Returns:
+            dict: Análisis
+        """
+        analysis = dict(row._mapping)
+        
+        # Convertir campos JSON si no son None
+        if analysis.get('deepAnalysis'):
+            analysis['deepAnalysis'] = json.loads(analysis['deepAnalysis']) \
+                if isinstance(analysis['deepAnalysis'], str) else analysis['deepAnalysis']
+        
+        if analysis.get('gscAnalysis'):
+            analysis['gscAnalysis'] = json.loads(analysis['gscAnalysis']) \
+                if isinstance(analysis['gscAnalysis'], str) else analysis['gscAnalysis']
+        
+        # Convertir fechas a formato ISO (SQLite ya las devuelve como texto)
+        if hasattr(analysis.get('createdAt'), 'isoformat'):
+            analysis['createdAt'] = analysis['createdAt'].isoformat()
+        
+        if hasattr(analysis.get('updatedAt'), 'isoformat'):
+            analysis['updatedAt'] = analysis['updatedAt'].isoformat()
+        
+        return analysis
     
-    def get_client_analyses(self, client_name, conversation_id=None, batch_run_id=None, analysis_type=None):
+    @read_only()
+    def get_client_analyses(self, client_name, conversation_id=None, batch_run_id=None, analysis_type=None,
+                            fields=None):
         """
         Obtiene los análisis para un cliente específico.
         
@@ -99,27 +150,38 @@ class AnalysisService:
             conversation_id: ID de la conversación (opcional)
             batch_run_id: ID del lote de ejecución (opcional)
             analysis_type: Tipo de análisis (opcional)
+            fields: Columnas a leer y devolver, separadas por comas o en lista (opcional)
             
         Returns:
             list: Lista de análisis que coinciden con los criterios
             None: Si ocurre un error
+            
+        Raises:
+            UnknownFieldsError: Si `fields` incluye columnas inexistentes
         """
         try:
             # Verificar si el cliente existe
-            client_result = self.db_session.execute(
-                text("SELECT clientId FROM smartvoc_clients WHERE clientName = :name"),
-                {"name": client_name}
-            ).fetchone()
+            client = client_cache.get(client_name=client_name, session=self.db_session)
             
-            if not client_result:
+            if not client:
                 logger.warning(f"Cliente {client_name} no encontrado")
                 return []
                 
             table_name = self._get_analysis_table_name(client_name)
             
+            # La existencia se verifica en el mismo bind que ejecuta la consulta
+            bind = read_bind()
+            if not schema_registry.has_table(table_name, bind):
+                logger.info(f"Tabla {table_name} no existe para el cliente {client_name}")
+                return []
+            
             try:
-                # Construir la consulta base
-                query = f"SELECT * FROM {table_name}"
+                # Construir la consulta base, con solo las columnas pedidas
+                fields = parse_fields(fields)
+                columns = '*'
+                if fields:
+                    columns = schema_registry.select_columns(table_name, bind, fields)
+                query = f"SELECT {columns} FROM {table_name}"
                 params = {}
                 conditions = []
                 
@@ -144,29 +206,7 @@ class AnalysisService:
                 result = self.db_session.execute(text(query), params).fetchall()
                 
                 # Convertir los resultados a diccionarios y manejar campos JSON
-                analyses = []
-                for row in result:
-                    analysis = dict(row._mapping)
-                    
-                    # Convertir campos JSON si no son None
-                    if analysis.get('deepAnalysis'):
-                        analysis['deepAnalysis'] = json.loads(analysis['deepAnalysis']) \
-                            if isinstance(analysis['deepAnalysis'], str) else analysis['deepAnalysis']
-                    
-                    if analysis.get('gscAnalysis'):
-                        analysis['gscAnalysis'] = json.loads(analysis['gscAnalysis']) \
-                            if isinstance(analysis['gscAnalysis'], str) else analysis['gscAnalysis']
-                    
-                    # Convertir fechas a formato ISO
-                    if analysis.get('createdAt'):
-                        analysis['createdAt'] = analysis['createdAt'].isoformat()
-                    
-                    if analysis.get('updatedAt'):
-                        analysis['updatedAt'] = analysis['updatedAt'].isoformat()
-                    
-                    analyses.append(analysis)
-                
-                return analyses
+                return [self._row_to_analysis(row) for row in result]
             
             except NoSuchTableError:
                 logger.info(f"Tabla {table_name} no existe para el cliente {client_name}")
@@ -193,12 +233,9 @@ class AnalysisService:
         """
         try:
             # Verificar si el cliente existe
-            client_result = self.db_session.execute(
-                text("SELECT clientId FROM smartvoc_clients WHERE clientName = :name"),
-                {"name": client_name}
-            ).fetchone()
+            client = client_cache.get(client_name=client_name, session=self.db_session, fresh=True)
             
-            if not client_result:
+            if not client:
                 logger.warning(f"Cliente {client_name} no encontrado")
                 return None
             
@@ -219,47 +256,82 @@ class AnalysisService:
             if isinstance(gsc_analysis, dict):
                 gsc_analysis = json.dumps(gsc_analysis)
             
-            # Verificar si ya existe un análisis para esta conversación
-            existing = self.db_session.execute(
-                text(f"SELECT id FROM {table_name} WHERE conversationId = :conversation_id"),
-                {"conversation_id": conversation_id}
-            ).fetchone()
-            
-            if existing:
-                logger.warning(f"Ya existe un análisis para la conversación {conversation_id}, use update_analysis")
-                return None
-            
-            # Crear el análisis
+            # Crear el análisis o reemplazar el existente de la conversación
             now = datetime.utcnow()
-            query = text(f"""
-                INSERT INTO {table_name} 
-                (conversationId, batchRunId, analysisType, createdAt, updatedAt, deepAnalysis, gscAnalysis, status)
-                VALUES 
-                (:conversation_id, :batch_run_id, :analysis_type, :created_at, :updated_at, :deep_analysis, :gsc_analysis, :status)
-            """)
-            
-            self.db_session.execute(query, {
-                "conversation_id": conversation_id,
-                "batch_run_id": batch_run_id,
-                "analysis_type": analysis_type,
-                "created_at": now,
-                "updated_at": now,
-                "deep_analysis": deep_analysis,
-                "gsc_analysis": gsc_analysis,
+            values = {
+                "conversationId": conversation_id,
+                "batchRunId": batch_run_id,
+                "analysisType": analysis_type,
+                "createdAt": now,
+                "updatedAt": now,
+                "deepAnalysis": deep_analysis,
+                "gscAnalysis": gsc_analysis,
                 "status": "completed"
-            })
+            }
+            update_columns = ["batchRunId", "analysisType", "updatedAt", "deepAnalysis", "gscAnalysis", "status"]
             
-            self.db_session.commit()
+            engine = self.db_session.get_bind()
+            if schema_registry.has_unique_key(table_name, engine, ["conversationId"]):
+                # Una sola sentencia que devuelve la fila
+                row = upsert(
+                    self.db_session,
+                    table_name,
+                    values,
+                    conflict_columns=["conversationId"],
+                    update_columns=update_columns
+                )
+            else:
+                # Tablas creadas antes del índice único en conversationId, hasta
+                # que `flask backfill-indexes` lo cree: ON CONFLICT no tiene destino
+                row = self._replace_analysis_without_unique_key(table_name, values, update_columns)
             
-            # Obtener el análisis creado
-            analysis = self.get_client_analyses(client_name, conversation_id=conversation_id)
-            return analysis[0] if analysis else None
+            self.db_session.commit()
+            return self._row_to_analysis(row) if row else None
             
         except SQLAlchemyError as e:
             self.db_session.rollback()
             logger.error(f"Error al crear análisis para {conversation_id}: {str(e)}")
             return None
     
+    def _replace_analysis_without_unique_key(self, table_name, values, update_columns):
+        """
+        Crea o reemplaza el análisis de una conversación consultando antes si
+        existe, para tablas sin índice único en `conversationId`.
+        
+        Args:
+            table_name: Nombre de la tabla de análisis
+            values: Valores del análisis
+            update_columns: Columnas que se reemplazan si el análisis existe
+            
+        Returns:
+            Row: Fila creada o actualizada
+        """
+        # Si la tabla ya tiene duplicados se reemplaza el más antiguo
+        existing = self.db_session.execute(
+            text(f"SELECT id FROM {table_name} WHERE conversationId = :conversationId ORDER BY id"),
+            {"conversationId": values["conversationId"]}
+        ).fetchone()
+        
+        if existing:
+            assignments = ', '.join(f"{column} = :{column}" for column in update_columns)
+            self.db_session.execute(
+                text(f"UPDATE {table_name} SET {assignments} WHERE id = :id"),
+                dict(values, id=existing.id)
+            )
+            return self.db_session.execute(
+                text(f"SELECT * FROM {table_name} WHERE id = :id"), {"id": existing.id}
+            ).fetchone()
+        
+        columns = list(values)
+        self.db_session.execute(
+            text(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(':' + column for column in columns)})"),
+            values
+        )
+        return self.db_session.execute(
+            text(f"SELECT * FROM {table_name} WHERE conversationId = :conversationId ORDER BY id DESC"),
+            {"conversationId": values["conversationId"]}
+        ).fetchone()
+    
     def update_analysis(self, client_name, conversation_id, analysis_data):
         """
         Actualiza un análisis existente.
@@ -275,12 +347,9 @@ class AnalysisService:
         """
         try:
             # Verificar si el cliente existe
-            client_result = self.db_session.execute(
-                text("SELECT clientId FROM smartvoc_clients WHERE clientName = :name"),
-                {"name": client_name}
-            ).fetchone()
+            client = client_cache.get(client_name=client_name, session=self.db_session, fresh=True)
             
-            if not client_result:
+            if not client:
                 logger.warning(f"Cliente {client_name} no encontrado")
                 return None
             
@@ -288,16 +357,6 @@ class AnalysisService:
             
             # Verificar si existe la tabla
             try:
-                # Verificar si existe el análisis
-                existing = self.db_session.execute(
-                    text(f"SELECT id FROM {table_name} WHERE conversationId = :conversation_id"),
-                    {"conversation_id": conversation_id}
-                ).fetchone()
-                
-                if not existing:
-                    logger.warning(f"No existe un análisis para la conversación {conversation_id}")
-                    return None
-                
                 # Preparar conjuntos de actualizaciones
                 updates = []
                 params = {"conversation_id": conversation_id, "updated_at": datetime.utcnow()}
@@ -332,15 +391,20 @@ class AnalysisService:
                 # Siempre actualizar updatedAt
                 updates.append("updatedAt = :updated_at")
                 
-                # Ejecutar la actualización si hay campos para actualizar
-                if updates:
-                    update_query = f"UPDATE {table_name} SET {', '.join(updates)} WHERE conversationId = :conversation_id"
-                    self.db_session.execute(text(update_query), params)
-                    self.db_session.commit()
+                # Actualizar y obtener el análisis en una sola sentencia
+                update_query = update_returning_statement(
+                    self.db_session.get_bind().dialect,
+                    table_name,
+                    ', '.join(updates),
+                    "conversationId = :conversation_id"
+                )
+                row = self.db_session.execute(update_query, params).fetchone()
+                self.db_session.commit()
                 
-                # Obtener el análisis actualizado
-                analysis = self.get_client_analyses(client_name, conversation_id=conversation_id)
-                return analysis[0] if analysis else None
+                if not row:
+                    logger.warning(f"No existe un análisis para la conversación {conversation_id}")
+                    return None
+                return self._row_to_analysis(row)
                 
             except NoSuchTableError:
                 logger.warning(f"Tabla {table_name} no existe para el cliente {client_name}")
@@ -364,12 +428,9 @@ class AnalysisService:
         """
         try:
             # Verificar si el cliente existe
-            client_result = self.db_session.execute(
-                text("SELECT clientId FROM smartvoc_clients WHERE clientName = :name"),
-                {"name": client_name}
-            ).fetchone()
+            client = client_cache.get(client_name=client_name, session=self.db_session, fresh=True)
             
-            if not client_result:
+            if not client:
                 logger.warning(f"Cliente {client_name} no encontrado")
                 return False
             
@@ -377,20 +438,14 @@ class AnalysisService:
             
             # Verificar si existe la tabla
             try:
-                # Verificar si existe el análisis
-                existing = self.db_session.execute(
-                    text(f"SELECT id FROM {table_name} WHERE conversationId = :conversation_id"),
-                    {"conversation_id": conversation_id}
-                ).fetchone()
+                # Eliminar el análisis; el número de filas afectadas indica si existía
+                delete_query = f"DELETE FROM {table_name} WHERE conversationId = :conversation_id"
+                result = self.db_session.execute(text(delete_query), {"conversation_id": conversation_id})
+                self.db_session.commit()
                 
-                if not existing:
+                if result.rowcount == 0:
                     logger.warning(f"No existe un análisis para la conversación {conversation_id}")
                     return False
-                
-                # Eliminar el análisis
-                delete_query = f"DELETE FROM {table_name} WHERE conversationId = :conversation_id"
-                self.db_session.execute(text(delete_query), {"conversation_id": conversation_id})
-                self.db_session.commit()
                 return True
                 
             except NoSuchTableError:
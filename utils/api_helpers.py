@@ -2,8 +2,10 @@
 Utilidades para ayudar en la gestión de la API.
 Este módulo contiene funciones para manejar respuestas, errores y códigos de estado.
 """
+import json
 import logging
-from flask import jsonify
+from flask import jsonify, request
+from utils.exceptions import ValidationError
 
 logger = logging.getLogger(__name__)
 
@@ -43,4 +45,46 @@ def handle_response(result, status_code=200):
     if 'success' not in result:
         result['success'] = status_code < 400
         
-    return jsonify(result), status_code 
\ No newline at end of file
+    return jsonify(result), status_code 
+
+# Tipos MIME aceptados para cuerpos JSON delimitados por saltos de línea
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def load_bulk_payload():
+    """
+    Obtiene la lista de elementos de una petición de carga masiva.
+    
+    Acepta un arreglo JSON (o un objeto con la clave 'items') y, si el
+    Content-Type es NDJSON, un objeto JSON por línea leído directamente del
+    stream de la petición.
+    
+    Returns:
+        list: Elementos recibidos, sin validar
+    
+    Raises:
+        ValidationError: Si el cuerpo no es un arreglo o contiene JSON inválido
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        for line_number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                raise ValidationError(
+                    message="El cuerpo NDJSON contiene una línea inválida",
+                    details={"line": line_number, "original_error": str(e)}
+                )
+        return items
+    
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list):
+        raise ValidationError(
+            message="Se esperaba un arreglo JSON o un cuerpo NDJSON",
+            details={"content_type": request.mimetype}
+        )
+    return data
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+Planificador de la cola de análisis por lotes.
+
+Decide qué filas de `batch_jobs` reclama un worker. Combina la prioridad del
+lote (1-5) con un reparto justo ponderado por cliente: cada cliente recibe
+una porción proporcional a su peso, descontando lo que ya tiene en proceso,
+de modo que un cliente con un lote enorme no bloquea a los demás. La espera
+acumulada eleva la puntuación de las filas antiguas para que las de baja
+prioridad no queden postergadas indefinidamente.
+"""
+import logging
+import math
+
+from config import active_config
+
+logger = logging.getLogger(__name__)
+
+# Peso relativo de cada prioridad; cada nivel duplica al anterior
+PRIORITY_WEIGHTS = {1: 1, 2: 2, 3: 4, 4: 8, 5: 16}
+
+def parse_client_weights(value):
+    """
+    Interpreta la configuración de pesos por cliente.
+
+    Args:
+        value (str): Pares `cliente:peso` separados por comas, p. ej. "Acme:2,Beta:0.5"
+
+    Returns:
+        dict: Peso por nombre de cliente
+    """
+    weights = {}
+    for pair in (value or '').split(','):
+        if not pair.strip():
+            continue
+        try:
+            name, weight = pair.rsplit(':', 1)
+            weights[name.strip()] = float(weight)
+        except ValueError:
+            logger.warning(f"Peso de cliente inválido en la configuración del planificador: '{pair}'")
+    return weights
+
+def percentile(values, q):
+    """
+    Calcula un percentil por el método del rango más cercano.
+
+    Args:
+        values (list): Valores ordenados de menor a mayor
+        q (float): Percentil entre 0 y 100
+
+    Returns:
+        float: Valor del percentil o None si no hay valores
+    """
+    if not values:
+        return None
+    rank = max(int(math.ceil(q / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+class BatchScheduler:
+    """
+    Selección de filas por prioridad y reparto justo ponderado por cliente.
+
+    Args:
+        client_weights (dict): Peso por cliente; los no listados pesan 1
+        aging_seconds (float): Segundos de espera que duplican la puntuación de una fila
+    """
+
+    def __init__(self, client_weights=None, aging_seconds=None):
+        if client_weights is None:
+            client_weights = parse_client_weights(active_config.SCHEDULER_CLIENT_WEIGHTS)
+        self.client_weights = client_weights
+        self.aging_seconds = aging_seconds or active_config.SCHEDULER_AGING_SECONDS
+
+    def score(self, candidate, share, now):
+        """
+        Puntuación de la siguiente fila de un cliente.
+
+        Args:
+            candidate: Fila con client_name, priority y created_at
+            share (int): Filas del cliente en proceso o ya elegidas en esta ronda
+            now (datetime): Momento de la selección
+
+        Returns:
+            float: Puntuación; gana la mayor
+        """
+        priority_weight = PRIORITY_WEIGHTS.get(candidate.priority, PRIORITY_WEIGHTS[3])
+        client_weight = self.client_weights.get(candidate.client_name, 1.0)
+        waited = max((now - candidate.created_at).total_seconds(), 0.0) if candidate.created_at else 0.0
+        return priority_weight * client_weight * (1 + waited / self.aging_seconds) / (1 + share)
+
+    def select(self, candidates, inflight, limit, now):
+        """
+        Elige hasta `limit` filas entre las candidatas.
+
+        Args:
+            candidates (list): Filas candidatas; las de cada cliente ordenadas
+                por prioridad descendente e ID
+            inflight (dict): Filas en proceso por cliente
+            limit (int): Número máximo de filas a elegir
+            now (datetime): Momento de la selección
+
+        Returns:
+            list: IDs de las filas elegidas, en orden de selección
+        """
+        queues = {}
+        for candidate in candidates:
+            queues.setdefault(candidate.client_name, []).append(candidate)
+        positions = {client_name: 0 for client_name in queues}
+        share = {client_name: inflight.get(client_name, 0) for client_name in queues}
+
+        selected = []
+        while len(selected) < limit:
+            best = None
+            best_score = None
+            for client_name, queue in queues.items():
+                position = positions[client_name]
+                if position >= len(queue):
+                    continue
+                candidate = queue[position]
+                score = self.score(candidate, share[client_name], now)
+                if best is None or score > best_score or (score == best_score and candidate.id < best.id):
+                    best, best_score = candidate, score
+            if best is None:
+                break
+
+            selected.append(best.id)
+            positions[best.client_name] += 1
+            share[best.client_name] += 1
+
+        return selected
@@ -0,0 +1,102 @@
+"""
+Worker de la cola persistente de análisis por lotes.
+
+Cada worker reclama filas de `batch_jobs`, las analiza a través de
+`ConversationController.process_jobs` y vuelve a consultar la cola. Se
+ejecuta fuera de la API (ver `worker.py`), por lo que el rendimiento de los
+lotes escala con el número de procesos worker.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from config import active_config
+from db import db_session
+from utils.conversation_controller import ConversationController
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+class BatchWorker:
+    """
+    Bucle de procesamiento de la cola de análisis.
+
+    Args:
+        worker_id (str): Identificador del worker; por defecto host, PID y sufijo aleatorio
+        claim_size (int): Filas reclamadas por iteración
+        poll_interval (float): Segundos de espera cuando la cola está vacía
+    """
+
+    def __init__(self, worker_id=None, claim_size=None, poll_interval=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.claim_size = claim_size or active_config.WORKER_CLAIM_SIZE
+        self.poll_interval = poll_interval if poll_interval is not None else active_config.WORKER_POLL_INTERVAL
+        self.controller = ConversationController(db_session)
+        self.stop_event = threading.Event()
+        self._last_snapshot = 0.0
+
+    def write_metrics(self, force=False):
+        """
+        Vuelca las métricas del proceso para /api/metrics, como mucho una vez
+        cada METRICS_SNAPSHOT_INTERVAL segundos salvo con `force`.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_snapshot < active_config.METRICS_SNAPSHOT_INTERVAL:
+            return
+        self._last_snapshot = now
+        try:
+            metrics.write_snapshot()
+        except Exception as e:
+            logger.warning(f"No se pudieron volcar las métricas del worker {self.worker_id}: {str(e)}")
+
+    def run_once(self):
+        """
+        Reclama y procesa un grupo de filas.
+
+        Returns:
+            int: Número de filas procesadas
+        """
+        jobs = self.controller.job_queue.claim(self.worker_id, self.claim_size)
+        if not jobs:
+            return 0
+
+        summary = self.controller.process_jobs(jobs)
+        logger.info(
+            f"Worker {self.worker_id}: {summary['completed']} completadas, "
+            f"{summary['failed']} fallidas"
+        )
+        return len(jobs)
+
+    def run(self, once=False):
+        """
+        Procesa la cola hasta que se solicite la detención.
+
+        Args:
+            once (bool): Terminar cuando la cola quede vacía
+        """
+        logger.info(f"Worker {self.worker_id} iniciado")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    logger.error(f"Error en el worker {self.worker_id}: {str(e)}")
+                    processed = 0
+                finally:
+                    db_session.remove()
+                self.write_metrics()
+
+                if not processed:
+                    if once:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            self.write_metrics(force=True)
+            logger.info(f"Worker {self.worker_id} detenido")
+
+    def stop(self):
+        """Solicita la detención del bucle tras el grupo en curso."""
+        self.stop_event.set()
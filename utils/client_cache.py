@@ -0,0 +1,206 @@
+"""
+Caché en proceso de los registros de clientes.
+
+Casi todas las operaciones comienzan resolviendo el cliente por ID, nombre
+o slug. Este módulo guarda esos registros en una caché LRU con expiración,
+indexada por las tres claves, para evitar una consulta a `smartvoc_clients`
+por petición. Las modificaciones de clientes deben invalidar la entrada; un
+índice inverso por ID permite eliminar todos sus alias aunque la LRU ya haya
+descartado alguno.
+
+La invalidación solo alcanza al proceso que modifica el cliente: los demás
+workers siguen sirviendo el registro anterior hasta que vence el TTL
+(`CLIENT_CACHE_TTL`). Por eso las escrituras resuelven el cliente con
+`fresh=True`, que lo lee de la base de datos y refresca la entrada.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import column, select, table
+
+from config import active_config
+from db import db_session
+
+logger = logging.getLogger(__name__)
+
+# Registro mínimo de un cliente, independiente de la sesión de SQLAlchemy
+ClientRecord = namedtuple('ClientRecord', ['clientId', 'clientName', 'clientSlug'])
+
+# Vista ligera de smartvoc_clients; los nombres mixtos se citan según el dialecto
+_clients = table('smartvoc_clients', column('clientId'), column('clientName'), column('clientSlug'))
+
+# Columna de smartvoc_clients asociada a cada tipo de clave
+_KEY_COLUMNS = {
+    'id': _clients.c.clientId,
+    'name': _clients.c.clientName,
+    'slug': _clients.c.clientSlug
+}
+
+class ClientCache:
+    """
+    Caché LRU con TTL de registros de clientes indexada por ID, nombre y slug.
+
+    Solo se guardan clientes encontrados; las búsquedas sin resultado siempre
+    consultan la base de datos.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        # Índice inverso: ID del cliente -> claves bajo las que está guardado
+        self._aliases = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _keys(record):
+        """Devuelve las claves bajo las que se indexa un registro."""
+        return [
+            ('id', str(record.clientId)),
+            ('name', record.clientName),
+            ('slug', record.clientSlug)
+        ]
+
+    def get(self, client_id=None, client_name=None, client_slug=None, session=None, fresh=False):
+        """
+        Resuelve un cliente por ID, nombre o slug (en ese orden de preferencia).
+
+        Args:
+            client_id: ID del cliente
+            client_name (str): Nombre del cliente
+            client_slug (str): Slug del cliente
+            session: Sesión de base de datos para la consulta en caso de fallo
+            fresh (bool): Leer siempre el registro de la base de datos y
+                reemplazar el guardado; para escrituras, que no deben usar un
+                cliente renombrado o eliminado por otro proceso
+
+        Returns:
+            ClientRecord: Registro del cliente o None si no existe
+        """
+        if client_id is not None:
+            key = ('id', str(client_id))
+        elif client_name is not None:
+            key = ('name', client_name)
+        elif client_slug is not None:
+            key = ('slug', client_slug)
+        else:
+            return None
+
+        if not fresh:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+
+        record = self._load(key, session or db_session)
+        if fresh:
+            # La versión guardada y sus alias (un nombre anterior) pueden estar obsoletos
+            stale_keys = [key]
+            if record is not None:
+                stale_keys.append(('id', str(record.clientId)))
+            self._invalidate_keys(stale_keys)
+        if record is not None:
+            self.put(record)
+        return record
+
+    def _load(self, key, session):
+        """Consulta el cliente en la base de datos."""
+        row = session.execute(
+            select(_clients).where(_KEY_COLUMNS[key[0]] == key[1])
+        ).fetchone()
+        if not row:
+            return None
+        return ClientRecord(row.clientId, row.clientName, row.clientSlug)
+
+    def _remove_key(self, key):
+        """Elimina una clave de la caché y del índice inverso (con el lock tomado)."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        client_id = str(entry[1].clientId)
+        aliases = self._aliases.get(client_id)
+        if aliases is not None:
+            aliases.discard(key)
+            if not aliases:
+                del self._aliases[client_id]
+        return entry
+
+    def put(self, record):
+        """Guarda un registro bajo todas sus claves."""
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            aliases = self._aliases.setdefault(str(record.clientId), set())
+            for key in self._keys(record):
+                # Un nombre o slug reutilizado deja de apuntar al cliente anterior
+                previous = self._entries.get(key)
+                if previous is not None and str(previous[1].clientId) != str(record.clientId):
+                    self._remove_key(key)
+                self._entries[key] = (expires_at, record)
+                self._entries.move_to_end(key)
+                aliases.add(key)
+            while len(self._entries) > self.max_size:
+                self._remove_key(next(iter(self._entries)))
+
+    def invalidate(self, client_id=None, client_name=None, client_slug=None):
+        """
+        Elimina de la caché el cliente indicado por cualquiera de sus claves,
+        junto con todos sus alias.
+
+        Args:
+            client_id: ID del cliente
+            client_name (str or list): Nombre del cliente, o nombres anterior y nuevo
+            client_slug (str or list): Slug del cliente, o slugs anterior y nuevo
+        """
+        candidates = []
+        if client_id is not None:
+            candidates.append(('id', str(client_id)))
+        for key_type, values in (('name', client_name), ('slug', client_slug)):
+            if isinstance(values, (list, tuple, set)):
+                candidates.extend((key_type, value) for value in values if value is not None)
+            elif values is not None:
+                candidates.append((key_type, values))
+        self._invalidate_keys(candidates)
+
+    def _invalidate_keys(self, candidates):
+        """Elimina las claves indicadas y todos los alias de sus clientes."""
+        with self._lock:
+            client_ids = {key[1] for key in candidates if key[0] == 'id'}
+            for key in candidates:
+                entry = self._remove_key(key)
+                if entry is not None:
+                    client_ids.add(str(entry[1].clientId))
+            for invalidated_id in client_ids:
+                for key in list(self._aliases.get(invalidated_id, ())):
+                    self._remove_key(key)
+
+    def clear(self):
+        """Vacía la caché y reinicia los contadores."""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Devuelve los contadores de aciertos y fallos de la caché."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / total if total else 0.0,
+            "size": len(self._entries)
+        }
+
+# Caché compartida por todo el proceso
+client_cache = ClientCache(
+    max_size=active_config.CLIENT_CACHE_MAX_SIZE,
+    ttl=active_config.CLIENT_CACHE_TTL
+)
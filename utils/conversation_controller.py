@@ -5,11 +5,11 @@ integrando los servicios de análisis y OpenAI.
 """
 import logging
 import json
-import uuid
-import threading
-from datetime import datetime
+
+from sqlalchemy import text
 
 from utils.analysis_service import AnalysisService
+from utils.client_cache import client_cache
 from utils.openai_service import OpenAIService
 
 logger = logging.getLogger(__name__)
@@ -21,17 +21,23 @@ class ConversationController:
     utilizando los servicios de análisis y OpenAI.
     """
     
-    def __init__(self, db_session):
+    def __init__(self, db_session, openai_service=None):
         """
         Inicializa el controlador de conversaciones.
         
         Args:
             db_session: Sesión de base de datos SQLAlchemy
+            openai_service: Servicio de OpenAI a utilizar; por defecto uno nuevo
+                que usa la sesión HTTP compartida del proceso
         """
         self.db_session = db_session
         self.analysis_service = AnalysisService(db_session)
-        self.openai_service = OpenAIService()
-        self.batch_processes = {}  # Almacena información sobre procesos por lotes en curso
+        self.openai_service = openai_service or OpenAIService()
+        # Importación diferida: models importa el paquete utils al cargarse
+        from utils.job_queue import JobQueue
+        from services.analysis_service import AnalysisService as QueuedAnalysisService
+        self.job_queue = JobQueue(db_session)
+        self.queued_analyses = QueuedAnalysisService()
     
     def analyze_conversation(self, client_name, conversation_id, conversation_data, analysis_type="standard"):
         """
@@ -75,14 +81,18 @@ class ConversationController:
             logger.error(f"Error en el proceso de análisis para {conversation_id}: {str(e)}")
             return None
     
-    def start_batch_analysis(self, client_name, conversations, analysis_type="standard"):
+    def start_batch_analysis(self, client_name, conversations, analysis_type="standard", priority=3):
         """
-        Inicia un análisis por lotes en un hilo separado.
+        Encola un análisis por lotes en la cola persistente.
+        
+        Los lotes los procesan los workers (`python worker.py`), que pueden
+        ejecutarse en procesos separados de la API.
         
         Args:
             client_name: Nombre del cliente
             conversations: Lista de conversaciones a analizar
             analysis_type: Tipo de análisis a realizar
+            priority: Prioridad del lote (1-5)
             
         Returns:
             str: ID del proceso por lotes
@@ -93,100 +103,131 @@ class ConversationController:
                 logger.warning("No se proporcionaron conversaciones para el análisis por lotes")
                 return None
             
-            # Generar un ID único para el lote
-            batch_id = str(uuid.uuid4())
-            
-            # Inicializar el estado del proceso
-            self.batch_processes[batch_id] = {
-                "total": len(conversations),
-                "completed": 0,
-                "failed": 0,
-                "status": "starting",
-                "client_name": client_name,
-                "start_time": datetime.utcnow().isoformat(),
-                "analysis_type": analysis_type
-            }
-            
-            # Iniciar el procesamiento en un hilo separado
-            thread = threading.Thread(
-                target=self._process_batch,
-                args=(batch_id, client_name, conversations, analysis_type)
-            )
-            thread.daemon = True
-            thread.start()
+            if not client_cache.get(client_name=client_name, session=self.db_session, fresh=True):
+                logger.error(f"No se encontró un cliente con el nombre '{client_name}'")
+                return None
             
-            return batch_id
+            return self.job_queue.enqueue(client_name, conversations, analysis_type, priority=priority)
             
         except Exception as e:
             logger.error(f"Error al iniciar el análisis por lotes: {str(e)}")
             return None
     
-    def _process_batch(self, batch_id, client_name, conversations, analysis_type):
+    def _load_conversation(self, client_name, conversation_id):
+        """
+        Obtiene el contenido de una conversación desde la tabla del cliente.
+        
+        Se usa con las filas encoladas solo con el ID de la conversación.
+        
+        Returns:
+            dict: Conversación con su ID o None si no existe
+        """
+        client = client_cache.get(client_name=client_name, session=self.db_session)
+        if not client:
+            return None
+        
+        row = self.db_session.execute(
+            text(f"SELECT conversation FROM Conversations__{client.clientSlug} WHERE conversation_id = :conversation_id"),
+            {"conversation_id": conversation_id}
+        ).fetchone()
+        if not row:
+            return None
+        
+        conversation = json.loads(row.conversation) if isinstance(row.conversation, str) else row.conversation
+        if isinstance(conversation, dict):
+            return dict(conversation, id=conversation_id)
+        return {"id": conversation_id, "conversation": conversation}
+    
+    def _fail_job(self, job, error_message, retry=True):
+        """
+        Registra el fallo de una fila de la cola y, si ya no se reintentará,
+        marca con el error el análisis pendiente de la conversación.
+        """
+        self.job_queue.fail(job, error_message, retry=retry)
+        if not (retry and job.attempts < self.job_queue.max_attempts):
+            self.queued_analyses.record_batch_result(
+                job.client_name, job.conversation_id, job.analysis_type, job.batch_id,
+                error_message=error_message
+            )
+    
+    def process_jobs(self, jobs):
         """
-        Procesa un lote de conversaciones en segundo plano.
+        Analiza filas reclamadas de la cola y registra el resultado de cada una.
+        
+        Las conversaciones se analizan en paralelo y cada resultado se almacena
+        y se marca en la cola apenas termina, de modo que un corte a mitad del
+        lote no repite las conversaciones ya completadas.
         
         Args:
-            batch_id: ID del lote
-            client_name: Nombre del cliente
-            conversations: Lista de conversaciones a analizar
-            analysis_type: Tipo de análisis a realizar
+            jobs: Filas de `batch_jobs` reclamadas por el worker
+            
+        Returns:
+            dict: Número de filas completadas y fallidas
         """
-        try:
-            # Actualizar el estado del proceso
-            self.batch_processes[batch_id]["status"] = "processing"
+        summary = {"completed": 0, "failed": 0}
+        
+        # Agrupar por tipo de análisis, ya que cada lote de OpenAI usa uno solo
+        jobs_by_type = {}
+        for job in jobs:
+            jobs_by_type.setdefault(job.analysis_type, []).append(job)
+        
+        for analysis_type, typed_jobs in jobs_by_type.items():
+            conversations = {}
+            for job in typed_jobs:
+                conversation = json.loads(job.conversation) if job.conversation else {}
+                if list(conversation) == ['id']:
+                    conversation = self._load_conversation(job.client_name, job.conversation_id)
+                    if conversation is None:
+                        self._fail_job(job, "La conversación no existe", retry=False)
+                        summary["failed"] += 1
+                        continue
+                conversations[id(conversation)] = (conversation, job)
             
-            # Procesar cada conversación
-            for conversation in conversations:
+            for conversation, analysis_result in self.openai_service.iter_batch_analyze_conversations(
+                [conversation for conversation, _ in conversations.values()], analysis_type, max_retries=1
+            ):
+                job = conversations[id(conversation)][1]
                 try:
-                    # Extraer el ID de la conversación
-                    conversation_id = conversation.get('id')
-                    if not conversation_id:
-                        logger.warning(f"Conversación sin ID en el lote {batch_id}, se omitirá")
-                        self.batch_processes[batch_id]["failed"] += 1
-                        continue
-                    
-                    # Analizar la conversación
-                    analysis_result = self.openai_service.analyze_conversation(conversation, analysis_type)
-                    
-                    if not analysis_result:
-                        logger.error(f"Error al analizar la conversación {conversation_id} en el lote {batch_id}")
-                        self.batch_processes[batch_id]["failed"] += 1
+                    if not analysis_result or 'error' in analysis_result:
+                        logger.error(f"Error al analizar la conversación {job.conversation_id} en el lote {job.batch_id}")
+                        self._fail_job(job, "Error al analizar la conversación")
+                        summary["failed"] += 1
                         continue
                     
                     # Crear el registro de análisis
                     analysis_data = {
                         "deepAnalysis": analysis_result,
-                        "batchRunId": batch_id,
+                        "batchRunId": job.batch_id,
                         "status": "completed"
                     }
                     
                     # Almacenar los resultados del análisis
                     stored_analysis = self.analysis_service.create_analysis(
-                        client_name=client_name,
-                        conversation_id=conversation_id,
+                        client_name=job.client_name,
+                        conversation_id=job.conversation_id,
                         analysis_data=analysis_data,
-                        batch_run_id=batch_id,
+                        batch_run_id=job.batch_id,
                         analysis_type=analysis_type
                     )
                     
                     if stored_analysis:
-                        self.batch_processes[batch_id]["completed"] += 1
+                        self.job_queue.complete(job)
+                        # Completar también el análisis pendiente creado al encolar
+                        self.queued_analyses.record_batch_result(
+                            job.client_name, job.conversation_id, analysis_type, job.batch_id,
+                            result=analysis_result
+                        )
+                        summary["completed"] += 1
                     else:
-                        self.batch_processes[batch_id]["failed"] += 1
+                        self._fail_job(job, "No se pudo almacenar el análisis")
+                        summary["failed"] += 1
                     
                 except Exception as e:
-                    logger.error(f"Error al procesar la conversación en el lote {batch_id}: {str(e)}")
-                    self.batch_processes[batch_id]["failed"] += 1
-            
-            # Actualizar el estado final del proceso
-            self.batch_processes[batch_id]["status"] = "completed"
-            self.batch_processes[batch_id]["end_time"] = datetime.utcnow().isoformat()
-            
-        except Exception as e:
-            logger.error(f"Error en el procesamiento del lote {batch_id}: {str(e)}")
-            self.batch_processes[batch_id]["status"] = "failed"
-            self.batch_processes[batch_id]["error"] = str(e)
-            self.batch_processes[batch_id]["end_time"] = datetime.utcnow().isoformat()
+                    logger.error(f"Error al procesar la conversación en el lote {job.batch_id}: {str(e)}")
+                    self._fail_job(job, str(e))
+                    summary["failed"] += 1
+        
+        return summary
     
     def get_batch_status(self, batch_id):
         """
@@ -199,7 +240,7 @@ class ConversationController:
             dict: Estado del proceso por lotes
             None: Si el lote no existe
         """
-        return self.batch_processes.get(batch_id)
+        return self.job_queue.batch_status(batch_id)
     
     def get_all_batch_statuses(self, client_name=None):
         """
@@ -211,12 +252,4 @@ class ConversationController:
         Returns:
             dict: Estado de todos los procesos por lotes
         """
-        if not client_name:
-            return self.batch_processes
-        
-        # Filtrar por cliente
-        return {
-            batch_id: status
-            for batch_id, status in self.batch_processes.items()
-            if status.get("client_name") == client_name
-        } 
\ No newline at end of file
+        return self.job_queue.batch_statuses(client_name=client_name)
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+Sesiones HTTP con pool de conexiones persistentes.
+
+Las llamadas a Azure OpenAI reutilizan conexiones keep-alive a través de una
+sesión de `requests` compartida, evitando un handshake TCP+TLS por cada
+conversación. El adaptador registra además cuánto tarda cada conexión nueva
+para poder separar el costo del handshake de la latencia del modelo.
+"""
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Tiempo de conexión de la última solicitud de cada hilo
+_connect_timing = threading.local()
+
+def reset_connect_time():
+    """Reinicia el tiempo de conexión registrado para el hilo actual."""
+    _connect_timing.seconds = 0.0
+
+def last_connect_time():
+    """
+    Devuelve los segundos dedicados a abrir conexiones en la última solicitud
+    del hilo actual (0 si se reutilizó una conexión del pool).
+    """
+    return getattr(_connect_timing, 'seconds', 0.0)
+
+class _TimedConnectMixin:
+    """Mide la duración de `connect()` (TCP y, en HTTPS, el handshake TLS)."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _connect_timing.seconds = last_connect_time() + time.perf_counter() - started
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Adaptador de `requests` cuyas conexiones registran su tiempo de apertura."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+def build_session(pool_size=10):
+    """
+    Crea una sesión con pool de conexiones keep-alive.
+
+    Args:
+        pool_size (int): Conexiones persistentes por host
+
+    Returns:
+        requests.Session: Sesión configurada
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    return session
+
+_shared_sessions = {}
+_shared_lock = threading.Lock()
+
+def get_shared_session(pool_size=10):
+    """
+    Devuelve la sesión compartida del proceso para un tamaño de pool dado,
+    creándola en el primer uso.
+    """
+    with _shared_lock:
+        session = _shared_sessions.get(pool_size)
+        if session is None:
+            session = _shared_sessions[pool_size] = build_session(pool_size)
+        return session
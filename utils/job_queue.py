@@ -0,0 +1,421 @@
+"""
+Cola persistente de análisis por lotes.
+
+Los lotes se guardan en la tabla `batch_jobs`, una fila por conversación.
+Los workers reclaman filas de forma atómica con un arriendo (lease) de
+duración limitada; si un worker muere, sus filas vuelven a estar disponibles
+cuando el arriendo expira. El estado de cada fila actúa como checkpoint, de
+modo que un lote interrumpido se reanuda sin repetir lo ya completado.
+"""
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, insert, or_, select, update
+
+from config import active_config
+from db import db_session
+from models import BatchJob
+from utils.batch_scheduler import BatchScheduler, percentile
+
+logger = logging.getLogger(__name__)
+
+# Estados de las filas de la cola
+PENDING = 'pending'
+PROCESSING = 'processing'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+# Error de las filas cuyo worker se detuvo durante el último intento
+EXHAUSTED_MESSAGE = "Se agotaron los intentos"
+
+class JobQueue:
+    """
+    Operaciones sobre la cola `batch_jobs`.
+
+    Args:
+        session: Sesión de base de datos SQLAlchemy
+        lease_seconds (int): Vigencia del reclamo de un worker sobre una fila
+        max_attempts (int): Intentos antes de marcar una fila como fallida
+        scheduler (BatchScheduler): Política de selección de filas al reclamar
+    """
+
+    def __init__(self, session=None, lease_seconds=None, max_attempts=None, scheduler=None):
+        self.session = session or db_session
+        self.lease_seconds = lease_seconds or active_config.JOB_LEASE_SECONDS
+        self.max_attempts = max_attempts or active_config.JOB_MAX_ATTEMPTS
+        self.scheduler = scheduler or BatchScheduler()
+
+    def enqueue(self, client_name, conversations, analysis_type="standard", priority=3, batch_id=None,
+                commit=True):
+        """
+        Encola un lote de conversaciones en una sola inserción multi-fila.
+
+        Las conversaciones sin ID se registran directamente como fallidas para
+        que cuenten en el total del lote.
+
+        Args:
+            client_name (str): Nombre del cliente
+            conversations (list): Conversaciones a analizar
+            analysis_type (str): Tipo de análisis a realizar
+            priority (int): Prioridad del lote (1-5)
+            batch_id (str): ID del lote; se genera uno si no se indica
+            commit (bool): Confirmar la transacción; con False la confirma quien llama
+
+        Returns:
+            str: ID del lote
+        """
+        batch_id = batch_id or str(uuid.uuid4())
+        now = datetime.utcnow()
+        rows = []
+        for conversation in conversations:
+            conversation_id = conversation.get('id')
+            rows.append({
+                'batch_id': batch_id,
+                'client_name': client_name,
+                'conversation_id': str(conversation_id) if conversation_id else '',
+                'conversation': json.dumps(conversation, default=str),
+                'analysis_type': analysis_type,
+                'priority': priority,
+                'status': PENDING if conversation_id else FAILED,
+                'attempts': 0,
+                'error_message': None if conversation_id else "Conversación sin ID",
+                'created_at': now,
+                'updated_at': now
+            })
+
+        try:
+            self.session.execute(insert(BatchJob.__table__), rows)
+            if commit:
+                self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        logger.info(f"Lote {batch_id} encolado con {len(rows)} conversaciones para {client_name}")
+        return batch_id
+
+    def _claimable(self, now):
+        """Condición de las filas que un worker puede reclamar."""
+        return and_(
+            BatchJob.attempts < self.max_attempts,
+            or_(
+                BatchJob.status == PENDING,
+                and_(BatchJob.status == PROCESSING, BatchJob.lease_expires_at < now)
+            )
+        )
+
+    def _fail_exhausted(self, now):
+        """
+        Marca como fallidas, sin confirmar, las filas en proceso cuyo arriendo
+        expiró en el último intento (su worker murió sin registrar el fallo),
+        y con el mismo error el análisis pendiente de cada conversación.
+        """
+        # Importación diferida: services.analysis_service importa este módulo
+        from services.analysis_service import AnalysisService
+
+        exhausted = and_(
+            BatchJob.status == PROCESSING,
+            BatchJob.lease_expires_at < now,
+            BatchJob.attempts >= self.max_attempts
+        )
+        rows = self.session.execute(
+            select(
+                BatchJob.id, BatchJob.batch_id, BatchJob.client_name,
+                BatchJob.conversation_id, BatchJob.analysis_type
+            )
+            .where(exhausted)
+            .with_for_update(skip_locked=True)
+            .with_hint(BatchJob, 'WITH (UPDLOCK, READPAST, ROWLOCK)', 'mssql')
+        ).fetchall()
+        if not rows:
+            return
+
+        self.session.execute(
+            update(BatchJob)
+            .where(BatchJob.id.in_([row.id for row in rows]), exhausted)
+            .values(status=FAILED, error_message=EXHAUSTED_MESSAGE, lease_expires_at=None, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        # record_batch_result escribe con db_session, la sesión de los workers
+        analyses = AnalysisService()
+        for row in rows:
+            analyses.record_batch_result(
+                row.client_name, row.conversation_id, row.analysis_type, row.batch_id,
+                error_message=EXHAUSTED_MESSAGE, commit=False
+            )
+        logger.warning(f"{len(rows)} filas de la cola fallidas por arriendo expirado en su último intento")
+
+    def claim(self, worker_id, limit=10):
+        """
+        Reclama de forma atómica hasta `limit` filas disponibles.
+
+        Toma filas pendientes y también filas en proceso cuyo arriendo expiró
+        (su worker se detuvo sin terminar). Las filas que agotaron sus intentos
+        se marcan como fallidas, junto con su análisis pendiente, en la misma
+        transacción que el reclamo. Qué filas se reclaman lo decide el
+        planificador según la prioridad y el reparto justo entre clientes.
+
+        Args:
+            worker_id (str): Identificador del worker
+            limit (int): Número máximo de filas a reclamar
+
+        Returns:
+            list: Filas de `batch_jobs` reclamadas, identificadas por su `claim_token`
+        """
+        now = datetime.utcnow()
+        claim_token = str(uuid.uuid4())
+        try:
+            self._fail_exhausted(now)
+
+            # Las primeras `limit` filas de cada cliente son las únicas que
+            # el planificador podría elegir en esta ronda
+            ranked = (
+                select(
+                    BatchJob.id,
+                    BatchJob.client_name,
+                    BatchJob.priority,
+                    BatchJob.created_at,
+                    func.row_number().over(
+                        partition_by=BatchJob.client_name,
+                        order_by=(BatchJob.priority.desc(), BatchJob.id)
+                    ).label('position')
+                )
+                .where(self._claimable(now))
+                .subquery()
+            )
+            candidates = self.session.execute(
+                select(ranked)
+                .where(ranked.c.position <= limit)
+                .order_by(ranked.c.client_name, ranked.c.position)
+            ).fetchall()
+
+            inflight = dict(self.session.execute(
+                select(BatchJob.client_name, func.count())
+                .where(BatchJob.status == PROCESSING, BatchJob.lease_expires_at >= now)
+                .group_by(BatchJob.client_name)
+            ).fetchall())
+
+            job_ids = self.scheduler.select(candidates, inflight, limit, now)
+            if job_ids:
+                # En PostgreSQL y SQL Server se bloquean las filas elegidas
+                # saltando las que otro worker ya bloqueó (SKIP LOCKED / READPAST);
+                # la consulta con ventana no admite FOR UPDATE, por eso se hace
+                # aparte. SQLite no tiene bloqueo por fila y omite la cláusula.
+                job_ids = self.session.execute(
+                    select(BatchJob.id)
+                    .where(BatchJob.id.in_(job_ids), self._claimable(now))
+                    .with_for_update(skip_locked=True)
+                    .with_hint(BatchJob, 'WITH (UPDLOCK, READPAST, ROWLOCK)', 'mssql')
+                ).scalars().all()
+            if job_ids:
+                # La condición se repite en el UPDATE para que dos workers no
+                # puedan reclamar la misma fila aunque la elijan a la vez
+                self.session.execute(
+                    update(BatchJob)
+                    .where(BatchJob.id.in_(job_ids), self._claimable(now))
+                    .values(
+                        status=PROCESSING,
+                        worker_id=worker_id,
+                        claim_token=claim_token,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        attempts=BatchJob.attempts + 1,
+                        started_at=now,
+                        updated_at=now
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        if not job_ids:
+            return []
+
+        # Filas de Core: una instantánea del reclamo que no se refresca desde la sesión
+        return self.session.execute(
+            select(BatchJob.__table__)
+            .where(BatchJob.claim_token == claim_token)
+            .order_by(BatchJob.priority.desc(), BatchJob.id)
+        ).fetchall()
+
+    def _finish(self, job, values):
+        """Actualiza una fila reclamada solo si el reclamo sigue vigente."""
+        values['updated_at'] = datetime.utcnow()
+        try:
+            result = self.session.execute(
+                update(BatchJob)
+                .where(BatchJob.id == job.id, BatchJob.claim_token == job.claim_token)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        if result.rowcount == 0:
+            logger.warning(f"La fila {job.id} del lote {job.batch_id} fue reclamada por otro worker")
+        return result.rowcount > 0
+
+    def complete(self, job):
+        """Marca una fila reclamada como completada."""
+        return self._finish(job, {'status': COMPLETED, 'error_message': None, 'lease_expires_at': None})
+
+    def fail(self, job, error_message, retry=True):
+        """
+        Registra el fallo de una fila reclamada. Si quedan intentos y `retry`
+        es verdadero, la fila vuelve a quedar pendiente.
+        """
+        status = PENDING if retry and job.attempts < self.max_attempts else FAILED
+        return self._finish(job, {'status': status, 'error_message': error_message, 'lease_expires_at': None})
+
+    def _summarize(self, batch_id, counts, info):
+        """Construye el estado de un lote a partir de sus conteos por estado."""
+        total = sum(counts.values())
+        active = counts.get(PENDING, 0) + counts.get(PROCESSING, 0)
+        if active == 0:
+            status = COMPLETED
+        elif counts.get(PROCESSING, 0) or counts.get(COMPLETED, 0):
+            status = PROCESSING
+        else:
+            status = 'queued'
+
+        result = {
+            "batch_id": batch_id,
+            "total": total,
+            "completed": counts.get(COMPLETED, 0),
+            "failed": counts.get(FAILED, 0),
+            "pending": counts.get(PENDING, 0),
+            "processing": counts.get(PROCESSING, 0),
+            "status": status,
+            "client_name": info['client_name'],
+            "analysis_type": info['analysis_type'],
+            "start_time": info['start_time'].isoformat() if info['start_time'] else None
+        }
+        if active == 0 and info['end_time']:
+            result["end_time"] = info['end_time'].isoformat()
+        return result
+
+    def batch_statuses(self, client_name=None, batch_id=None):
+        """
+        Obtiene el estado agregado de los lotes.
+
+        Args:
+            client_name (str): Filtrar por nombre de cliente (opcional)
+            batch_id (str): Filtrar por ID de lote (opcional)
+
+        Returns:
+            dict: Estado de cada lote por su ID
+        """
+        query = (
+            select(
+                BatchJob.batch_id,
+                BatchJob.status,
+                func.count().label('count'),
+                func.min(BatchJob.client_name).label('client_name'),
+                func.min(BatchJob.analysis_type).label('analysis_type'),
+                func.min(BatchJob.created_at).label('start_time'),
+                func.max(BatchJob.updated_at).label('end_time')
+            )
+            .group_by(BatchJob.batch_id, BatchJob.status)
+        )
+        if client_name:
+            query = query.where(BatchJob.client_name == client_name)
+        if batch_id:
+            query = query.where(BatchJob.batch_id == batch_id)
+
+        counts = {}
+        infos = {}
+        for row in self.session.execute(query):
+            counts.setdefault(row.batch_id, {})[row.status] = row.count
+            info = infos.setdefault(row.batch_id, {
+                'client_name': row.client_name,
+                'analysis_type': row.analysis_type,
+                'start_time': row.start_time,
+                'end_time': row.end_time
+            })
+            info['start_time'] = min(info['start_time'], row.start_time)
+            info['end_time'] = max(info['end_time'], row.end_time)
+
+        return {key: self._summarize(key, counts[key], infos[key]) for key in counts}
+
+    def batch_status(self, batch_id):
+        """
+        Obtiene el estado agregado de un lote.
+
+        Returns:
+            dict: Estado del lote o None si no existe
+        """
+        return self.batch_statuses(batch_id=batch_id).get(batch_id)
+
+    def status_counts(self):
+        """
+        Cuenta las filas de la cola por estado con una sola consulta agregada.
+
+        Returns:
+            dict: Filas por estado (todos los estados, aunque estén en cero)
+        """
+        counts = {status: 0 for status in (PENDING, PROCESSING, COMPLETED, FAILED)}
+        counts.update(dict(self.session.execute(
+            select(BatchJob.status, func.count()).group_by(BatchJob.status)
+        ).fetchall()))
+        return counts
+
+    def queue_stats(self, window_seconds=3600):
+        """
+        Obtiene la profundidad de la cola y los percentiles de espera por prioridad.
+
+        Args:
+            window_seconds (int): Antigüedad máxima de los reclamos considerados
+                para la espera hasta el inicio
+
+        Returns:
+            dict: Por prioridad, filas pendientes y en proceso, espera actual de
+                las pendientes y espera hasta el inicio de las reclamadas (segundos)
+        """
+        now = datetime.utcnow()
+        waiting = {}
+        for row in self.session.execute(
+            select(BatchJob.priority, BatchJob.created_at).where(BatchJob.status == PENDING)
+        ):
+            waiting.setdefault(row.priority, []).append((now - row.created_at).total_seconds())
+
+        to_start = {}
+        for row in self.session.execute(
+            select(BatchJob.priority, BatchJob.created_at, BatchJob.started_at)
+            .where(BatchJob.started_at >= now - timedelta(seconds=window_seconds))
+        ):
+            to_start.setdefault(row.priority, []).append((row.started_at - row.created_at).total_seconds())
+
+        processing = dict(self.session.execute(
+            select(BatchJob.priority, func.count())
+            .where(BatchJob.status == PROCESSING)
+            .group_by(BatchJob.priority)
+        ).fetchall())
+
+        def summarize(values):
+            values = sorted(values)
+            return {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else None
+            }
+
+        priorities = {}
+        for priority in sorted(set(waiting) | set(to_start) | set(processing), reverse=True):
+            priorities[str(priority)] = {
+                "depth": len(waiting.get(priority, [])),
+                "processing": processing.get(priority, 0),
+                "waitSeconds": summarize(waiting.get(priority, [])),
+                "waitToStartSeconds": summarize(to_start.get(priority, []))
+            }
+
+        return {
+            "depth": sum(item["depth"] for item in priorities.values()),
+            "processing": sum(item["processing"] for item in priorities.values()),
+            "priorities": priorities
+        }
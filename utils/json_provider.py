@@ -0,0 +1,96 @@
+"""
+Codificadores JSON intercambiables para las respuestas de Flask.
+
+Flask 2.0 serializa `jsonify` con `json.dumps(obj, cls=app.json_encoder)`,
+que a su vez llama a `encode()` del codificador. `OrjsonJSONEncoder`
+sobrescribe ese método para delegar en orjson cuando está instalado;
+`StdlibJSONEncoder` es la alternativa sin dependencias. Ambos serializan
+`datetime`, `date` y `time` en ISO 8601, de modo que los servicios pueden
+devolver las fechas sin convertirlas campo a campo.
+"""
+import logging
+from datetime import date, datetime, time
+
+from flask.json import JSONEncoder
+
+from config import active_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+class StdlibJSONEncoder(JSONEncoder):
+    """Codificador de la biblioteca estándar con fechas en ISO 8601."""
+
+    def default(self, o):
+        if isinstance(o, (datetime, date, time)):
+            return o.isoformat()
+        return super().default(o)
+
+class OrjsonJSONEncoder(StdlibJSONEncoder):
+    """
+    Codificador que delega en orjson, con las fechas serializadas de forma nativa.
+
+    Respeta `sort_keys` e `indent` (siempre a dos espacios). orjson emite
+    UTF-8 sin escapar, por lo que `JSON_AS_ASCII` no se aplica. Si orjson no
+    admite un valor (p. ej. enteros de más de 64 bits), se recurre al
+    codificador estándar.
+    """
+
+    def encode(self, o):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().encode(o)
+
+# Codificadores disponibles por nombre
+JSON_PROVIDERS = {
+    'stdlib': StdlibJSONEncoder,
+    'orjson': OrjsonJSONEncoder
+}
+
+def resolve_json_provider(name=None):
+    """
+    Elige el codificador JSON.
+
+    Args:
+        name (str): 'auto' (orjson si está instalado), 'orjson' o 'stdlib';
+            por defecto `JSON_PROVIDER` de la configuración
+
+    Returns:
+        tuple: (nombre efectivo, clase del codificador)
+    """
+    name = (name or active_config.JSON_PROVIDER).lower()
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'stdlib'
+    if name == 'orjson' and orjson is None:
+        logger.warning("JSON_PROVIDER=orjson pero orjson no está instalado; se usa el codificador estándar")
+        name = 'stdlib'
+    if name not in JSON_PROVIDERS:
+        logger.warning(f"JSON_PROVIDER desconocido '{name}'; se usa el codificador estándar")
+        name = 'stdlib'
+    return name, JSON_PROVIDERS[name]
+
+def init_json_provider(app, name=None):
+    """
+    Configura el codificador JSON de la aplicación.
+
+    Args:
+        app: Aplicación Flask
+        name (str): Codificador a usar (ver `resolve_json_provider`)
+
+    Returns:
+        str: Nombre del codificador configurado
+    """
+    name, encoder = resolve_json_provider(name)
+    app.json_encoder = encoder
+    logger.info(f"Codificador JSON de la aplicación: {name}")
+    return name
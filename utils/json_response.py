@@ -0,0 +1,131 @@
+"""
+Serialización JSON con fragmentos ya serializados.
+
+Las columnas JSON de las tablas dinámicas (`conversation`, `metadata`,
+`analysis`) se guardan como texto. Decodificarlas con `json.loads` solo para
+que `jsonify` las vuelva a codificar duplica el trabajo con transcripciones
+grandes. `RawJSON` envuelve ese texto y `dumps` lo inserta tal cual en el
+documento: el codificador emite un marcador por cada fragmento y una única
+pasada final lo sustituye por el texto original.
+
+Solo se inserta texto validado (`raw_json_fragment`): un valor guardado mal
+formado o truncado invalidaría el documento completo.
+"""
+import json
+import re
+import uuid
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class RawJSON:
+    """Texto JSON válido que se inserta sin decodificar en la salida de `dumps`."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return f"RawJSON({self.text[:40]!r})"
+
+def looks_like_json(text):
+    """
+    Comprobación barata, sin decodificar, de que un texto guardado es un
+    objeto o arreglo JSON de una sola línea y puede insertarse tal cual.
+
+    Args:
+        text (str): Texto guardado en la columna
+
+    Returns:
+        bool: True si empieza y termina como un objeto o arreglo JSON
+    """
+    stripped = text.strip()
+    return (
+        len(stripped) >= 2
+        and (stripped[0], stripped[-1]) in (('{', '}'), ('[', ']'))
+        and '\n' not in stripped
+    )
+
+def raw_json_fragment(text):
+    """
+    Envuelve un texto guardado en `RawJSON` solo si es JSON válido.
+
+    La validación usa el analizador en C de orjson, mucho más barato que
+    decodificar y volver a codificar el valor. Sin orjson no hay un
+    validador barato y el texto debe decodificarse normalmente.
+
+    Args:
+        text (str): Texto guardado en la columna
+
+    Returns:
+        RawJSON: Fragmento a insertar, o None si debe decodificarse
+    """
+    if orjson is None or not looks_like_json(text):
+        return None
+    try:
+        orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+    return RawJSON(text)
+
+def dumps(obj, cls=None, default=None, **kwargs):
+    """
+    Serializa `obj` como `json.dumps`, insertando los `RawJSON` sin decodificar.
+
+    Args:
+        obj: Objeto a serializar
+        cls: Codificador base (p. ej. el de la aplicación Flask)
+        default: Función de respaldo para tipos no serializables
+        **kwargs: Argumentos adicionales de `json.dumps`
+
+    Returns:
+        str: Documento JSON
+    """
+    fallback = default or (cls or json.JSONEncoder)().default
+    fragments = []
+    # El nonce evita confundir un marcador con un texto de los datos
+    nonce = uuid.uuid4().hex
+
+    def encode(value):
+        if isinstance(value, RawJSON):
+            fragments.append(value.text)
+            return f"\x00{nonce}:{len(fragments) - 1}\x00"
+        return fallback(value)
+
+    output = json.dumps(obj, cls=cls, default=encode, **kwargs)
+    if not fragments:
+        return output
+    return re.sub(
+        r'"\\u0000' + nonce + r':(\d+)\\u0000"',
+        lambda match: fragments[int(match.group(1))],
+        output
+    )
+
+def jsonify_raw(payload, status=200):
+    """
+    Equivalente de `flask.jsonify` que admite fragmentos `RawJSON`.
+
+    Args:
+        payload: Datos de la respuesta
+        status (int): Código de estado HTTP
+
+    Returns:
+        Response: Respuesta JSON
+    """
+    config = current_app.config
+    indent = 2 if config['JSONIFY_PRETTYPRINT_REGULAR'] or current_app.debug else None
+    separators = (', ', ': ') if indent else (',', ':')
+    body = dumps(
+        payload,
+        cls=current_app.json_encoder,
+        ensure_ascii=config['JSON_AS_ASCII'],
+        sort_keys=config['JSON_SORT_KEYS'],
+        indent=indent,
+        separators=separators
+    )
+    return current_app.response_class(body + '\n', status=status, mimetype=config['JSONIFY_MIMETYPE'])
@@ -0,0 +1,342 @@
+"""
+Caché de resultados de análisis de LLM direccionada por contenido.
+
+Una misma transcripción se vuelve a analizar con frecuencia (reimportaciones,
+reintentos de `create_analysis`). Los resultados se guardan bajo un hash de
+todo lo que determina la respuesta del modelo: la conversación normalizada,
+el tipo de análisis, el prompt de sistema, el deployment y la temperatura.
+El almacenamiento es intercambiable; por defecto es un archivo SQLite local
+con expulsión por tamaño.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from config import active_config
+
+logger = logging.getLogger(__name__)
+
+# Claves de la conversación que no afectan al análisis y se excluyen del hash
+VOLATILE_CONVERSATION_KEYS = ('id', 'created_at', 'updated_at')
+
+def _normalize_conversation(conversation):
+    """Serializa la conversación de forma canónica, sin sus claves volátiles."""
+    if isinstance(conversation, str):
+        try:
+            conversation = json.loads(conversation)
+        except ValueError:
+            return conversation.strip()
+    if isinstance(conversation, dict):
+        conversation = {
+            key: value for key, value in conversation.items()
+            if key not in VOLATILE_CONVERSATION_KEYS
+        }
+    return json.dumps(conversation, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def make_cache_key(conversation, analysis_type, system_prompt, deployment, temperature):
+    """
+    Calcula la clave de caché de un análisis.
+
+    Args:
+        conversation: Conversación a analizar (dict o texto JSON)
+        analysis_type (str): Tipo de análisis
+        system_prompt (str): Prompt de sistema enviado al modelo
+        deployment (str): Deployment de Azure OpenAI
+        temperature (float): Temperatura de muestreo
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal
+    """
+    material = json.dumps(
+        [_normalize_conversation(conversation), analysis_type, system_prompt, deployment, float(temperature)],
+        separators=(',', ':'),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class CacheBackend(ABC):
+    """
+    Interfaz de almacenamiento de la caché. Los valores son textos JSON y el
+    backend es responsable de respetar su límite de tamaño.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        """Devuelve el valor guardado o None."""
+
+    @abstractmethod
+    def set(self, key, value):
+        """Guarda un valor."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Elimina una entrada."""
+
+    @abstractmethod
+    def clear(self):
+        """Elimina todas las entradas."""
+
+    @abstractmethod
+    def usage(self):
+        """Devuelve (entradas, bytes) almacenados."""
+
+def _size(value):
+    """Tamaño en bytes de un valor, codificado en UTF-8 como se almacena."""
+    return len(value.encode('utf-8'))
+
+class MemoryCacheBackend(CacheBackend):
+    """Backend en memoria del proceso con expulsión LRU por tamaño."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # Clave -> (valor, bytes en UTF-8)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        size = _size(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def usage(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Backend en un archivo SQLite local. Cuando el tamaño total supera
+    `max_bytes` se expulsan las entradas usadas hace más tiempo.
+
+    Varios procesos (workers de gunicorn y de la cola) comparten el archivo,
+    así que el tamaño total se lee de la tabla en cada escritura, dentro de
+    la misma transacción que la expulsión, en lugar de llevarse en memoria.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """Abre el archivo y crea la tabla en el primer uso."""
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _stored_bytes(connection):
+        # `size` guarda los bytes en UTF-8; LENGTH(value) contaría caracteres
+        return connection.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key, value):
+        size = _size(value)
+        with self._lock:
+            connection = self._connect()
+            # BEGIN IMMEDIATE toma el bloqueo de escritura antes de sumar, para
+            # que otro proceso no expulse a la vez con un total ya obsoleto
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time())
+                )
+                stored = self._stored_bytes(connection)
+                if stored > self.max_bytes:
+                    self._evict(connection, stored - self.max_bytes)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self, connection, excess):
+        """Elimina las entradas menos usadas hasta liberar `excess` bytes."""
+        evicted = 0
+        keys = []
+        for key, size in connection.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at"):
+            if evicted >= excess:
+                break
+            keys.append((key,))
+            evicted += size
+        connection.executemany("DELETE FROM llm_cache WHERE key = ?", keys)
+        logger.info(f"Caché de LLM: {len(keys)} entradas expulsadas ({evicted} bytes)")
+
+    def delete(self, key):
+        with self._lock:
+            self._connect().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM llm_cache")
+
+    def usage(self):
+        with self._lock:
+            connection = self._connect()
+            entries = connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            return entries, self._stored_bytes(connection)
+
+class LLMResultCache:
+    """
+    Caché de resultados de análisis sobre un backend intercambiable, con
+    contadores de aciertos y fallos.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        """Indica si hay un backend configurado."""
+        return self.backend is not None
+
+    def get(self, key):
+        """
+        Obtiene un resultado almacenado.
+
+        Returns:
+            dict: Resultado del análisis o None si no está en la caché
+        """
+        if not self.enabled:
+            return None
+        result = None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Error al leer la caché de LLM: {str(e)}")
+            value = None
+        if value is not None:
+            try:
+                result = json.loads(value)
+            except ValueError as e:
+                # Una entrada dañada se trata como fallo y se elimina, para
+                # que el próximo análisis la vuelva a escribir
+                logger.warning(f"Entrada dañada en la caché de LLM, se elimina: {str(e)}")
+                self._discard(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def _discard(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"Error al eliminar de la caché de LLM: {str(e)}")
+
+    def put(self, key, result):
+        """Almacena un resultado de análisis."""
+        if not self.enabled:
+            return
+        try:
+            self.backend.set(key, json.dumps(result, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"Error al escribir en la caché de LLM: {str(e)}")
+
+    def clear(self):
+        """Vacía la caché y reinicia los contadores."""
+        if self.enabled:
+            self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Devuelve los contadores de aciertos y el uso del almacenamiento."""
+        total = self.hits + self.misses
+        entries, size_bytes = self.backend.usage() if self.enabled else (0, 0)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / total if total else 0.0,
+            "size": entries,
+            "bytes": size_bytes
+        }
+
+def build_backend(name, path, max_bytes):
+    """
+    Crea el backend de caché indicado en la configuración.
+
+    Args:
+        name (str): 'sqlite', 'memory' o 'none'
+        path (str): Archivo para el backend SQLite
+        max_bytes (int): Tamaño máximo almacenado
+
+    Returns:
+        CacheBackend: Backend configurado o None si la caché está desactivada
+    """
+    if name == 'sqlite':
+        return SQLiteCacheBackend(path, max_bytes)
+    if name == 'memory':
+        return MemoryCacheBackend(max_bytes)
+    if name != 'none':
+        logger.warning(f"Backend de caché de LLM desconocido '{name}', la caché queda desactivada")
+    return None
+
+# Caché compartida por todo el proceso
+llm_cache = LLMResultCache(build_backend(
+    active_config.LLM_CACHE_BACKEND,
+    active_config.LLM_CACHE_PATH,
+    active_config.LLM_CACHE_MAX_BYTES
+))
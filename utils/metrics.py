@@ -0,0 +1,557 @@
+"""
+Registro de métricas en el formato de texto de Prometheus, sin dependencias.
+
+Los servicios declaran sus métricas en `metrics` (contadores, gauges e
+histogramas con etiquetas) y las actualizan en el camino de la petición.
+Los valores que ya mantienen otros componentes (pool de conexiones, cachés,
+cola de lotes, escritor de `request_logs`, histogramas por ruta) se leen al
+momento de exponerlos mediante colectores, sin duplicar contadores.
+
+Cada proceso tiene su propio registro. Los workers de la cola de lotes
+(`worker.py`), que son los que llaman a Azure OpenAI, vuelcan sus métricas
+registradas en un archivo por proceso en `METRICS_MULTIPROC_DIR`
+(`write_snapshot`); la exposición de la API las suma a las suyas. Los
+colectores describen solo el proceso que atiende el scrape: con varios
+workers de gunicorn, cada scrape ve el pool y las rutas de ese worker.
+"""
+import glob
+import json
+import logging
+import math
+import os
+import threading
+
+from sqlalchemy import event
+
+from config import active_config
+from db import CHECKOUT_WAIT_BUCKETS, engine, pool_stats, replica_engine
+from utils.client_cache import client_cache
+from utils.llm_cache import llm_cache
+from utils.request_log_writer import request_log_writer
+from utils.request_timing import request_timing, route_name
+
+logger = logging.getLogger(__name__)
+
+# Límites por defecto de los histogramas de latencia (segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Límites del histograma de consultas SQL por petición
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+def _format_value(value):
+    """Formatea un valor numérico según la exposición de Prometheus."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value)
+
+def _escape(value):
+    """Escapa el valor de una etiqueta."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+class MetricFamily:
+    """
+    Métrica con nombre, descripción, tipo y un valor por combinación de etiquetas.
+
+    Args:
+        name (str): Nombre de la métrica
+        documentation (str): Descripción para la línea HELP
+        label_names (tuple): Nombres de las etiquetas
+    """
+
+    metric_type = 'untyped'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"La métrica {self.name} requiere las etiquetas {self.label_names}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def copy(self):
+        """Copia de la métrica con sus valores actuales."""
+        family = type(self).__new__(type(self))
+        family.__dict__.update(self.__dict__)
+        family._lock = threading.Lock()
+        with self._lock:
+            family._values = {key: self._copy_value(value) for key, value in self._values.items()}
+        return family
+
+    def _copy_value(self, value):
+        return value
+
+    def _merge_value(self, current, value):
+        return value if current is None else current + value
+
+    def to_snapshot(self):
+        """
+        Estado serializable de la métrica para `MetricsRegistry.write_snapshot`.
+
+        Returns:
+            dict: Nombre, tipo, descripción, etiquetas y valores
+        """
+        with self._lock:
+            values = [[list(key), self._copy_value(value)] for key, value in self._values.items()]
+        return {
+            "name": self.name,
+            "type": self.metric_type,
+            "help": self.documentation,
+            "labels": list(self.label_names),
+            "values": values
+        }
+
+    def merge_snapshot(self, snapshot):
+        """
+        Suma los valores de un volcado de otro proceso.
+
+        Args:
+            snapshot (dict): Resultado de `to_snapshot` de la misma métrica
+        """
+        with self._lock:
+            for key, value in snapshot["values"]:
+                key = tuple(key)
+                self._values[key] = self._merge_value(self._values.get(key), value)
+
+    def samples(self):
+        """
+        Genera las muestras de la métrica.
+
+        Returns:
+            list: Tuplas (sufijo, etiquetas, valor)
+        """
+        with self._lock:
+            values = list(self._values.items())
+        return [('', tuple(zip(self.label_names, key)), value) for key, value in values]
+
+    def render(self):
+        """Líneas HELP, TYPE y muestras de la métrica."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+class Counter(MetricFamily):
+    """Contador monótono."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Fija el valor leído de un contador externo (solo en colectores)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Gauge(MetricFamily):
+    """Valor que puede subir y bajar."""
+
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(MetricFamily):
+    """
+    Histograma con límites fijos y cubetas acumuladas.
+
+    Args:
+        buckets (tuple): Límites superiores en orden creciente (sin +Inf)
+    """
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def _copy_value(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def _merge_value(self, current, value):
+        if current is None:
+            return self._copy_value(value)
+        return [
+            [own + other for own, other in zip(current[0], value[0])],
+            current[1] + value[1],
+            current[2] + value[2]
+        ]
+
+    def to_snapshot(self):
+        snapshot = super().to_snapshot()
+        snapshot["buckets"] = list(self.buckets)
+        return snapshot
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def load(self, cumulative_counts, total, count, **labels):
+        """
+        Fija el estado desde un histograma externo (solo en colectores).
+
+        Args:
+            cumulative_counts (list): Observaciones <= cada límite de `buckets`
+            total (float): Suma de las observaciones
+            count (int): Número de observaciones
+        """
+        key = self._key(labels)
+        per_bucket = [
+            cumulative - (cumulative_counts[index - 1] if index else 0)
+            for index, cumulative in enumerate(cumulative_counts)
+        ]
+        with self._lock:
+            self._values[key] = [per_bucket, total, count]
+
+    def samples(self):
+        with self._lock:
+            values = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in values:
+            labels = tuple(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', labels + (('le', _format_value(float(bound))),), cumulative))
+            samples.append(('_bucket', labels + (('le', '+Inf'),), count))
+            samples.append(('_sum', labels, total))
+            samples.append(('_count', labels, count))
+        return samples
+
+# Clases de métrica por tipo en los volcados de otros procesos
+_FAMILY_TYPES = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+
+class MetricsRegistry:
+    """
+    Métricas del proceso y colectores evaluados en cada exposición.
+
+    Args:
+        directory (str): Directorio de los volcados de otros procesos (por
+            defecto METRICS_MULTIPROC_DIR; vacío desactiva la agregación)
+    """
+
+    def __init__(self, directory=None):
+        self._lock = threading.Lock()
+        self._families = {}
+        self._collectors = []
+        self.directory = directory if directory is not None else active_config.METRICS_MULTIPROC_DIR
+
+    def _get_or_create(self, cls, name, documentation, label_names, **kwargs):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, documentation, label_names, **kwargs)
+            elif not isinstance(family, cls) or family.label_names != tuple(label_names):
+                raise ValueError(f"La métrica {name} ya está registrada con otro tipo o etiquetas")
+            return family
+
+    def counter(self, name, documentation, label_names=()):
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def register_collector(self, collector):
+        """
+        Registra una función que devuelve métricas calculadas al exponerlas.
+
+        Args:
+            collector: Función sin argumentos que devuelve una lista de `MetricFamily`
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+        return collector
+
+    def _snapshot_path(self, pid=None):
+        return os.path.join(self.directory, f"metrics-{pid or os.getpid()}.json")
+
+    def write_snapshot(self):
+        """
+        Vuelca las métricas registradas del proceso en su archivo de
+        `directory`, para que la exposición de otro proceso las sume.
+
+        El archivo se reemplaza de forma atómica y sigue ahí cuando el
+        proceso termina: los contadores de un worker detenido se conservan
+        hasta que `clear_snapshots` limpia el directorio.
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            families = list(self._families.values())
+        payload = {"pid": os.getpid(), "families": [family.to_snapshot() for family in families]}
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path()
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(payload, snapshot_file)
+        os.replace(temporary, path)
+
+    def clear_snapshots(self):
+        """Elimina los volcados de procesos anteriores (al arrancar los workers)."""
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar el volcado de métricas {path}: {str(e)}")
+
+    def _merge_snapshots(self, families):
+        """
+        Suma a copias de `families` los volcados de los demás procesos.
+
+        Las métricas que este proceso no registra se crean desde el volcado;
+        una métrica con otro tipo, etiquetas o límites se ignora.
+
+        Returns:
+            list: Métricas combinadas
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return families
+
+        merged = {}
+        own_path = self._snapshot_path()
+        for path in sorted(glob.glob(os.path.join(self.directory, 'metrics-*.json'))):
+            if path == own_path:
+                continue
+            try:
+                with open(path, encoding='utf-8') as snapshot_file:
+                    snapshots = json.load(snapshot_file)["families"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Volcado de métricas ilegible {path}: {str(e)}")
+                continue
+
+            for snapshot in snapshots:
+                name = snapshot["name"]
+                family = merged.get(name)
+                if family is None:
+                    local = next((family for family in families if family.name == name), None)
+                    if local is not None:
+                        family = local.copy()
+                    else:
+                        cls = _FAMILY_TYPES.get(snapshot["type"])
+                        if cls is None:
+                            continue
+                        options = {'buckets': snapshot["buckets"]} if cls is Histogram else {}
+                        family = cls(name, snapshot["help"], snapshot["labels"], **options)
+                    merged[name] = family
+
+                compatible = (
+                    family.metric_type == snapshot["type"]
+                    and list(family.label_names) == snapshot["labels"]
+                    and list(getattr(family, 'buckets', [])) == snapshot.get("buckets", [])
+                )
+                if compatible:
+                    family.merge_snapshot(snapshot)
+                else:
+                    logger.warning(f"Métrica {name} de {path} incompatible con la del proceso")
+
+        result = [merged.pop(family.name, family) for family in families]
+        return result + list(merged.values())
+
+    def collect(self):
+        """
+        Obtiene todas las métricas: las registradas, sumadas a los volcados
+        de los demás procesos, y las de los colectores.
+
+        Un colector que falla se omite para no perder el resto de la exposición.
+
+        Returns:
+            list: Métricas a exponer
+        """
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        families = self._merge_snapshots(families)
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.error(f"Error en el colector de métricas {collector.__name__}: {str(e)}")
+        return families
+
+    def render(self):
+        """
+        Genera la exposición en formato de texto de Prometheus (versión 0.0.4).
+
+        Returns:
+            str: Texto de la exposición
+        """
+        lines = []
+        for family in self.collect():
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+# Registro compartido por el proceso
+metrics = MetricsRegistry()
+
+# Consultas SQL ejecutadas por la petición en curso en cada hilo
+_query_counter = threading.local()
+
+def _count_query(*args):
+    _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+
+def _collect_db_pools():
+    engines = [('primary', engine)]
+    if replica_engine is not None:
+        engines.append(('replica', replica_engine))
+
+    checkouts = Counter('smartvoc_db_pool_checkouts_total', "Conexiones entregadas por el pool", ('engine',))
+    connects = Counter('smartvoc_db_pool_connects_total', "Conexiones nuevas abiertas por el pool", ('engine',))
+    invalidations = Counter(
+        'smartvoc_db_pool_invalidations_total', "Conexiones invalidadas por el pool", ('engine',)
+    )
+    checked_out = Gauge('smartvoc_db_pool_checked_out', "Conexiones en uso", ('engine',))
+    peak = Gauge('smartvoc_db_pool_peak_checked_out', "Máximo de conexiones en uso simultáneo", ('engine',))
+    size = Gauge('smartvoc_db_pool_size', "Tamaño configurado del pool", ('engine',))
+    idle = Gauge('smartvoc_db_pool_idle', "Conexiones abiertas sin usar", ('engine',))
+    overflow = Gauge('smartvoc_db_pool_overflow', "Conexiones abiertas por encima del tamaño del pool", ('engine',))
+    checkout_wait = Histogram(
+        'smartvoc_db_pool_checkout_wait_seconds', "Espera para obtener una conexión del pool",
+        ('engine',), buckets=CHECKOUT_WAIT_BUCKETS
+    )
+    for name, target in engines:
+        stats = pool_stats(target)
+        checkouts.set(stats["checkouts"], engine=name)
+        connects.set(stats["connects"], engine=name)
+        invalidations.set(stats["invalidations"], engine=name)
+        checked_out.set(stats["checkedOut"], engine=name)
+        peak.set(stats["peakCheckedOut"], engine=name)
+        wait = stats["checkoutWait"]
+        checkout_wait.load(wait["counts"], wait["sumSeconds"], wait["count"], engine=name)
+        # Solo QueuePool informa de su tamaño y desbordamiento
+        if "size" in stats:
+            size.set(stats["size"], engine=name)
+            idle.set(stats["idle"], engine=name)
+            overflow.set(stats["overflow"], engine=name)
+    return [checkouts, connects, invalidations, checked_out, peak, size, idle, overflow, checkout_wait]
+
+def _collect_requests():
+    requests_total = Counter(
+        'smartvoc_http_requests_total', "Peticiones atendidas", ('route', 'method', 'status')
+    )
+    duration = Histogram(
+        'smartvoc_http_request_duration_seconds', "Latencia de las peticiones",
+        ('route', 'method'), buckets=DEFAULT_BUCKETS
+    )
+    request_bytes = Counter(
+        'smartvoc_http_request_bytes_total', "Bytes recibidos en el cuerpo de las peticiones", ('route', 'method')
+    )
+    response_bytes = Counter(
+        'smartvoc_http_response_bytes_total', "Bytes enviados en el cuerpo de las respuestas", ('route', 'method')
+    )
+    bounds_us = [int(bound * 1_000_000) for bound in DEFAULT_BUCKETS]
+    for route, method, timing in request_timing.snapshot():
+        histogram = timing.histogram
+        for status, count in timing.status_codes.items():
+            requests_total.set(count, route=route, method=method, status=status)
+        duration.load(
+            histogram.count_at_or_below(bounds_us), histogram.total / 1_000_000.0, histogram.count,
+            route=route, method=method
+        )
+        request_bytes.set(timing.request_bytes, route=route, method=method)
+        response_bytes.set(timing.response_bytes, route=route, method=method)
+    return [requests_total, duration, request_bytes, response_bytes]
+
+def _collect_caches():
+    hits = Counter('smartvoc_cache_hits_total', "Aciertos de la caché", ('cache',))
+    misses = Counter('smartvoc_cache_misses_total', "Fallos de la caché", ('cache',))
+    ratio = Gauge('smartvoc_cache_hit_ratio', "Proporción de aciertos desde el inicio del proceso", ('cache',))
+    size = Gauge('smartvoc_cache_entries', "Entradas almacenadas en la caché", ('cache',))
+    for name, cache in (('client', client_cache), ('llm', llm_cache)):
+        stats = cache.stats()
+        hits.set(stats["hits"], cache=name)
+        misses.set(stats["misses"], cache=name)
+        ratio.set(stats["hitRatio"], cache=name)
+        size.set(stats["size"], cache=name)
+    return [hits, misses, ratio, size]
+
+def _collect_request_log_writer():
+    stats = request_log_writer.stats()
+    rows = Counter('smartvoc_request_log_rows_total', "Filas de request_logs por resultado", ('outcome',))
+    for outcome in ('enqueued', 'written', 'dropped'):
+        rows.set(stats[outcome], outcome=outcome)
+    errors = Counter('smartvoc_request_log_write_errors_total', "Lotes de request_logs que no se pudieron escribir")
+    errors.set(stats["errors"])
+    depth = Gauge('smartvoc_request_log_queue_depth', "Filas de request_logs en espera de escribirse")
+    depth.set(stats["queueDepth"])
+    return [rows, errors, depth]
+
+def _collect_batch_queue():
+    # job_queue importa models; se importa al exponer para no crear un ciclo
+    from utils.job_queue import JobQueue
+
+    jobs = Gauge('smartvoc_batch_jobs', "Filas de la cola de lotes por estado", ('status',))
+    for status, count in JobQueue().status_counts().items():
+        jobs.set(count, status=status)
+    return [jobs]
+
+def init_metrics(app):
+    """
+    Cuenta las consultas SQL por petición y registra los colectores de los
+    componentes compartidos del proceso.
+
+    Args:
+        app: Aplicación Flask
+    """
+    for target in (engine, replica_engine):
+        if target is not None and not event.contains(target, 'before_cursor_execute', _count_query):
+            event.listen(target, 'before_cursor_execute', _count_query)
+
+    queries = metrics.histogram(
+        'smartvoc_http_request_db_queries', "Consultas SQL ejecutadas por petición",
+        ('route',), buckets=QUERY_COUNT_BUCKETS
+    )
+
+    @app.before_request
+    def _reset_query_count():
+        _query_counter.count = 0
+
+    @app.after_request
+    def _observe_query_count(response):
+        queries.observe(getattr(_query_counter, 'count', 0), route=route_name())
+        return response
+
+    for collector in (_collect_requests, _collect_db_pools, _collect_caches,
+                      _collect_request_log_writer, _collect_batch_queue):
+        metrics.register_collector(collector)
@@ -6,12 +6,31 @@ para el análisis de conversaciones.
 import os
 import json
 import logging
+import threading
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 
+from utils.http_session import get_shared_session, last_connect_time, reset_connect_time
+from utils.llm_cache import llm_cache, make_cache_key
+from utils.metrics import metrics
+from utils.rate_limiter import RateLimiter
+
 logger = logging.getLogger(__name__)
 
+# Métricas de las llamadas a Azure OpenAI (ver /api/metrics)
+_call_duration = metrics.histogram(
+    'smartvoc_openai_request_duration_seconds', "Latencia de las llamadas a Azure OpenAI", ('deployment',)
+)
+_calls = metrics.counter(
+    'smartvoc_openai_requests_total', "Llamadas a Azure OpenAI por código de estado", ('deployment', 'status')
+)
+_tokens = metrics.counter(
+    'smartvoc_openai_tokens_total', "Tokens informados por Azure OpenAI", ('deployment', 'kind')
+)
+_retries = metrics.counter('smartvoc_openai_retries_total', "Reintentos de análisis de conversaciones")
+_errors = metrics.counter('smartvoc_openai_errors_total', "Análisis fallidos por motivo", ('reason',))
+
 class OpenAIService:
     """
     Servicio para integración con Azure OpenAI.
@@ -19,15 +38,44 @@ class OpenAIService:
     utilizando los modelos de Azure OpenAI.
     """
     
-    def __init__(self):
+    def __init__(self, session=None, result_cache=None):
         """
         Inicializa el servicio de OpenAI con las credenciales de Azure.
+        
+        Args:
+            session (requests.Session): Sesión HTTP a utilizar; por defecto la
+                sesión con pool compartida por el proceso
+            result_cache (LLMResultCache): Caché de resultados; por defecto la
+                caché compartida por el proceso
         """
         self.api_key = os.getenv('AZURE_OPENAI_API_KEY', '')
         self.endpoint = os.getenv('AZURE_OPENAI_ENDPOINT', '')
         self.api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2023-05-15')
         self.deployment_name = os.getenv('AZURE_OPENAI_DEPLOYMENT', 'gpt-35-turbo')
         
+        # Concurrencia y cuotas para el análisis por lotes (0 = sin límite).
+        # Cada proceso tiene su propio limitador: la cuota del deployment se
+        # reparte entre los AZURE_OPENAI_RATE_LIMIT_PROCESSES procesos que la comparten
+        self.max_concurrency = int(os.getenv('AZURE_OPENAI_MAX_CONCURRENCY', '1'))
+        self.rate_limit_processes = max(int(os.getenv('AZURE_OPENAI_RATE_LIMIT_PROCESSES', '1')), 1)
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=int(os.getenv('AZURE_OPENAI_REQUESTS_PER_MINUTE', '0')) / self.rate_limit_processes,
+            tokens_per_minute=int(os.getenv('AZURE_OPENAI_TOKENS_PER_MINUTE', '0')) / self.rate_limit_processes
+        )
+        
+        # Sesión HTTP con conexiones keep-alive y timeouts separados (conexión, lectura)
+        self.pool_size = int(os.getenv('AZURE_OPENAI_POOL_SIZE', str(max(self.max_concurrency, 10))))
+        self.timeout = (
+            float(os.getenv('AZURE_OPENAI_CONNECT_TIMEOUT', '5')),
+            float(os.getenv('AZURE_OPENAI_READ_TIMEOUT', '60'))
+        )
+        self.session = session or get_shared_session(self.pool_size)
+        self.result_cache = result_cache or llm_cache
+        
+        # Tiempos acumulados de las llamadas a la API
+        self._timing_lock = threading.Lock()
+        self._timings = {"calls": 0, "newConnections": 0, "connect": 0.0, "ttfb": 0.0, "total": 0.0}
+        
         # Verificar que las credenciales estén configuradas
         if not self.api_key or not self.endpoint:
             logger.warning("Las credenciales de Azure OpenAI no están configuradas correctamente.")
@@ -53,6 +101,63 @@ class OpenAIService:
         """
         return f"{self.endpoint}openai/deployments/{self.deployment_name}/chat/completions?api-version={self.api_version}"
     
+    def _record_timing(self, connect, ttfb, total):
+        """
+        Registra los tiempos de una llamada a la API.
+        
+        Args:
+            connect (float): Segundos abriendo la conexión (0 si se reutilizó)
+            ttfb (float): Segundos hasta recibir las cabeceras de la respuesta
+            total (float): Segundos totales de la llamada
+        """
+        logger.debug(
+            f"Llamada a Azure OpenAI: conexión {connect * 1000:.1f} ms, "
+            f"TTFB {ttfb * 1000:.1f} ms, total {total * 1000:.1f} ms"
+        )
+        _call_duration.observe(total, deployment=self.deployment_name)
+        with self._timing_lock:
+            self._timings["calls"] += 1
+            self._timings["newConnections"] += 1 if connect > 0 else 0
+            self._timings["connect"] += connect
+            self._timings["ttfb"] += ttfb
+            self._timings["total"] += total
+    
+    def timing_stats(self):
+        """
+        Devuelve los tiempos promedio de las llamadas realizadas por el servicio.
+        
+        Returns:
+            dict: Número de llamadas, conexiones nuevas y promedios en milisegundos
+        """
+        with self._timing_lock:
+            timings = dict(self._timings)
+        calls = timings["calls"]
+        
+        def average_ms(key):
+            return round(timings[key] / calls * 1000, 2) if calls else 0.0
+        
+        return {
+            "calls": calls,
+            "newConnections": timings["newConnections"],
+            "avgConnectMs": average_ms("connect"),
+            "avgTtfbMs": average_ms("ttfb"),
+            "avgTotalMs": average_ms("total")
+        }
+    
+    def _estimate_tokens(self, payload):
+        """
+        Estima los tokens que consumirá una solicitud para el limitador de tasa.
+        Usa la aproximación de ~4 caracteres por token más el máximo de salida.
+        
+        Args:
+            payload (dict): Cuerpo de la solicitud a la API
+            
+        Returns:
+            int: Tokens estimados
+        """
+        prompt_chars = sum(len(message['content']) for message in payload['messages'])
+        return prompt_chars // 4 + payload.get('max_tokens', 0)
+    
     def analyze_conversation(self, conversation, analysis_type="standard"):
         """
         Analiza una conversación utilizando Azure OpenAI.
@@ -68,6 +173,7 @@ class OpenAIService:
         try:
             if not self.api_key or not self.endpoint:
                 logger.error("No se pueden realizar análisis sin las credenciales de Azure OpenAI")
+                _errors.inc(reason='not_configured')
                 return None
             
             # Preparar el mensaje para la API según el tipo de análisis
@@ -118,36 +224,136 @@ class OpenAIService:
                 "max_tokens": 2000
             }
             
-            # Realizar la solicitud a la API
-            response = requests.post(
+            # Devolver el resultado almacenado si la misma conversación ya se analizó
+            cache_key = make_cache_key(
+                conversation, analysis_type, system_message, self.deployment_name, payload["temperature"]
+            )
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(f"Análisis obtenido de la caché ({cache_key[:12]})")
+                return cached
+            
+            # Respetar la cuota de solicitudes y tokens por minuto
+            self.rate_limiter.acquire(self._estimate_tokens(payload))
+            
+            # Realizar la solicitud a la API reutilizando las conexiones del pool
+            reset_connect_time()
+            started = time.perf_counter()
+            response = self.session.post(
                 self._get_api_url(),
                 headers=self._get_headers(),
                 json=payload,
-                timeout=60  # 60 segundos de timeout
+                timeout=self.timeout
+            )
+            self._record_timing(
+                last_connect_time(), response.elapsed.total_seconds(), time.perf_counter() - started
             )
             
+            _calls.inc(deployment=self.deployment_name, status=response.status_code)
+            
             # Verificar la respuesta
             if response.status_code != 200:
                 logger.error(f"Error en la API de Azure OpenAI: {response.status_code} - {response.text}")
+                _errors.inc(reason='http_error')
                 return None
             
             # Extraer la respuesta
             result = response.json()
+            usage = result.get('usage') or {}
+            for kind in ('prompt_tokens', 'completion_tokens'):
+                if usage.get(kind):
+                    _tokens.inc(usage[kind], deployment=self.deployment_name, kind=kind.split('_')[0])
             content = result.get('choices', [{}])[0].get('message', {}).get('content', '')
             
             # Intentar parsear el contenido como JSON
             try:
                 analysis = json.loads(content)
-                return analysis
             except json.JSONDecodeError:
                 # Si no es JSON válido, devolver como texto
-                return {"analysis": content}
+                analysis = {"analysis": content}
+            
+            self.result_cache.put(cache_key, analysis)
+            return analysis
             
         except Exception as e:
             logger.error(f"Error al analizar la conversación: {str(e)}")
+            _errors.inc(reason='exception')
             return None
     
-    def batch_analyze_conversations(self, conversations, analysis_type="standard", max_retries=3, retry_delay=2):
+    def _analyze_with_retries(self, conversation, analysis_type, max_retries, retry_delay):
+        """
+        Analiza una conversación reintentando ante fallos.
+        
+        Returns:
+            dict: Resultado del análisis o un diccionario con la clave error
+        """
+        conv_id = conversation.get('id', str(hash(json.dumps(conversation))))
+        retries = 0
+        
+        while retries < max_retries:
+            try:
+                analysis = self.analyze_conversation(conversation, analysis_type)
+                if analysis:
+                    return analysis
+                retries += 1
+                logger.warning(f"Reintento {retries}/{max_retries} para conversación {conv_id}")
+            except Exception as e:
+                retries += 1
+                logger.error(f"Error en el análisis de conversación {conv_id}: {str(e)}")
+            if retries < max_retries:
+                _retries.inc()
+                time.sleep(retry_delay)
+        
+        return {"error": f"No se pudo analizar después de {max_retries} intentos"}
+    
+    def iter_batch_analyze_conversations(self, conversations, analysis_type="standard", max_retries=3,
+                                         retry_delay=2, max_workers=None):
+        """
+        Analiza un lote de conversaciones en paralelo y entrega cada resultado
+        apenas termina, sin esperar al resto del lote.
+        
+        Usa un pool de hilos acotado a `max_workers` y solo mantiene en vuelo
+        el doble de esa cantidad de conversaciones, de modo que la memoria no
+        crece con el tamaño del lote. El limitador de tasa del servicio se
+        comparte entre todos los hilos.
+        
+        Args:
+            conversations (iterable): Conversaciones a analizar
+            analysis_type (str): Tipo de análisis a realizar
+            max_retries (int): Número máximo de reintentos por conversación
+            retry_delay (int): Segundos de espera entre reintentos
+            max_workers (int): Solicitudes simultáneas (por defecto AZURE_OPENAI_MAX_CONCURRENCY)
+            
+        Yields:
+            tuple: (conversation, resultado) en orden de finalización
+        """
+        max_workers = max(max_workers or self.max_concurrency, 1)
+        pending = {}
+        conversations = iter(conversations)
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='openai-batch') as executor:
+            def submit_next():
+                conversation = next(conversations, None)
+                if conversation is None:
+                    return False
+                future = executor.submit(
+                    self._analyze_with_retries, conversation, analysis_type, max_retries, retry_delay
+                )
+                pending[future] = conversation
+                return True
+            
+            while len(pending) < max_workers * 2 and submit_next():
+                pass
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    conversation = pending.pop(future)
+                    yield conversation, future.result()
+                    submit_next()
+    
+    def batch_analyze_conversations(self, conversations, analysis_type="standard", max_retries=3, retry_delay=2,
+                                    max_workers=None):
         """
         Analiza un lote de conversaciones.
         
@@ -156,6 +362,7 @@ class OpenAIService:
             analysis_type (str): Tipo de análisis a realizar
             max_retries (int): Número máximo de reintentos por conversación
             retry_delay (int): Segundos de espera entre reintentos
+            max_workers (int): Solicitudes simultáneas (por defecto AZURE_OPENAI_MAX_CONCURRENCY)
             
         Returns:
             dict: Resultados del análisis por ID de conversación
@@ -166,27 +373,10 @@ class OpenAIService:
             return {}
         
         results = {}
-        for conv in conversations:
+        for conv, analysis in self.iter_batch_analyze_conversations(
+            conversations, analysis_type, max_retries, retry_delay, max_workers
+        ):
             conv_id = conv.get('id', str(hash(json.dumps(conv))))
-            retries = 0
-            success = False
-            
-            while retries < max_retries and not success:
-                try:
-                    analysis = self.analyze_conversation(conv, analysis_type)
-                    if analysis:
-                        results[conv_id] = analysis
-                        success = True
-                    else:
-                        retries += 1
-                        logger.warning(f"Reintento {retries}/{max_retries} para conversación {conv_id}")
-                        time.sleep(retry_delay)
-                except Exception as e:
-                    retries += 1
-                    logger.error(f"Error en el análisis de conversación {conv_id}: {str(e)}")
-                    time.sleep(retry_delay)
-            
-            if not success:
-                results[conv_id] = {"error": f"No se pudo analizar después de {max_retries} intentos"}
-        
-        return results 
\ No newline at end of file
+            results[conv_id] = analysis
+        
+        return results
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Utilidades para paginación por cursor (keyset).
+
+Los cursores son tokens opacos que codifican la posición `(created_at, id)`
+de la última fila entregada. La página siguiente se obtiene con un rango
+sobre esas dos columnas, por lo que el costo de cada página no depende de
+su profundidad, a diferencia de LIMIT/OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+
+from utils.exceptions import ValidationError
+
+def encode_cursor(created_at, row_id):
+    """
+    Codifica la posición de una fila como un cursor opaco.
+
+    Args:
+        created_at: Fecha de creación de la fila (datetime o texto)
+        row_id: Identificador de la fila
+
+    Returns:
+        str: Cursor codificado en base64 apto para URLs
+    """
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=' ')
+    payload = json.dumps([created_at, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decodifica un cursor generado por `encode_cursor`.
+
+    Args:
+        cursor (str): Cursor recibido del cliente
+
+    Returns:
+        tuple: (created_at, id) de la última fila de la página anterior
+
+    Raises:
+        ValidationError: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if created_at is None or not isinstance(row_id, int):
+            raise ValueError("Posición incompleta")
+        return created_at, row_id
+    except (ValueError, TypeError) as e:
+        raise ValidationError(
+            message="El cursor de paginación no es válido",
+            details={"cursor": cursor, "original_error": str(e)}
+        )
+
+def keyset_condition(created_at_column='created_at', id_column='id'):
+    """
+    Construye la condición SQL para obtener las filas posteriores al cursor
+    en orden `created_at DESC, id DESC`.
+
+    La condición usa los parámetros `:cursor_created_at` y `:cursor_id`.
+    """
+    return (
+        f"({created_at_column} < :cursor_created_at OR "
+        f"({created_at_column} = :cursor_created_at AND {id_column} < :cursor_id))"
+    )
+
+def keyset_params(cursor):
+    """Devuelve los parámetros de `keyset_condition` para un cursor dado."""
+    created_at, row_id = decode_cursor(cursor)
+    return {'cursor_created_at': created_at, 'cursor_id': row_id}
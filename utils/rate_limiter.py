@@ -0,0 +1,81 @@
+"""
+Limitador de tasa por cubeta de tokens.
+
+Se usa para respetar las cuotas de Azure OpenAI (solicitudes por minuto y
+tokens por minuto) cuando varias conversaciones se analizan en paralelo.
+"""
+import threading
+import time
+
+class TokenBucket:
+    """
+    Cubeta de tokens que se rellena de forma continua.
+
+    Args:
+        per_minute (int): Capacidad que se repone por minuto; 0 desactiva el límite
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self):
+        """Indica si la cubeta no impone límite."""
+        return self.capacity <= 0
+
+    def _refill(self, now):
+        """Repone los tokens acumulados desde la última actualización."""
+        elapsed = now - self.updated_at
+        self.available = min(self.capacity, self.available + elapsed * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount, now):
+        """Segundos que faltan para disponer de `amount` tokens."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount):
+        """Descuenta `amount` tokens de la cubeta."""
+        if not self.unlimited:
+            self.available -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Limitador combinado de solicitudes y tokens por minuto, seguro entre hilos.
+
+    Args:
+        requests_per_minute (int): Máximo de solicitudes por minuto (0 = sin límite)
+        tokens_per_minute (int): Máximo de tokens por minuto (0 = sin límite)
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """
+        Bloquea hasta que haya cupo para una solicitud de `tokens` tokens.
+
+        Returns:
+            float: Segundos esperados
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if delay <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return waited
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,237 @@
+"""
+Escritura asíncrona y por lotes de la tabla `request_logs`.
+
+Registrar cada solicitud con un `commit()` en el camino de la petición añade
+una transacción de escritura a cada lectura. En su lugar, las filas se
+encolan en memoria y un hilo en segundo plano las inserta en bloque cada
+`REQUEST_LOG_FLUSH_INTERVAL_MS` milisegundos o cada
+`REQUEST_LOG_BATCH_SIZE` filas, lo que ocurra primero.
+
+La cola está acotada. Cuando se llena, `REQUEST_LOG_DROP_POLICY` decide:
+
+- `drop_newest`: se descarta la fila nueva (la petición nunca espera)
+- `drop_oldest`: se descarta la fila más antigua de la cola
+- `block`: la petición espera hasta `REQUEST_LOG_BLOCK_TIMEOUT_MS` a que
+  haya espacio (contrapresión) y, si no lo hay, descarta la fila nueva
+
+Las filas pendientes se escriben al terminar el proceso.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import column, insert, table
+
+from config import active_config
+
+logger = logging.getLogger(__name__)
+
+# Vista ligera de request_logs; evita importar models desde utils
+_request_logs = table(
+    'request_logs',
+    column('timestamp'), column('endpoint'), column('method'), column('request_data'),
+    column('response_data'), column('status_code'), column('error_message'),
+    column('ip_address'), column('user_agent'), column('response_time')
+)
+
+DROP_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+class RequestLogWriter:
+    """
+    Cola acotada de filas de `request_logs` vaciada por un hilo escritor.
+
+    Args:
+        max_queue (int): Filas máximas en espera
+        batch_size (int): Filas por inserción
+        flush_interval_ms (int): Espera máxima de una fila antes de escribirse
+        drop_policy (str): Política con la cola llena (ver DROP_POLICIES)
+        block_timeout_ms (int): Espera máxima de la política `block`
+        bind: Engine donde se escriben las filas (por defecto el compartido)
+    """
+
+    def __init__(self, max_queue=None, batch_size=None, flush_interval_ms=None, drop_policy=None,
+                 block_timeout_ms=None, bind=None):
+        self.max_queue = max_queue or active_config.REQUEST_LOG_QUEUE_SIZE
+        self.batch_size = batch_size or active_config.REQUEST_LOG_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or active_config.REQUEST_LOG_FLUSH_INTERVAL_MS) / 1000.0
+        self.drop_policy = drop_policy or active_config.REQUEST_LOG_DROP_POLICY
+        if self.drop_policy not in DROP_POLICIES:
+            logger.warning(f"Política de descarte desconocida '{self.drop_policy}'; se usa drop_newest")
+            self.drop_policy = 'drop_newest'
+        block_timeout_ms = active_config.REQUEST_LOG_BLOCK_TIMEOUT_MS if block_timeout_ms is None else block_timeout_ms
+        self.block_timeout = block_timeout_ms / 1000.0
+        self.bind = bind
+
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._flush_requested = False
+        self._writing = 0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        """
+        En un proceso hijo (workers de gunicorn o de la cola) el hilo escritor
+        no existe y las filas encoladas pertenecen al padre.
+        """
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._flush_requested = False
+        self._writing = 0
+
+    def _ensure_started(self):
+        """Inicia el hilo escritor si aún no existe en este proceso."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        """
+        Encola una fila sin bloquear la petición (salvo con la política `block`).
+
+        Args:
+            row (dict): Valores de las columnas de `request_logs`
+
+        Returns:
+            bool: True si la fila quedó encolada, False si se descartó
+        """
+        row.setdefault('timestamp', datetime.utcnow())
+        with self._condition:
+            self._ensure_started()
+            if len(self._queue) >= self.max_queue:
+                if self.drop_policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.drop_policy == 'block':
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._condition.wait(remaining)
+                else:
+                    self.dropped += 1
+                    return False
+
+            self._queue.append(row)
+            self.enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+        return True
+
+    def _run(self):
+        """Bucle del hilo escritor: espera un lote completo o el intervalo y escribe."""
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not (self._stopping or self._flush_requested) and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not self._queue:
+                    self._flush_requested = False
+                self._writing = len(batch)
+                stopping = self._stopping
+                # Libera a los productores que esperan espacio
+                self._condition.notify_all()
+
+            if batch:
+                self._write(batch)
+            with self._condition:
+                self._writing = 0
+                self._condition.notify_all()
+                if stopping and not self._queue:
+                    return
+
+    def _write(self, batch):
+        """Inserta un lote de filas en una sola sentencia multi-fila."""
+        rows = [{name: row.get(name) for name in _request_logs.c.keys()} for row in batch]
+        try:
+            bind = self.bind
+            if bind is None:
+                from db import engine as bind
+            with bind.begin() as connection:
+                connection.execute(insert(_request_logs), rows)
+            self.written += len(rows)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(rows)
+            logger.error(f"Error al escribir {len(rows)} registros de solicitudes: {str(e)}")
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que se escriban las filas encoladas hasta ahora.
+
+        Args:
+            timeout (float): Segundos máximos de espera
+
+        Returns:
+            bool: True si la cola quedó vacía
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self._thread is None:
+                return not self._queue
+            # Se adelanta la escritura sin esperar el intervalo
+            while self._queue or self._writing:
+                self._flush_requested = bool(self._queue)
+                self._condition.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Escribe las filas pendientes y detiene el hilo escritor."""
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stopping = True
+            self._condition.notify_all()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"El escritor de request_logs no terminó; quedan {len(self._queue)} filas sin escribir")
+
+    def stats(self):
+        """
+        Obtiene los contadores del escritor.
+
+        Returns:
+            dict: Filas encoladas, escritas y descartadas, lotes, errores y profundidad de la cola
+        """
+        with self._condition:
+            return {
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "errors": self.errors,
+                "queueDepth": len(self._queue),
+                "maxQueue": self.max_queue,
+                "dropPolicy": self.drop_policy
+            }
+
+# Escritor compartido por el proceso; escribe lo pendiente al terminar
+request_log_writer = RequestLogWriter()
+atexit.register(request_log_writer.stop)
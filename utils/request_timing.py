@@ -0,0 +1,273 @@
+"""
+Medición de latencia por ruta de la aplicación Flask.
+
+`init_request_timing` registra hooks before/after_request que miden cada
+petición con `time.perf_counter_ns`, la acumulan en un histograma por ruta
+(`blueprint.endpoint` y patrón de URL) y guardan una muestra de filas en
+`request_logs` a través de `request_log_writer`, sin bloquear la petición.
+Las peticiones que dejan detalles de la operación en `g.request_log_data`
+(ver `AnalysisService._log_request`) se guardan siempre, en esa misma fila.
+
+Los histogramas siguen el esquema de HdrHistogram: cubetas exactas hasta
+`SUB_BUCKETS` microsegundos y, por encima, cubetas por potencia de dos
+divididas en `SUB_BUCKETS / 2` subcubetas, con un error relativo acotado
+(< 1,6 %) y memoria proporcional al rango de latencias observado.
+"""
+import copy
+import logging
+import random
+import threading
+import time
+
+from flask import g, request
+
+from config import active_config
+from utils.request_log_writer import request_log_writer
+
+logger = logging.getLogger(__name__)
+
+# Precisión del histograma: 2^7 subcubetas (error relativo < 1/64)
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+class LatencyHistogram:
+    """
+    Histograma de latencias en microsegundos con cubetas logarítmico-lineales.
+
+    No es seguro entre hilos por sí mismo; `RequestTimingRegistry` serializa
+    el acceso.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def bucket_index(value):
+        """Índice de la cubeta que contiene `value` (microsegundos)."""
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + ((value >> shift) - HALF_SUB_BUCKETS)
+
+    @staticmethod
+    def bucket_value(index):
+        """Valor representativo (punto medio) de la cubeta `index`."""
+        if index < SUB_BUCKETS:
+            return index
+        shift = (index - SUB_BUCKETS) // HALF_SUB_BUCKETS + 1
+        mantissa = (index - SUB_BUCKETS) % HALF_SUB_BUCKETS + HALF_SUB_BUCKETS
+        lower = mantissa << shift
+        return lower + ((1 << shift) >> 1)
+
+    def record(self, value):
+        """
+        Registra una latencia.
+
+        Args:
+            value (int): Latencia en microsegundos
+        """
+        value = max(int(value), 0)
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def count_at_or_below(self, bounds):
+        """
+        Cuenta acumulada de latencias por límite, para exponer el histograma
+        con límites fijos. Cada cubeta cuenta según su valor representativo.
+
+        Args:
+            bounds (list): Límites en microsegundos, en orden creciente
+
+        Returns:
+            list: Latencias registradas menores o iguales a cada límite
+        """
+        results = []
+        indices = sorted(self.counts)
+        position = 0
+        seen = 0
+        for bound in bounds:
+            while position < len(indices) and self.bucket_value(indices[position]) <= bound:
+                seen += self.counts[indices[position]]
+                position += 1
+            results.append(seen)
+        return results
+
+    def percentiles(self, quantiles):
+        """
+        Calcula varios percentiles en una sola pasada por las cubetas.
+
+        Args:
+            quantiles (list): Percentiles entre 0 y 100, en orden creciente
+
+        Returns:
+            list: Latencia en microsegundos de cada percentil (0 si está vacío)
+        """
+        if not self.count:
+            return [0 for _ in quantiles]
+        results = []
+        pending = list(quantiles)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while pending and seen >= pending[0] / 100.0 * self.count:
+                # El máximo exacto es mejor estimación que el punto medio de su cubeta
+                results.append(min(self.bucket_value(index), self.max))
+                pending.pop(0)
+            if not pending:
+                break
+        results.extend(self.max for _ in pending)
+        return results
+
+class RouteTiming:
+    """Acumulados de una ruta: histograma, códigos de estado y tamaños."""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.status_codes = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+class RequestTimingRegistry:
+    """Histogramas por ruta compartidos por todos los hilos del proceso."""
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def record(self, route, method, elapsed_us, status_code, request_bytes, response_bytes):
+        """
+        Acumula una petición en el histograma de su ruta.
+
+        Args:
+            route (str): Endpoint y patrón de URL de la ruta
+            method (str): Método HTTP
+            elapsed_us (int): Latencia en microsegundos
+            status_code (int): Código de estado de la respuesta
+            request_bytes (int): Tamaño del cuerpo de la solicitud
+            response_bytes (int): Tamaño del cuerpo de la respuesta
+        """
+        key = (route, method)
+        with self.lock:
+            timing = self.routes.get(key)
+            if timing is None:
+                timing = self.routes[key] = RouteTiming()
+            timing.histogram.record(elapsed_us)
+            timing.status_codes[status_code] = timing.status_codes.get(status_code, 0) + 1
+            timing.request_bytes += request_bytes
+            timing.response_bytes += response_bytes
+
+    def snapshot(self):
+        """
+        Copia los acumulados de todas las rutas.
+
+        Returns:
+            list: Tuplas (ruta, método, RouteTiming)
+        """
+        with self.lock:
+            return [(route, method, copy.deepcopy(timing)) for (route, method), timing in self.routes.items()]
+
+    def reset(self):
+        """Descarta todos los histogramas acumulados."""
+        with self.lock:
+            self.routes = {}
+
+    def stats(self):
+        """
+        Obtiene los percentiles de latencia por ruta.
+
+        Returns:
+            list: Una entrada por ruta y método, ordenadas por p99 descendente
+        """
+        with self.lock:
+            entries = []
+            for (route, method), timing in self.routes.items():
+                histogram = timing.histogram
+                p50, p95, p99 = histogram.percentiles(self.QUANTILES)
+                entries.append({
+                    "route": route,
+                    "method": method,
+                    "count": histogram.count,
+                    "meanMs": round(histogram.total / histogram.count / 1000.0, 3),
+                    "minMs": round((histogram.min or 0) / 1000.0, 3),
+                    "p50Ms": round(p50 / 1000.0, 3),
+                    "p95Ms": round(p95 / 1000.0, 3),
+                    "p99Ms": round(p99 / 1000.0, 3),
+                    "maxMs": round(histogram.max / 1000.0, 3),
+                    "statusCodes": {str(code): count for code, count in sorted(timing.status_codes.items())},
+                    "requestBytes": timing.request_bytes,
+                    "responseBytes": timing.response_bytes
+                })
+        entries.sort(key=lambda entry: entry["p99Ms"], reverse=True)
+        return entries
+
+# Registro compartido por el proceso
+request_timing = RequestTimingRegistry()
+
+def route_name():
+    """Nombre estable de la ruta atendida: endpoint y patrón, no la URL concreta."""
+    if request.url_rule is None:
+        return '<unmatched>'
+    return f"{request.endpoint} {request.url_rule.rule}"
+
+def _should_persist(elapsed_ms, status_code, request_data=None):
+    """Las peticiones lentas, con detalles de la operación o con errores del servidor siempre se guardan; el resto se muestrea."""
+    if request_data is not None or status_code >= 500:
+        return True
+    slow_ms = active_config.REQUEST_TIMING_SLOW_MS
+    if slow_ms and elapsed_ms >= slow_ms:
+        return True
+    return random.random() < active_config.REQUEST_TIMING_SAMPLE_RATE
+
+def init_request_timing(app):
+    """
+    Instrumenta la aplicación para medir la latencia de cada petición.
+
+    Args:
+        app: Aplicación Flask
+    """
+    @app.before_request
+    def _start_request_timer():
+        g.request_started_ns = time.perf_counter_ns()
+
+    @app.after_request
+    def _record_request_timing(response):
+        started = g.pop('request_started_ns', None)
+        request_data = g.pop('request_log_data', None)
+        if started is None:
+            return response
+        try:
+            elapsed_us = (time.perf_counter_ns() - started) // 1000
+            request_bytes = request.content_length or 0
+            # Las respuestas en streaming no conocen su tamaño
+            response_bytes = response.content_length or 0
+            request_timing.record(
+                route_name(), request.method, elapsed_us, response.status_code,
+                request_bytes, response_bytes
+            )
+
+            elapsed_ms = elapsed_us / 1000.0
+            if active_config.REQUEST_LOG_ENABLED and _should_persist(elapsed_ms, response.status_code, request_data):
+                request_log_writer.submit({
+                    'endpoint': request.path[:255],
+                    'method': request.method,
+                    'status_code': response.status_code,
+                    'ip_address': request.remote_addr,
+                    'user_agent': (request.user_agent.string or '')[:255],
+                    # response_time se guarda en milisegundos
+                    'response_time': int(round(elapsed_ms)),
+                    'request_data': request_data
+                })
+        except Exception as e:
+            logger.error(f"Error al registrar la latencia de la solicitud: {str(e)}")
+        return response
@@ -0,0 +1,322 @@
+"""
+Registro en memoria de las tablas dinámicas por cliente.
+
+Las tablas `Conversations__*`, `CopilotFieldCategoryQuote__*`,
+`GenerativeAnalyses__*` y `*_conversation_analyses` se consultan en casi
+todas las peticiones. Este módulo mantiene, por proceso, qué tablas existen
+y sus objetos `Table`, de modo que la verificación en el camino crítico es
+una búsqueda en un diccionario en lugar de una consulta al catálogo.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from sqlalchemy import MetaData, Table, inspect
+from sqlalchemy.exc import DBAPIError
+
+from config import active_config
+
+logger = logging.getLogger(__name__)
+
+# Prefijos y sufijos de las tablas dinámicas que se registran
+DYNAMIC_TABLE_PREFIXES = ('Conversations__', 'CopilotFieldCategoryQuote__', 'GenerativeAnalyses__')
+DYNAMIC_TABLE_SUFFIXES = ('_conversation_analyses',)
+
+def is_dynamic_table(table_name):
+    """Indica si el nombre corresponde a una tabla dinámica por cliente."""
+    return table_name.startswith(DYNAMIC_TABLE_PREFIXES) or table_name.endswith(DYNAMIC_TABLE_SUFFIXES)
+
+# Largo máximo de identificadores en PostgreSQL; SQL Server admite 128
+MAX_INDEX_NAME_LENGTH = 63
+
+def index_name(prefix, table_name, suffix):
+    """
+    Genera el nombre de un índice de una tabla dinámica.
+
+    Los nombres de índice son únicos por esquema, así que incluyen la tabla.
+    Si el resultado supera el largo máximo se reemplaza la tabla por un hash,
+    para que el nombre no se trunque ni colisione con el de otro cliente.
+
+    Args:
+        prefix (str): 'ix' o 'ux' (único)
+        table_name (str): Nombre de la tabla
+        suffix (str): Columnas del índice
+
+    Returns:
+        str: Nombre del índice
+    """
+    name = f"{prefix}_{table_name}_{suffix}"
+    if len(name) <= MAX_INDEX_NAME_LENGTH:
+        return name
+    digest = hashlib.sha1(table_name.encode('utf-8')).hexdigest()[:12]
+    return f"{prefix}_{digest}_{suffix}"[:MAX_INDEX_NAME_LENGTH]
+
+def parse_fields(value):
+    """
+    Interpreta el parámetro `fields` de una consulta.
+
+    Args:
+        value: Nombres separados por comas o lista de nombres
+
+    Returns:
+        list: Nombres sin repetir en el orden recibido, o None si no se pidió proyección
+    """
+    if not value:
+        return None
+    names = value.split(',') if isinstance(value, str) else value
+    return list(dict.fromkeys(name.strip() for name in names if name.strip())) or None
+
+# Fragmentos del mensaje de error de una tabla inexistente: SQLite, SQL
+# Server y MySQL; PostgreSQL se reconoce por su SQLSTATE (42P01)
+MISSING_TABLE_MESSAGES = ('no such table', 'invalid object name', "doesn't exist")
+
+def is_missing_table_error(error):
+    """
+    Indica si una excepción de SQLAlchemy se debe a que la tabla consultada
+    no existe, por ejemplo porque otro proceso la eliminó.
+
+    Args:
+        error (Exception): Excepción capturada al ejecutar una consulta
+
+    Returns:
+        bool: True si el motor informó de una tabla inexistente
+    """
+    if not isinstance(error, DBAPIError):
+        return False
+    if getattr(error.orig, 'pgcode', None) == '42P01':
+        return True
+    message = str(error.orig).lower()
+    return any(fragment in message for fragment in MISSING_TABLE_MESSAGES)
+
+class UnknownFieldsError(ValueError):
+    """Se pidieron columnas que no existen en la tabla."""
+
+    def __init__(self, unknown, available):
+        self.unknown = unknown
+        self.available = available
+        super().__init__(f"Campos no válidos: {', '.join(unknown)}")
+
+class _BindSchema:
+    """Tablas dinámicas conocidas de una base de datos (primario o réplica)."""
+
+    def __init__(self):
+        self.tables = {}
+        self.unique_keys = {}
+        # Tabla -> instante (time.monotonic) hasta el que se da por inexistente
+        self.missing = {}
+        self.loaded = False
+
+class SchemaRegistry:
+    """
+    Caché de proceso de las tablas dinámicas existentes.
+
+    El catálogo se lee una sola vez, en la primera consulta. Si una tabla no
+    está registrada se verifica contra la base de datos, así las tablas
+    creadas por otros procesos se detectan en su primer uso; el resultado
+    negativo se recuerda solo `negative_ttl` segundos, para no consultar el
+    catálogo en cada petición a un cliente sin tabla. Las tablas creadas o
+    eliminadas en este proceso se registran o invalidan explícitamente; las
+    que elimina otro proceso se olvidan cuando una consulta falla por no
+    existir la tabla (ver `forget_if_missing`).
+
+    El registro se lleva por engine: una réplica de lectura puede no tener
+    todavía una tabla recién creada en el primario, así que la existencia se
+    verifica contra el mismo bind que ejecutará la consulta.
+
+    Args:
+        negative_ttl (float): Segundos que se recuerda que una tabla no existe
+            (por defecto SCHEMA_REGISTRY_NEGATIVE_TTL; 0 = no se recuerda)
+    """
+
+    def __init__(self, negative_ttl=None):
+        self._lock = threading.Lock()
+        self._schemas = {}
+        self.negative_ttl = negative_ttl if negative_ttl is not None else active_config.SCHEMA_REGISTRY_NEGATIVE_TTL
+
+    def _schema(self, bind):
+        """Estado del engine al que pertenece `bind` (engine o conexión)."""
+        engine = getattr(bind, 'engine', bind)
+        schema = self._schemas.get(engine)
+        if schema is None:
+            with self._lock:
+                schema = self._schemas.setdefault(engine, _BindSchema())
+        return schema
+
+    def _load(self, schema, bind):
+        """Lee del catálogo los nombres de las tablas dinámicas existentes."""
+        with self._lock:
+            if schema.loaded:
+                return
+            for table_name in inspect(bind).get_table_names():
+                if is_dynamic_table(table_name):
+                    schema.tables.setdefault(table_name, None)
+            schema.loaded = True
+            logger.info(f"Registro de esquema cargado con {len(schema.tables)} tablas dinámicas")
+
+    def has_table(self, table_name, bind):
+        """
+        Verifica si una tabla existe, consultando el catálogo solo si no está registrada.
+
+        Args:
+            table_name (str): Nombre de la tabla
+            bind: Engine o conexión de SQLAlchemy
+
+        Returns:
+            bool: True si la tabla existe
+        """
+        if not is_dynamic_table(table_name):
+            return inspect(bind).has_table(table_name)
+
+        schema = self._schema(bind)
+        if not schema.loaded:
+            self._load(schema, bind)
+        if table_name in schema.tables:
+            return True
+        expires = schema.missing.get(table_name)
+        if expires is not None and expires > time.monotonic():
+            return False
+
+        if inspect(bind).has_table(table_name):
+            self.register(table_name, bind=bind)
+            return True
+        if self.negative_ttl > 0:
+            with self._lock:
+                schema.missing[table_name] = time.monotonic() + self.negative_ttl
+        return False
+
+    def get_table(self, table_name, bind):
+        """
+        Obtiene el objeto `Table` de una tabla existente, reflejándolo una sola vez.
+
+        Returns:
+            Table: Tabla registrada o None si no existe
+        """
+        schema = self._schema(bind)
+        table = schema.tables.get(table_name)
+        if table is not None:
+            return table
+        if not self.has_table(table_name, bind):
+            return None
+
+        table = Table(table_name, MetaData(), autoload_with=bind)
+        with self._lock:
+            schema.tables[table_name] = table
+        return table
+
+    def select_columns(self, table_name, bind, fields, required=()):
+        """
+        Construye la lista del SELECT para una proyección de columnas,
+        validada contra las columnas reales de la tabla.
+
+        Args:
+            table_name (str): Nombre de la tabla
+            bind: Engine o conexión de SQLAlchemy
+            fields (list): Columnas pedidas
+            required (tuple): Columnas que la consulta necesita siempre, p. ej.
+                las del cursor de paginación
+
+        Returns:
+            str: Columnas citadas según el dialecto, separadas por comas
+
+        Raises:
+            UnknownFieldsError: Si alguna columna pedida no existe en la tabla
+        """
+        # Sin tabla no hay contra qué validar; la consulta falla como con SELECT *
+        table = self.get_table(table_name, bind)
+        if table is not None:
+            available = [column.name for column in table.columns]
+            unknown = [field for field in fields if field not in available]
+            if unknown:
+                raise UnknownFieldsError(unknown, available)
+
+        columns = list(fields) + [column for column in required if column not in fields]
+        preparer = bind.dialect.identifier_preparer
+        return ', '.join(preparer.quote(column) for column in columns)
+
+    def has_unique_key(self, table_name, bind, columns):
+        """
+        Indica si la tabla tiene un índice único, una restricción única o una
+        clave primaria exactamente sobre `columns`, leyéndolo del catálogo una
+        sola vez por tabla.
+
+        Las tablas antiguas pueden no tener todavía el índice único que exige
+        un upsert (`flask backfill-indexes` lo crea); el resultado se olvida con
+        `invalidate`, y en los demás procesos al reiniciarlos.
+
+        Args:
+            table_name (str): Nombre de la tabla
+            bind: Engine o conexión de SQLAlchemy
+            columns (list): Columnas de la clave
+
+        Returns:
+            bool: True si un upsert puede usar `columns` como destino del conflicto
+        """
+        schema = self._schema(bind)
+        keys = schema.unique_keys.get(table_name)
+        if keys is None:
+            inspector = inspect(bind)
+            keys = {
+                tuple(index['column_names']) for index in inspector.get_indexes(table_name)
+                if index.get('unique')
+            }
+            keys.update(
+                tuple(constraint['column_names'])
+                for constraint in inspector.get_unique_constraints(table_name)
+            )
+            primary_key = inspector.get_pk_constraint(table_name).get('constrained_columns')
+            if primary_key:
+                keys.add(tuple(primary_key))
+            with self._lock:
+                schema.unique_keys[table_name] = keys
+        return tuple(columns) in keys
+
+    def register(self, table_name, table=None, bind=None):
+        """
+        Registra una tabla como existente, opcionalmente con su objeto `Table`.
+
+        Args:
+            table_name (str): Nombre de la tabla
+            table (Table): Objeto `Table` de la tabla (opcional)
+            bind: Engine o conexión donde existe la tabla
+        """
+        schema = self._schema(bind)
+        with self._lock:
+            schema.missing.pop(table_name, None)
+            if table is not None or schema.tables.get(table_name) is None:
+                schema.tables[table_name] = table
+
+    def invalidate(self, table_name=None):
+        """Olvida una tabla concreta o, sin argumentos, todo el registro, en todos los engines."""
+        with self._lock:
+            if table_name is None:
+                self._schemas.clear()
+                return
+            for schema in self._schemas.values():
+                schema.tables.pop(table_name, None)
+                schema.unique_keys.pop(table_name, None)
+                schema.missing.pop(table_name, None)
+
+    def forget_if_missing(self, error, table_name):
+        """
+        Olvida una tabla registrada si `error` indica que ya no existe.
+
+        Otro proceso puede haberla eliminado (`delete_client`) sin que este
+        se entere; la consulta falla y la siguiente verificación vuelve a
+        leer el catálogo.
+
+        Args:
+            error (Exception): Excepción de la consulta sobre la tabla
+            table_name (str): Nombre de la tabla consultada
+
+        Returns:
+            bool: True si el error era de tabla inexistente
+        """
+        if not is_missing_table_error(error):
+            return False
+        logger.warning(f"La tabla {table_name} ya no existe; se elimina del registro de esquema")
+        self.invalidate(table_name)
+        return True
+
+# Registro compartido por todo el proceso
+schema_registry = SchemaRegistry()
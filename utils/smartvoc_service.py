@@ -1,8 +1,9 @@
 from flask import current_app
-from db import db_session
-from models import SmartVOCClient, ClientDetails, FieldGroup, GenerativeAnalysis, Analysis, DynamicTableManager
-from sqlalchemy import text, inspect
-from sqlalchemy.exc import SQLAlchemyError
+from db import db_session, read_bind, read_only
+from models import SmartVOCClient, ClientDetails, FieldGroup, GenerativeAnalysis, Analysis, DynamicTableManager, SmartVOCConversation
+from sqlalchemy import text, inspect, select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from marshmallow import ValidationError as MarshmallowValidationError
 import json
 import uuid
 from datetime import datetime
@@ -14,11 +15,32 @@ from utils.exceptions import (
     DatabaseError
 )
 from utils.error_handler import log_exception
+from utils.pagination import encode_cursor, keyset_condition, keyset_params
+from utils.client_cache import client_cache
+from utils.schema_registry import UnknownFieldsError, parse_fields, schema_registry
+from utils.json_response import dumps as json_dumps
+from schemas.conversation import ConversationCreateSchema
+from config import active_config
+
+def _missing_table_response(error, client):
+    """
+    Respuesta 404 si la consulta falló porque la tabla de conversaciones del
+    cliente ya no existe: otro proceso eliminó el cliente (`delete_client`) y
+    este conservaba la tabla y el cliente en sus cachés. Ambos se olvidan.
+
+    Returns:
+        tuple: Respuesta y código de estado, o None si el error es otro
+    """
+    if client is None or not schema_registry.forget_if_missing(error, f"Conversations__{client.clientSlug}"):
+        return None
+    client_cache.invalidate(client_id=client.clientId, client_name=client.clientName, client_slug=client.clientSlug)
+    return {"error": f"No hay tabla de conversaciones para el cliente '{client.clientName}'"}, 404
 
 class SmartVOCService:
     """Servicio para manejar operaciones de SmartVOC."""
     
     @staticmethod
+    @read_only()
     def get_clients(params=None):
         """Obtiene todos los clientes de SmartVOC registrados en la base de datos."""
         try:
@@ -175,6 +197,10 @@ class SmartVOCService:
                     details={"client_id": client_id}
                 )
             
+            # Claves anteriores del cliente, para invalidar todos sus alias
+            previous_name = client.clientName
+            previous_slug = client.clientSlug
+            
             # Actualizar campos del cliente
             if 'clientName' in data:
                 client.clientName = data['clientName']
@@ -213,6 +239,11 @@ class SmartVOCService:
                 db_session.add(details)
             
             db_session.commit()
+            client_cache.invalidate(
+                client_id=client_id,
+                client_name=[previous_name, client.clientName],
+                client_slug=[previous_slug, client.clientSlug]
+            )
             
             return {
                 "message": f"Cliente '{client.clientName}' actualizado con éxito",
@@ -257,14 +288,15 @@ class SmartVOCService:
             
             # Eliminar tablas dinámicas si existen
             if DynamicTableManager.table_exists(f"Conversations__{client_slug}"):
-                db_session.execute(text(f"DROP TABLE IF EXISTS Conversations__{client_slug}"))
+                DynamicTableManager.drop_table(f"Conversations__{client_slug}")
             
             if DynamicTableManager.table_exists(f"CopilotFieldCategoryQuote__{client_slug}"):
-                db_session.execute(text(f"DROP TABLE IF EXISTS CopilotFieldCategoryQuote__{client_slug}"))
+                DynamicTableManager.drop_table(f"CopilotFieldCategoryQuote__{client_slug}")
             
             # Eliminar el cliente
             db_session.delete(client)
             db_session.commit()
+            client_cache.invalidate(client_id=client_id, client_name=client_name, client_slug=client_slug)
             
             return {"message": f"Cliente '{client_name}' eliminado con éxito"}, 200
         except ResourceNotFoundError:
@@ -285,54 +317,96 @@ class SmartVOCService:
             )
     
     @staticmethod
+    @read_only()
     def get_conversations(params):
-        """Obtiene conversaciones para un cliente específico."""
-        client_id = params.get('client_id')
-        client_name = params.get('client_name')
-        conversation_id = params.get('conversation_id')
+        """
+        Obtiene conversaciones para un cliente específico.
+        
+        La paginación es por cursor sobre `(created_at, id)`: cada página es un
+        rango indexado y la respuesta incluye `next_cursor` para pedir la
+        siguiente. `offset` se mantiene solo por compatibilidad cuando no se
+        envía cursor. Con `fields` (columnas separadas por comas) la consulta
+        lee y devuelve solo esas columnas.
+        """
+        client_id = params.get('clientId')
+        client_name = params.get('clientName')
+        conversation_id = params.get('conversationId')
+        cursor = params.get('cursor')
         limit = int(params.get('limit', 10))
         offset = int(params.get('offset', 0))
+        fields = parse_fields(params.get('fieldList'))
         
         if not client_id and not client_name:
             return {"error": "Debe proporcionar clientId o clientName"}, 400
         
+        client = None
         try:
             # Obtener el cliente
-            client = None
-            if client_id:
-                client = SmartVOCClient.query.filter_by(client_id=client_id).first()
-            elif client_name:
-                client = SmartVOCClient.query.filter_by(client_name=client_name).first()
+            client = client_cache.get(client_id=client_id or None, client_name=client_name)
             
             if not client:
                 return {"error": "Cliente no encontrado"}, 404
             
             # Verificar si existe la tabla de conversaciones
-            table_name = f"Conversations__{client.client_slug}"
+            table_name = f"Conversations__{client.clientSlug}"
             if not DynamicTableManager.table_exists(table_name):
                 return {
-                    "message": f"No hay conversaciones para el cliente '{client.client_name}'",
-                    "conversations": []
+                    "message": f"No hay conversaciones para el cliente '{client.clientName}'",
+                    "conversations": [],
+                    "next_cursor": None
                 }, 200
             
             # Construir la consulta
-            query = f"SELECT * FROM {table_name}"
+            conditions = []
+            query_params = {'limit': limit + 1}
             if conversation_id:
-                query += f" WHERE conversation_id = '{conversation_id}'"
-            query += f" ORDER BY created_at DESC LIMIT {limit} OFFSET {offset}"
+                conditions.append("conversation_id = :conversation_id")
+                query_params['conversation_id'] = conversation_id
+            if cursor:
+                conditions.append(keyset_condition())
+                query_params.update(keyset_params(cursor))
+            
+            # El cursor de la página siguiente necesita created_at e id
+            columns = '*'
+            if fields:
+                columns = schema_registry.select_columns(
+                    table_name, read_bind(), fields, required=('created_at', 'id')
+                )
             
-            # Ejecutar la consulta
-            result = DynamicTableManager.execute_query(query)
-            from models import SmartVOCConversation
-            conversations = [SmartVOCConversation.to_dict(row) for row in result]
+            query = f"SELECT {columns} FROM {table_name}"
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY created_at DESC, id DESC LIMIT :limit"
+            if offset and not cursor:
+                query += " OFFSET :offset"
+                query_params['offset'] = offset
+            
+            # Ejecutar la consulta pidiendo una fila extra para saber si hay más páginas
+            rows = db_session.execute(text(query), query_params).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            # El JSON guardado se inserta sin decodificar al serializar la respuesta
+            conversations = [SmartVOCConversation.to_dict(row, raw_json=True, fields=fields) for row in rows]
+            
+            next_cursor = None
+            if has_more:
+                next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
             
             return {
                 "conversations": conversations,
                 "total": len(conversations),
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "next_cursor": next_cursor
             }, 200
+        except UnknownFieldsError as e:
+            return {"error": str(e), "details": {"allowed_fields": e.available}}, 400
+        except ValidationError as e:
+            return {"error": e.message, "details": e.details}, 400
         except Exception as e:
+            missing = _missing_table_response(e, client)
+            if missing:
+                return missing
             current_app.logger.error(f"Error al obtener conversaciones: {str(e)}")
             return {"error": str(e)}, 500
     
@@ -347,19 +421,20 @@ class SmartVOCService:
         if not client_id:
             return {"error": "El parámetro clientId es obligatorio"}, 400
         
+        client = None
         try:
-            client = SmartVOCClient.query.filter_by(client_id=client_id).first()
+            client = client_cache.get(client_id=client_id, fresh=True)
             if not client:
                 return {"error": f"No se encontró un cliente con el ID '{client_id}'"}, 404
             
-            client_slug = client.client_slug
+            client_slug = client.clientSlug
             table_name = f"Conversations__{client_slug}"
             
             # Verificar si existe la tabla de conversaciones
             if not DynamicTableManager.table_exists(table_name):
                 # Crear la tabla si no existe
                 if not DynamicTableManager.create_conversation_table(client_slug):
-                    return {"error": f"Error al crear la tabla de conversaciones para el cliente '{client.client_name}'"}, 500
+                    return {"error": f"Error al crear la tabla de conversaciones para el cliente '{client.clientName}'"}, 500
             
             # Generar ID de conversación si no se proporciona
             conversation_id = data.get('conversationId', str(uuid.uuid4()))
@@ -392,14 +467,244 @@ class SmartVOCService:
             DynamicTableManager.execute_query(query, params)
             
             return {
-                "message": f"Conversación creada con éxito para el cliente '{client.client_name}'",
+                "message": f"Conversación creada con éxito para el cliente '{client.clientName}'",
                 "conversationId": conversation_id
             }, 201
+        except IntegrityError:
+            return {"error": f"Ya existe una conversación con el ID '{conversation_id}'"}, 409
         except Exception as e:
             db_session.rollback()
+            missing = _missing_table_response(e, client)
+            if missing:
+                return missing
             current_app.logger.error(f"Error al crear conversación: {str(e)}")
             return {"error": str(e)}, 500
     
+    @staticmethod
+    def create_conversations_bulk(items, chunk_size=None):
+        """
+        Crea conversaciones en lote, agrupadas por cliente.
+        
+        Todos los elementos se validan en una sola pasada con
+        ConversationCreateSchema. Los válidos se insertan por bloques de
+        `chunk_size` filas, cada bloque en una única transacción mediante un
+        INSERT multi-fila, y se devuelve el resultado de cada elemento en el
+        mismo orden en que se recibió.
+        
+        Un `conversationId` repetido en el payload o ya guardado se informa
+        como `duplicate` sin impedir la inserción del resto del bloque; los ids
+        existentes se consultan con un único `SELECT ... IN` por bloque.
+        """
+        if not items:
+            return {"error": "No se proporcionaron conversaciones para crear"}, 400
+        
+        chunk_size = chunk_size or active_config.BULK_INSERT_CHUNK_SIZE
+        results = [None] * len(items)
+        
+        # Validar todos los elementos en una sola pasada
+        try:
+            loaded = ConversationCreateSchema().load(items, many=True)
+            errors = {}
+        except MarshmallowValidationError as err:
+            loaded = err.valid_data
+            errors = err.messages
+        
+        # Agrupar los elementos válidos por cliente
+        rows_by_client = {}
+        for index, item in enumerate(loaded):
+            if index in errors:
+                results[index] = {"index": index, "status": "error", "error": errors[index]}
+                continue
+            rows_by_client.setdefault(item['clientId'], []).append((index, item))
+        
+        try:
+            for client_id, entries in rows_by_client.items():
+                client = client_cache.get(client_id=client_id, fresh=True)
+                if not client:
+                    for index, item in entries:
+                        results[index] = {
+                            "index": index,
+                            "status": "error",
+                            "error": f"No se encontró un cliente con el ID '{client_id}'"
+                        }
+                    continue
+                
+                # Verificar la tabla una sola vez por cliente
+                table_name = f"Conversations__{client.clientSlug}"
+                if not DynamicTableManager.table_exists(table_name):
+                    if not DynamicTableManager.create_conversation_table(client.clientSlug):
+                        for index, item in entries:
+                            results[index] = {
+                                "index": index,
+                                "status": "error",
+                                "error": f"Error al crear la tabla de conversaciones para el cliente '{client.clientName}'"
+                            }
+                        continue
+                
+                # La definición declarada tipa las columnas como JSON y serializa
+                # los diccionarios; la reflejada en SQL Server las ve como NVARCHAR
+                table = DynamicTableManager.conversation_table(client.clientSlug)
+                
+                # Un conversationId repetido en el payload solo se inserta la primera vez
+                seen = set()
+                unique_entries = []
+                for index, item in entries:
+                    conversation_id = item.get('conversationId') or str(uuid.uuid4())
+                    if conversation_id in seen:
+                        results[index] = SmartVOCService._duplicate_result(index, conversation_id)
+                        continue
+                    seen.add(conversation_id)
+                    unique_entries.append((index, item, conversation_id))
+                
+                for start in range(0, len(unique_entries), chunk_size):
+                    chunk = unique_entries[start:start + chunk_size]
+                    existing = set(db_session.execute(
+                        select(table.c.conversation_id)
+                        .where(table.c.conversation_id.in_([conversation_id for _, _, conversation_id in chunk]))
+                    ).scalars())
+                    
+                    created_at = datetime.utcnow()
+                    pending = []
+                    for index, item, conversation_id in chunk:
+                        if conversation_id in existing:
+                            results[index] = SmartVOCService._duplicate_result(index, conversation_id)
+                            continue
+                        pending.append((index, {
+                            'conversation_id': conversation_id,
+                            'client_id': client_id,
+                            'conversation': item.get('conversation', {}),
+                            'metadata': item.get('metadata', {}),
+                            'created_at': created_at,
+                            'deep_analysis_stage': 'NONE',
+                            'gsc_analysis_stage': 'NONE'
+                        }))
+                    
+                    if pending:
+                        SmartVOCService._insert_conversation_chunk(table, pending, results)
+        except Exception as e:
+            db_session.rollback()
+            log_exception(e)
+            return {"error": "Error inesperado al crear las conversaciones en lote"}, 500
+        
+        created = sum(1 for result in results if result["status"] == "created")
+        duplicates = sum(1 for result in results if result["status"] == "duplicate")
+        failed = len(results) - created
+        
+        if failed == 0:
+            status_code = 201
+        elif created == 0:
+            status_code = 409 if duplicates == failed else 400
+        else:
+            status_code = 207
+        
+        return {
+            "message": f"{created} de {len(results)} conversaciones creadas con éxito",
+            "total": len(results),
+            "created": created,
+            "duplicates": duplicates,
+            "failed": failed,
+            "results": results
+        }, status_code
+    
+    @staticmethod
+    def _duplicate_result(index, conversation_id):
+        """Resultado de un elemento cuyo conversationId ya existe o se repite en el lote."""
+        return {
+            "index": index,
+            "status": "duplicate",
+            "conversationId": conversation_id,
+            "error": f"Ya existe una conversación con el ID '{conversation_id}'"
+        }
+    
+    @staticmethod
+    def _insert_conversation_chunk(table, pending, results):
+        """
+        Inserta un bloque de conversaciones en una sola sentencia multi-fila.
+        
+        Si otra petición guardó alguno de los ids después de la consulta de
+        existentes, el bloque se reintenta fila por fila para aislar los
+        duplicados. Los errores de base de datos se registran en el servidor y
+        el elemento recibe un mensaje genérico, sin la sentencia ni sus parámetros.
+        
+        Args:
+            table: Tabla de conversaciones del cliente
+            pending (list): Tuplas (índice, fila) a insertar
+            results (list): Resultados por elemento, que se completan
+        """
+        insert_stmt = table.insert()
+        try:
+            DynamicTableManager.execute_many(insert_stmt, [row for _, row in pending])
+            attempts = [(index, row, None) for index, row in pending]
+        except IntegrityError:
+            attempts = []
+            for index, row in pending:
+                try:
+                    DynamicTableManager.execute_many(insert_stmt, [row])
+                    attempts.append((index, row, None))
+                except SQLAlchemyError as e:
+                    if not isinstance(e, IntegrityError):
+                        log_exception(e)
+                    attempts.append((index, row, e))
+        except SQLAlchemyError as e:
+            log_exception(e)
+            attempts = [(index, row, e) for index, row in pending]
+        
+        for index, row, error in attempts:
+            conversation_id = row['conversation_id']
+            if error is None:
+                results[index] = {"index": index, "status": "created", "conversationId": conversation_id}
+            elif isinstance(error, IntegrityError):
+                results[index] = SmartVOCService._duplicate_result(index, conversation_id)
+            else:
+                results[index] = {
+                    "index": index,
+                    "status": "error",
+                    "conversationId": conversation_id,
+                    "error": "Error de base de datos al insertar la conversación"
+                }
+    
+    @staticmethod
+    def export_conversations(params):
+        """
+        Prepara la exportación completa de las conversaciones de un cliente.
+        
+        Devuelve un generador que emite NDJSON leyendo la tabla con un cursor
+        del lado del servidor, de modo que la memoria usada no depende del
+        tamaño de la tabla.
+        """
+        client_id = params.get('clientId')
+        client_name = params.get('clientName')
+        batch_size = params.get('batchSize') or active_config.EXPORT_BATCH_SIZE
+        
+        try:
+            client = client_cache.get(client_id=client_id or None, client_name=client_name)
+            
+            if not client:
+                return {"error": "Cliente no encontrado"}, 404
+            
+            table_name = f"Conversations__{client.clientSlug}"
+            if not DynamicTableManager.table_exists(table_name):
+                return {"error": f"No hay tabla de conversaciones para el cliente '{client.clientName}'"}, 404
+        except Exception as e:
+            current_app.logger.error(f"Error al preparar la exportación de conversaciones: {str(e)}")
+            return {"error": str(e)}, 500
+        
+        return SmartVOCService._stream_conversations(table_name, batch_size), 200
+    
+    @staticmethod
+    def _stream_conversations(table_name, batch_size):
+        """Genera las filas de una tabla de conversaciones en formato NDJSON."""
+        engine = db_session.get_bind()
+        with engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                text(f"SELECT * FROM {table_name} ORDER BY id")
+            )
+            for rows in result.partitions(batch_size):
+                yield ''.join(
+                    json_dumps(SmartVOCConversation.to_dict(row, raw_json=True), default=str) + '\n'
+                    for row in rows
+                )
+    
     @staticmethod
     def get_conversation(client_id, conversation_id):
         """Obtiene una conversación específica para un cliente."""
@@ -407,17 +712,18 @@ class SmartVOCService:
         if not client_id:
             return {"error": "El parámetro clientId es obligatorio"}, 400
             
+        client = None
         try:
-            client = SmartVOCClient.query.filter_by(client_id=client_id).first()
+            client = client_cache.get(client_id=client_id)
             if not client:
                 return {"error": f"No se encontró un cliente con el ID '{client_id}'"}, 404
             
-            client_slug = client.client_slug
+            client_slug = client.clientSlug
             table_name = f"Conversations__{client_slug}"
             
             # Verificar si existe la tabla de conversaciones
             if not DynamicTableManager.table_exists(table_name):
-                return {"error": f"No hay tabla de conversaciones para el cliente '{client.client_name}'"}, 404
+                return {"error": f"No hay tabla de conversaciones para el cliente '{client.clientName}'"}, 404
             
             # Consultar la conversación
             query = f"SELECT * FROM {table_name} WHERE conversation_id = :conversation_id"
@@ -429,10 +735,13 @@ class SmartVOCService:
             
             # Convertir a diccionario
             from models import SmartVOCConversation
-            conversation = SmartVOCConversation.to_dict(rows[0])
+            conversation = SmartVOCConversation.to_dict(rows[0], raw_json=True)
             
             return conversation, 200
         except Exception as e:
+            missing = _missing_table_response(e, client)
+            if missing:
+                return missing
             current_app.logger.error(f"Error al obtener conversación: {str(e)}")
             return {"error": str(e)}, 500
     
@@ -447,17 +756,18 @@ class SmartVOCService:
         if not client_id:
             return {"error": "El parámetro clientId es obligatorio"}, 400
             
+        client = None
         try:
-            client = SmartVOCClient.query.filter_by(client_id=client_id).first()
+            client = client_cache.get(client_id=client_id, fresh=True)
             if not client:
                 return {"error": f"No se encontró un cliente con el ID '{client_id}'"}, 404
                 
-            client_slug = client.client_slug
+            client_slug = client.clientSlug
             table_name = f"Conversations__{client_slug}"
             
             # Verificar si existe la tabla
             if not DynamicTableManager.table_exists(table_name):
-                return {"error": f"No hay tabla de conversaciones para el cliente '{client.client_name}'"}, 404
+                return {"error": f"No hay tabla de conversaciones para el cliente '{client.clientName}'"}, 404
                 
             # Verificar si la conversación existe
             check_query = f"SELECT conversation_id FROM {table_name} WHERE conversation_id = :conversation_id"
@@ -480,10 +790,13 @@ class SmartVOCService:
             return {
                 "message": f"Conversación {conversation_id} actualizada exitosamente",
                 "conversationId": conversation_id,
-                "clientName": client.client_name
+                "clientName": client.clientName
             }, 200
         except Exception as e:
             db_session.rollback()
+            missing = _missing_table_response(e, client)
+            if missing:
+                return missing
             current_app.logger.error(f"Error al actualizar conversación: {str(e)}")
             return {"error": str(e)}, 500
     
@@ -494,17 +807,18 @@ class SmartVOCService:
         if not client_id or not conversation_id:
             return {"error": "Los parámetros clientId y conversation_id son obligatorios"}, 400
             
+        client = None
         try:
-            client = SmartVOCClient.query.filter_by(client_id=client_id).first()
+            client = client_cache.get(client_id=client_id, fresh=True)
             if not client:
                 return {"error": f"No se encontró un cliente con el ID '{client_id}'"}, 404
                 
-            client_slug = client.client_slug
+            client_slug = client.clientSlug
             table_name = f"Conversations__{client_slug}"
             
             # Verificar si existe la tabla
             if not DynamicTableManager.table_exists(table_name):
-                return {"error": f"No hay tabla de conversaciones para el cliente '{client.client_name}'"}, 404
+                return {"error": f"No hay tabla de conversaciones para el cliente '{client.clientName}'"}, 404
                 
             # Verificar si la conversación existe
             check_query = f"SELECT conversation_id FROM {table_name} WHERE conversation_id = :conversation_id"
@@ -520,10 +834,13 @@ class SmartVOCService:
             return {
                 "message": f"Conversación {conversation_id} eliminada exitosamente",
                 "conversationId": conversation_id,
-                "clientName": client.client_name
+                "clientName": client.clientName
             }, 200
         except Exception as e:
             db_session.rollback()
+            missing = _missing_table_response(e, client)
+            if missing:
+                return missing
             current_app.logger.error(f"Error al eliminar conversación: {str(e)}")
             return {"error": str(e)}, 500
     
@@ -0,0 +1,260 @@
+"""
+Perfilado de las sentencias SQL de cada petición.
+
+Escucha los eventos `before_cursor_execute`/`after_cursor_execute` de los
+engines compartidos y acumula, por petición, el número de sentencias, el
+tiempo total en la base de datos, las sentencias más lentas y las que se
+repiten con la misma forma (literales y parámetros reemplazados por `?`),
+que es la firma de un patrón N+1.
+
+Es opcional: con `SQL_PROFILER_ENABLED` cada respuesta lleva las cabeceras
+`X-SQL-Queries`, `X-SQL-Time-Ms` y `Server-Timing`, y `GET /api/debug/sql`
+devuelve el detalle de las últimas peticiones. Con `SQL_QUERY_BUDGET`, una
+petición que lo supera se registra como advertencia o, con
+`SQL_QUERY_BUDGET_STRICT` (pensado para las pruebas), lanza
+`QueryBudgetExceeded`. Fuera de Flask, `query_budget` aplica el mismo límite
+a un bloque de código:
+
+    with query_budget(3):
+        client.get('/api/smartvoc/clients/1')
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, jsonify, request
+from sqlalchemy import event
+
+from config import active_config
+from db import engine, replica_engine
+
+logger = logging.getLogger(__name__)
+
+# Perfiles activos en cada hilo; una sentencia cuenta en todos los anidados
+_active = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+# Normalización de sentencias a su forma
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_NAMED_PARAMETER = re.compile(r"(?:%\(\w+\)s|:\w+|%s|\?)")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\)\s*,\s*\((?:\s*\?\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryBudgetExceeded(AssertionError):
+    """Se ejecutaron más sentencias SQL que las permitidas."""
+
+    def __init__(self, profile, budget, label=None):
+        self.profile = profile
+        self.budget = budget
+        target = f" en {label}" if label else ""
+        repeated = "; ".join(f"{count}x {shape}" for shape, count in profile.repeated()[:3])
+        message = f"{profile.statements} sentencias SQL{target}, presupuesto {budget}"
+        if repeated:
+            message += f" (repetidas: {repeated})"
+        super().__init__(message)
+
+def statement_shape(statement):
+    """
+    Normaliza una sentencia reemplazando literales y parámetros por `?`.
+
+    Args:
+        statement (str): Sentencia SQL
+
+    Returns:
+        str: Forma de la sentencia
+    """
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _NAMED_PARAMETER.sub('?', shape)
+    shape = _IN_LIST.sub('IN (?)', shape)
+    shape = _VALUES_LIST.sub(')', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+class QueryProfile:
+    """
+    Sentencias ejecutadas en un bloque de código o una petición.
+
+    Args:
+        slowest (int): Sentencias más lentas que se conservan
+    """
+
+    def __init__(self, slowest=None):
+        self.slowest_limit = slowest or active_config.SQL_PROFILER_SLOWEST
+        self.statements = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.slowest = []
+
+    def record(self, statement, duration):
+        """
+        Registra una sentencia ejecutada.
+
+        Args:
+            statement (str): Sentencia SQL
+            duration (float): Segundos de ejecución
+        """
+        self.statements += 1
+        self.total_time += duration
+        self.shapes[statement_shape(statement)] += 1
+        if len(self.slowest) < self.slowest_limit or duration > self.slowest[-1][1]:
+            self.slowest.append((statement, duration))
+            self.slowest.sort(key=lambda item: item[1], reverse=True)
+            del self.slowest[self.slowest_limit:]
+
+    def repeated(self):
+        """
+        Formas ejecutadas más de una vez, de la más a la menos repetida.
+
+        Returns:
+            list: Tuplas (forma, veces)
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > 1]
+
+    def to_dict(self):
+        """
+        Resumen serializable del perfil.
+
+        Returns:
+            dict: Sentencias, tiempo total, más lentas y repetidas
+        """
+        return {
+            "statements": self.statements,
+            "dbTimeMs": round(self.total_time * 1000, 3),
+            "slowest": [
+                {"sql": _WHITESPACE.sub(' ', statement).strip(), "ms": round(duration * 1000, 3)}
+                for statement, duration in self.slowest
+            ],
+            "repeated": [{"shape": shape, "count": count} for shape, count in self.repeated()]
+        }
+
+def _profiles():
+    stack = getattr(_active, 'profiles', None)
+    if stack is None:
+        stack = _active.profiles = []
+    return stack
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and getattr(_active, 'profiles', None):
+        context._sql_profiler_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiles = getattr(_active, 'profiles', None)
+    started = getattr(context, '_sql_profiler_started', None)
+    if not profiles or started is None:
+        return
+    duration = time.perf_counter() - started
+    for profile in profiles:
+        profile.record(statement, duration)
+
+def install():
+    """Registra los eventos del perfilador en los engines compartidos (una vez por proceso)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        for target in (engine, replica_engine):
+            if target is not None:
+                event.listen(target, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(target, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+
+def start_profile(slowest=None):
+    """
+    Comienza a perfilar las sentencias del hilo actual.
+
+    Returns:
+        QueryProfile: Perfil que acumula las sentencias hasta `stop_profile`
+    """
+    install()
+    profile = QueryProfile(slowest)
+    _profiles().append(profile)
+    return profile
+
+def stop_profile(profile):
+    """Deja de acumular sentencias en `profile`."""
+    stack = _profiles()
+    if profile in stack:
+        stack.remove(profile)
+    return profile
+
+class query_budget:
+    """
+    Falla si el bloque ejecuta más de `budget` sentencias SQL.
+
+    Args:
+        budget (int): Sentencias permitidas
+        label (str): Descripción del bloque para el mensaje de error
+    """
+
+    def __init__(self, budget, label=None):
+        self.budget = budget
+        self.label = label
+        self.profile = None
+
+    def __enter__(self):
+        self.profile = start_profile()
+        return self.profile
+
+    def __exit__(self, exc_type, exc, traceback):
+        stop_profile(self.profile)
+        if exc_type is None and self.profile.statements > self.budget:
+            raise QueryBudgetExceeded(self.profile, self.budget, self.label)
+        return False
+
+def init_sql_profiler(app):
+    """
+    Perfila las sentencias SQL de cada petición si `SQL_PROFILER_ENABLED` está activo.
+
+    Args:
+        app: Aplicación Flask
+    """
+    if not active_config.SQL_PROFILER_ENABLED:
+        return
+
+    install()
+    recent = deque(maxlen=active_config.SQL_PROFILER_HISTORY)
+    recent_lock = threading.Lock()
+
+    @app.before_request
+    def _start_sql_profile():
+        g.sql_profile = start_profile()
+
+    @app.after_request
+    def _finish_sql_profile(response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        stop_profile(profile)
+
+        db_ms = profile.total_time * 1000
+        response.headers['X-SQL-Queries'] = str(profile.statements)
+        response.headers['X-SQL-Time-Ms'] = f"{db_ms:.3f}"
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.3f};desc="{profile.statements} queries"')
+
+        summary = profile.to_dict()
+        summary.update({"method": request.method, "path": request.path, "status": response.status_code})
+        with recent_lock:
+            recent.append(summary)
+
+        budget = active_config.SQL_QUERY_BUDGET
+        if budget and profile.statements > budget:
+            label = f"{request.method} {request.path}"
+            if active_config.SQL_QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(profile, budget, label)
+            logger.warning(str(QueryBudgetExceeded(profile, budget, label)))
+        return response
+
+    # Detalle de las últimas peticiones perfiladas, de la más reciente a la más antigua
+    @app.route('/api/debug/sql', methods=['GET'])
+    def sql_profiles():
+        with recent_lock:
+            requests = list(reversed(recent))
+        return jsonify({
+            "budget": active_config.SQL_QUERY_BUDGET or None,
+            "requests": requests
+        })
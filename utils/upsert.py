@@ -0,0 +1,170 @@
+"""
+Upsert según el dialecto de la base de datos.
+
+Las escrituras de análisis insertan o actualizan una fila identificada por
+una clave única. En lugar de consultar primero si existe (dos o tres viajes
+a la base y una condición de carrera entre escritores concurrentes), se usa
+una única sentencia que además devuelve la fila resultante:
+
+- SQLite y PostgreSQL: `INSERT ... ON CONFLICT (...) DO UPDATE ... RETURNING *`
+- SQL Server: `MERGE ... WITH (HOLDLOCK) ... OUTPUT inserted.*`
+"""
+from sqlalchemy import text
+
+def _quote(dialect, name):
+    """Cita un identificador solo si el dialecto lo requiere (p. ej. camelCase)."""
+    return dialect.identifier_preparer.quote(name)
+
+def upsert_statement(dialect, table_name, columns, conflict_columns, update_columns=None,
+                     update_expressions=None, rows=1, returning=True, multi=False):
+    """
+    Construye una sentencia de upsert para el dialecto indicado.
+
+    Con una fila y `multi=False` los parámetros se llaman como las columnas;
+    con varias filas o `multi=True` se sufijan con el índice de la fila
+    (`conversation_id_0`, ...), como los genera `upsert_params`.
+
+    Args:
+        dialect: Dialecto de SQLAlchemy (`engine.dialect`)
+        table_name (str): Nombre de la tabla
+        columns (list): Columnas a insertar
+        conflict_columns (list): Columnas de la restricción única
+        update_columns (list): Columnas que se sobrescriben si la fila existe;
+            por defecto todas las insertadas salvo las de conflicto
+        update_expressions (dict): Expresiones SQL adicionales para la
+            actualización, p. ej. {'updated_at': 'CURRENT_TIMESTAMP'}
+        rows (int): Número de filas de la sentencia
+        returning (bool): Devolver las filas insertadas o actualizadas
+        multi (bool): Sufijar los parámetros aunque la sentencia tenga una sola fila
+
+    Returns:
+        TextClause: Sentencia lista para ejecutar
+    """
+    if update_columns is None:
+        update_columns = [column for column in columns if column not in conflict_columns]
+    update_expressions = update_expressions or {}
+
+    table = _quote(dialect, table_name)
+    quoted = [_quote(dialect, column) for column in columns]
+    if rows == 1 and not multi:
+        placeholders = [f"({', '.join(f':{column}' for column in columns)})"]
+    else:
+        placeholders = [
+            f"({', '.join(f':{column}_{index}' for column in columns)})"
+            for index in range(rows)
+        ]
+
+    if dialect.name == 'mssql':
+        assignments = [f"{_quote(dialect, column)} = source.{_quote(dialect, column)}" for column in update_columns]
+        assignments += [f"{_quote(dialect, column)} = {expression}" for column, expression in update_expressions.items()]
+        match = ' AND '.join(
+            f"target.{_quote(dialect, column)} = source.{_quote(dialect, column)}" for column in conflict_columns
+        )
+        statement = (
+            f"MERGE INTO {table} WITH (HOLDLOCK) AS target "
+            f"USING (VALUES {', '.join(placeholders)}) AS source ({', '.join(quoted)}) "
+            f"ON {match} "
+        )
+        if assignments:
+            statement += f"WHEN MATCHED THEN UPDATE SET {', '.join(assignments)} "
+        statement += (
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(quoted)}) "
+            f"VALUES ({', '.join(f'source.{column}' for column in quoted)})"
+        )
+        if returning:
+            statement += " OUTPUT inserted.*"
+        return text(statement + ";")
+
+    assignments = [f"{_quote(dialect, column)} = excluded.{_quote(dialect, column)}" for column in update_columns]
+    assignments += [f"{_quote(dialect, column)} = {expression}" for column, expression in update_expressions.items()]
+    conflict = ', '.join(_quote(dialect, column) for column in conflict_columns)
+    statement = (
+        f"INSERT INTO {table} ({', '.join(quoted)}) VALUES {', '.join(placeholders)} "
+        f"ON CONFLICT ({conflict}) "
+    )
+    statement += f"DO UPDATE SET {', '.join(assignments)}" if assignments else "DO NOTHING"
+    if returning:
+        statement += " RETURNING *"
+    return text(statement)
+
+def upsert_params(rows, columns):
+    """Aplana los valores de varias filas con los nombres de `upsert_statement`."""
+    return {
+        f"{column}_{index}": row.get(column)
+        for index, row in enumerate(rows)
+        for column in columns
+    }
+
+def upsert(session, table_name, values, conflict_columns, update_columns=None, update_expressions=None):
+    """
+    Inserta o actualiza una fila y la devuelve, en una sola sentencia.
+
+    Args:
+        session: Sesión o conexión de SQLAlchemy
+        table_name (str): Nombre de la tabla
+        values (dict): Valores por columna
+        conflict_columns (list): Columnas de la restricción única
+        update_columns (list): Columnas que se sobrescriben si la fila existe
+        update_expressions (dict): Expresiones SQL adicionales para la actualización
+
+    Returns:
+        Row: Fila resultante
+    """
+    columns = list(values)
+    statement = upsert_statement(
+        session.get_bind().dialect, table_name, columns, conflict_columns,
+        update_columns, update_expressions
+    )
+    return session.execute(statement, values).fetchone()
+
+def upsert_many(session, table_name, rows, conflict_columns, update_columns=None, update_expressions=None,
+                chunk_size=500):
+    """
+    Inserta o actualiza varias filas con sentencias multi-fila, sin confirmar
+    la transacción. Las filas no deben repetir la clave de conflicto.
+
+    Args:
+        session: Sesión o conexión de SQLAlchemy
+        table_name (str): Nombre de la tabla
+        rows (list): Valores por columna de cada fila (mismas columnas en todas)
+        conflict_columns (list): Columnas de la restricción única
+        update_columns (list): Columnas que se sobrescriben si la fila existe
+        update_expressions (dict): Expresiones SQL adicionales para la actualización
+        chunk_size (int): Filas por sentencia
+
+    Returns:
+        int: Número de sentencias ejecutadas
+    """
+    if not rows:
+        return 0
+
+    dialect = session.get_bind().dialect
+    columns = list(rows[0])
+    statements = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        statement = upsert_statement(
+            dialect, table_name, columns, conflict_columns, update_columns,
+            update_expressions, rows=len(chunk), returning=False, multi=True
+        )
+        session.execute(statement, upsert_params(chunk, columns))
+        statements += 1
+    return statements
+
+def update_returning_statement(dialect, table_name, set_clause, where_clause):
+    """
+    Construye un UPDATE que devuelve las filas modificadas en la misma sentencia.
+
+    Args:
+        dialect: Dialecto de SQLAlchemy (`engine.dialect`)
+        table_name (str): Nombre de la tabla
+        set_clause (str): Asignaciones SQL, p. ej. "status = :status"
+        where_clause (str): Condición SQL de las filas a actualizar
+
+    Returns:
+        TextClause: Sentencia lista para ejecutar
+    """
+    table = _quote(dialect, table_name)
+    if dialect.name == 'mssql':
+        return text(f"UPDATE {table} SET {set_clause} OUTPUT inserted.* WHERE {where_clause}")
+    return text(f"UPDATE {table} SET {set_clause} WHERE {where_clause} RETURNING *")
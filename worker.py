@@ -0,0 +1,76 @@
+"""
+Punto de entrada de los workers de análisis por lotes.
+
+Uso:
+    python worker.py                  # un worker
+    python worker.py --processes 4    # cuatro procesos worker
+    python worker.py --once           # procesar la cola pendiente y salir
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def run_worker(claim_size=None, poll_interval=None, once=False):
+    """Ejecuta un worker en el proceso actual hasta recibir SIGTERM o SIGINT."""
+    from db import engine
+    from utils.batch_worker import BatchWorker
+
+    # Los procesos hijos no deben reutilizar conexiones abiertas por el padre
+    engine.dispose()
+
+    worker = BatchWorker(claim_size=claim_size, poll_interval=poll_interval)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run(once=once)
+
+def main():
+    parser = argparse.ArgumentParser(description="Workers de la cola de análisis por lotes")
+    parser.add_argument('--processes', type=int, default=1, help="Número de procesos worker")
+    parser.add_argument('--claim-size', type=int, default=None, help="Filas reclamadas por iteración")
+    parser.add_argument('--poll-interval', type=float, default=None, help="Segundos de espera con la cola vacía")
+    parser.add_argument('--once', action='store_true', help="Terminar cuando la cola quede vacía")
+    args = parser.parse_args()
+
+    # Crear las tablas una sola vez, antes de iniciar los procesos worker
+    from db import init_db
+    init_db()
+
+    # Los volcados de métricas de una ejecución anterior ya no corresponden a
+    # ningún proceso vivo
+    from utils.metrics import metrics
+    metrics.clear_snapshots()
+
+    # Cada proceso limita su parte de la cuota de Azure OpenAI; si no se
+    # indicó cuántos procesos la comparten, se reparte entre los workers
+    os.environ.setdefault('AZURE_OPENAI_RATE_LIMIT_PROCESSES', str(max(args.processes, 1)))
+
+    options = (args.claim_size, args.poll_interval, args.once)
+    if args.processes <= 1:
+        run_worker(*options)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=options, name=f"batch-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"{len(processes)} procesos worker iniciados")
+
+    # Reenviar la señal de detención a los hijos y esperar a que terminen
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()